@@ -108,7 +108,9 @@ class ClusteringUtil:
         downscale = config.pop("downscale", "umap")
         # _ = [config.pop(x, None) for x in list(config.keys()) if x not in default_args]
 
-        emb_obj = util_functions.load_pickle(Path(self._file_storage / f"{cache_name}_embedding.pickle"))
+        emb_obj = embedding_functions.SentenceEmbeddingsFactory.load(
+            Path(self._file_storage / f"{cache_name}_data.pickle"),
+            Path(self._file_storage / f"{cache_name}_embedding.pickle"))
 
         add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.RUNNING, process_tracker)
         cluster_obj = None
@@ -132,3 +134,27 @@ class ClusteringUtil:
                                                                embedding_object=emb_obj, yield_concepts=True)
         else:
             return []
+
+    def start_append(self, cache_name, process_factory, process_tracker):
+        emb_obj = embedding_functions.SentenceEmbeddingsFactory.load(
+            Path(self._file_storage / f"{cache_name}_data.pickle"),
+            Path(self._file_storage / f"{cache_name}_embedding.pickle"))
+        _cluster_pickle = Path(self._file_storage / f"{cache_name}_{self.process_step}.pickle")
+        if not _cluster_pickle.exists():
+            raise FileNotFoundError(_cluster_pickle)
+
+        add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.RUNNING, process_tracker)
+        cluster_obj = None
+        try:
+            cluster_obj = process_factory.append(
+                cluster_obj=_cluster_pickle,
+                sentence_embeddings=emb_obj,
+                cache_path=self._file_storage,
+                cache_name=f"{cache_name}_{self.process_step}"
+            )
+            add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.FINISHED, process_tracker)
+        except Exception as e:
+            add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.ABORTED, process_tracker)
+            self._app.logger.error(e)
+
+        return cluster_obj
@@ -13,10 +13,12 @@ from werkzeug.datastructures import FileStorage
 from main_utils import ProcessStatus, StepsName, add_status_to_running_process
 
 sys.path.insert(0, "src")
-import util_functions
+import data_functions
 
 
 DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/paraphrase-albert-small-v2'
+# the embedding store that is shared by all processes (in the file storage; hidden, so it isn't listed as a process)
+EMBEDDING_STORE_FOLDER = ".embedding_store"
 
 
 class PhraseEmbeddingUtil:
@@ -69,10 +71,7 @@ class PhraseEmbeddingUtil:
             base_config["model"] = _language_model_map.get(language, DEFAULT_EMBEDDING_MODEL)
 
         base_config["corpus_name"] = process_name.lower() if process_name is not None else base_config["corpus_name"].lower()
-        # ToDo: Since n_process > 1 would induce Multiprocessing and this doesn't work with the Threading approach
-        #  to keep the server able to respond, the value will be popped here.
-        #  Maybe I can find a solution to this problem
-        base_config.pop("n_process", None)
+        # n_process > 1 is safe from the server's pipeline thread: sentence-transformers spawns its encoding processes
         self.config = base_config
 
     def set_file_storage_path(self, sub_path):
@@ -101,8 +100,10 @@ class PhraseEmbeddingUtil:
         # default_args = inspect.getfullargspec(process_factory.create)[0]
         # _ = [config.pop(x, None) for x in list(config.keys()) if x not in default_args]
 
-        data_obj = util_functions.load_pickle(
+        data_obj = data_functions.DataProcessingFactory.load(
             Path(self._file_storage / f"{cache_name}_data.pickle"))
+        if config.get("embedding_store", True) is True:
+            config["embedding_store"] = Path(self._file_storage.parent / EMBEDDING_STORE_FOLDER)
 
         add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.RUNNING, process_tracker)
         _process = None
@@ -120,3 +121,30 @@ class PhraseEmbeddingUtil:
             self._app.logger.error(e)
 
         return _process
+
+    def start_append(self, cache_name, process_factory, process_tracker):
+        config = self.config.copy()
+
+        data_obj = data_functions.DataProcessingFactory.load(
+            Path(self._file_storage / f"{cache_name}_data.pickle"))
+        _embedding_pickle = Path(self._file_storage / f"{cache_name}_{self.process_step}.pickle")
+        if not _embedding_pickle.exists():
+            raise FileNotFoundError(_embedding_pickle)
+
+        add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.RUNNING, process_tracker)
+        _process = None
+        try:
+            _process = process_factory.append(
+                sent_emb=_embedding_pickle,
+                data_obj=data_obj,
+                cache_path=self._file_storage,
+                cache_name=f"{cache_name}_{self.process_step}",
+                model_name=config.pop("model", DEFAULT_EMBEDDING_MODEL),
+                **config
+            )
+            add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.FINISHED, process_tracker)
+        except Exception as e:
+            add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.ABORTED, process_tracker)
+            self._app.logger.error(e)
+
+        return _process
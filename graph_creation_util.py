@@ -18,6 +18,7 @@ from main_utils import ProcessStatus, StepsName, add_status_to_running_process
 
 sys.path.insert(0, "src")
 import util_functions
+import embedding_functions
 
 
 class GraphCreationUtil:
@@ -108,7 +109,9 @@ class GraphCreationUtil:
         return self.process_step, config_yaml
 
     def start_process(self, cache_name, process_factory, process_tracker, exclusion_ids=None):
-        sent_emb = util_functions.load_pickle(Path(self._file_storage / f"{cache_name}_embedding.pickle"))
+        sent_emb = embedding_functions.SentenceEmbeddingsFactory.load(
+            Path(self._file_storage / f"{cache_name}_data.pickle"),
+            Path(self._file_storage / f"{cache_name}_embedding.pickle"))
         cluster_obj = util_functions.load_pickle(Path(self._file_storage / f"{cache_name}_clustering.pickle"))
 
         config = self.config.copy()
@@ -137,6 +140,10 @@ class GraphCreationUtil:
 
         return concept_graphs
 
+    def start_append(self, cache_name, process_factory, process_tracker):
+        # the graphs depend on the phrases of all concepts, so they're simply rebuilt from the appended steps
+        return self.start_process(cache_name, process_factory, process_tracker)
+
 
 def visualize_graph(graph: nx.Graph, height="800px", directed=False, store="index.html"):
     g = net.Network(height=height, select_menu=False, filter_menu=False, notebook=True, width='100%',
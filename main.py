@@ -1,5 +1,6 @@
 import json
 import shutil
+import threading
 
 from typing import Optional
 
@@ -9,7 +10,7 @@ from flask.logging import default_handler
 from main_methods import *
 from main_utils import ProcessStatus, HTTPResponses, StepsName, add_status_to_running_process, get_bool_expression, \
     StoppableThread
-from preprocessing_util import PreprocessingUtil
+from preprocessing_util import PreprocessingUtil, spacy_models, SPACY_MODELS_PREWARM
 from embedding_util import PhraseEmbeddingUtil
 from clustering_util import ClusteringUtil
 from graph_creation_util import GraphCreationUtil
@@ -33,6 +34,8 @@ f_storage = pathlib.Path(FILE_STORAGE_TMP)
 if not f_storage.exists():
     f_storage.mkdir()
 populate_running_processes(app, FILE_STORAGE_TMP, running_processes)
+# loads the configured spaCy models in the background, so that the first preprocessing jobs don't have to
+threading.Thread(target=spacy_models.prewarm, args=(SPACY_MODELS_PREWARM,), name="spacy_prewarm", daemon=True).start()
 
 # ToDo: file with stopwords will be POSTed: #filter_stop: Optional[list] = None,
 
@@ -70,7 +73,8 @@ def data_preprocessing():
 
         app.logger.info("Reading data ...")
         pre_proc.read_data(request.files.get("data", None))
-        app.logger.info(f"Counted {len(pre_proc.data)} item ins zip file.")
+        if isinstance(pre_proc.data, list):
+            app.logger.info(f"Counted {len(pre_proc.data)} item ins zip file.")
 
         app.logger.info(f"Start preprocessing '{process_name}' ...")
         return data_get_statistics(
@@ -105,7 +109,7 @@ def data_preprocessing_with_arg(path_arg):
         return data_get_statistics(data_obj)
     elif path_arg == "noun_chunks":
         return jsonify(
-            noun_chunks=data_obj.data_chunk_sets
+            noun_chunks=data_obj.data_chunk_sets.to_dicts()
         )
 
 
@@ -186,8 +190,10 @@ def clustering_with_arg(path_arg):
                        possible_path_args=[f"/{p}" for p in _path_args])
 
     if path_arg == "concepts":
-        emb_obj = util_functions.load_pickle(
-            pathlib.Path(pathlib.Path(FILE_STORAGE_TMP) / f"{process}_embedding.pickle"))
+        emb_obj = embedding_functions.SentenceEmbeddingsFactory.load(
+            pathlib.Path(pathlib.Path(FILE_STORAGE_TMP) / pathlib.Path(process) / f"{process}_data.pickle"),
+            pathlib.Path(pathlib.Path(FILE_STORAGE_TMP) / pathlib.Path(process) / f"{process}_embedding.pickle"),
+        )
         _cluster_gen = embedding_functions.show_top_k_for_concepts(
             cluster_obj=cluster_obj.concept_cluster, embedding_object=emb_obj, yield_concepts=True,
             top_k=top_k, distance=distance
@@ -389,6 +395,96 @@ def complete_pipeline():
         )
 
 
+@app.route("/pipeline/append", methods=['POST'])
+def append_to_pipeline():
+    process_name = request.args.get("process", "default").lower()
+    data = request.files.get("data", False)
+    document_server_config = request.files.get("document_server_config", False)
+    labels = request.files.get("labels", None)
+    return_statistics = get_bool_expression(request.args.get("return_statistics", False))
+
+    if not (process_status := running_processes.get(process_name, False)):
+        return jsonify(name=process_name, error=f"There is no such process '{process_name}'."
+                       ), int(HTTPResponses.NOT_FOUND)
+    if any([v.get("status", None) == ProcessStatus.RUNNING for v in process_status.get("status", [])]):
+        return jsonify(
+            name=process_name,
+            error=f"A process is currently running for this corpus. Use '/status?process={process_name}' for specifics."
+        ), int(HTTPResponses.FORBIDDEN)
+    if not data and not document_server_config:
+        return jsonify(
+            name=process_name,
+            error="Neither data provided for upload with 'data' key nor a config file for documents on a server"
+        ), int(HTTPResponses.BAD_REQUEST)
+
+    processes = [
+        (StepsName.DATA, PreprocessingUtil, data_functions.DataProcessingFactory,),
+        (StepsName.EMBEDDING, PhraseEmbeddingUtil, embedding_functions.SentenceEmbeddingsFactory,),
+        (StepsName.CLUSTERING, ClusteringUtil, cluster_functions.PhraseClusterFactory,),
+        (StepsName.GRAPH, GraphCreationUtil, cluster_functions.WordEmbeddingClustering,)
+    ]
+    processes_threading = []
+
+    for _name, _proc, _fact in processes:
+        process_obj = _proc(app=app, file_storage=FILE_STORAGE_TMP)
+        if not process_obj.has_pickle(process_name) and _name != StepsName.GRAPH:
+            return jsonify(
+                name=process_name,
+                error=f"There is no '{_name}' step present for '{process_name}'; run '/pipeline' first."
+            ), int(HTTPResponses.NOT_FOUND)
+        # the steps are continued with the configuration they were created with
+        process_obj.process_name = process_name
+        process_obj.set_file_storage_path(process_name)
+        _, _stored_config = process_obj.read_stored_config()
+        process_obj.read_config(config=_stored_config, process_name=process_name)
+
+        if _name == StepsName.DATA:
+            if data:
+                process_obj.read_labels(labels)
+                process_obj.read_data(data)
+            else:
+                ds_base_config = get_data_server_config(document_server_config, app)
+                if not check_data_server(url=ds_base_config["url"], port=ds_base_config["port"],
+                                         index=ds_base_config["index"]):
+                    return jsonify(
+                        name=process_name,
+                        error=f"There is no data server at the specified location ({ds_base_config}) or it contains no data."
+                    ), int(HTTPResponses.NOT_FOUND)
+                label_getter = ds_base_config.get("label_key", None)
+                process_obj.read_labels(label_getter)
+                # the whole index is read again; the documents the corpus already has are skipped when appending
+                process_obj.read_data(
+                    get_documents_from_es_server(
+                        url=ds_base_config['url'], port=ds_base_config['port'], index=ds_base_config['index'],
+                        size=int(ds_base_config['size']), other_id=ds_base_config['other_id']
+                    ),
+                    replace_keys=ds_base_config.get("replace_keys", {"text": "content"}), label_getter=label_getter
+                )
+        add_status_to_running_process(process_name, _name, ProcessStatus.STARTED, running_processes)
+        processes_threading.append((process_obj, _fact, _name, ))
+
+    pipeline_thread = StoppableThread(
+        target_args=(app, processes_threading, process_name, running_processes, pipeline_threads_store, True,),
+        group=None, target=start_processes, name=None)
+
+    start_thread(app, process_name, pipeline_thread, pipeline_threads_store)
+
+    if return_statistics:
+        pipeline_thread.join()
+        _graph_stats_dict = graph_get_statistics(app=app, data=process_name, path=FILE_STORAGE_TMP)
+        return (
+            jsonify(name=process_name, **_graph_stats_dict),
+            int(HTTPResponses.OK) if "error" not in _graph_stats_dict else int(HTTPResponses.INTERNAL_SERVER_ERROR)
+        )
+    return (
+        jsonify(
+            name=process_name,
+            status=running_processes.get(process_name, {"status": []}).get("status")
+        ),
+        int(HTTPResponses.ACCEPTED)
+    )
+
+
 @app.route("/processes/<process_id>/stop", methods=["GET"])
 def stop_pipeline(process_id):
     if request.method == "GET":
@@ -466,6 +562,11 @@ def get_status_of():
     ), int(HTTPResponses.NOT_FOUND)
 
 
+@app.route("/status/spacy-models", methods=['GET'])
+def get_spacy_models():
+    return jsonify(spacy_models.statistics()), int(HTTPResponses.OK)
+
+
 @app.route("/status/document-server", methods=['POST', 'GET'])
 def get_data_server():
     # if request.method == "GET" and request.args.get("port", False):
@@ -261,7 +261,8 @@ def start_processes(
         processes: tuple,
         process_name: str,
         process_tracker: dict[str, dict],
-        thread_store: dict[str, StoppableThread]
+        thread_store: dict[str, StoppableThread],
+        append: bool = False
 ):
     _name_marker = {
         StepsName.DATA: "**data**, embedding, clustering, graph",
@@ -280,7 +281,7 @@ def start_processes(
                 )
                 continue
         try:
-            process_obj.start_process(
+            (process_obj.start_append if append else process_obj.start_process)(
                 cache_name=process_name,
                 process_factory=_fact,
                 process_tracker=process_tracker
@@ -412,14 +413,18 @@ def data_get_statistics(data_obj):
     return jsonify(
         number_of_documents=data_obj.documents_n,
         number_of_data_chunks=data_obj.chunk_sets_n,
-        number_of_label_types=len(data_obj.true_labels)
+        number_of_label_types=len(data_obj.true_labels),
+        boilerplate=data_obj.boilerplate_statistics
     )
 
 
 def embedding_get_statistics(emb_obj):
     return jsonify(
         number_of_embeddings=emb_obj.sentence_embeddings.shape[0],
-        embedding_dim=emb_obj.embedding_dim
+        embedding_dim=emb_obj.embedding_dim,
+        model=emb_obj.model_name,
+        normalized=emb_obj.normalized,
+        embedding_store=emb_obj.store_statistics
     )
 
 
@@ -1,8 +1,18 @@
+import contextlib
 import inspect
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
 import zipfile
 from pathlib import Path
 from types import GeneratorType
-from typing import List, Dict, Union, Generator, Optional
+from typing import List, Dict, Union, Generator, Optional, Iterable
 
 import flask.app
 import spacy
@@ -13,7 +23,203 @@ from werkzeug.datastructures import FileStorage
 from main_utils import ProcessStatus, StepsName, add_status_to_running_process, get_bool_expression, NegspacyConfig
 from src.negspacy.utils import FeaturesOfInterest
 
-DEFAULT_SPACY_MODEL = "en_core_web_trf"
+sys.path.insert(0, "src")
+from data_functions import validate_negspacy_config, load_spacy_model, DEFAULT_SPACY_MODEL
+
+# how many documents may be buffered between the server thread and the worker process
+WORKER_QUEUE_SIZE = 64
+# spaCy models (comma separated) that are loaded when the server starts, e.g. "de_dep_news_trf,en_core_web_trf"
+SPACY_MODELS_PREWARM = os.environ.get("SPACY_MODELS_PREWARM", "")
+# how much memory (in MB) the loaded, but currently unused spaCy pipelines may take up before they're evicted
+SPACY_MODELS_MEMORY_MB = int(os.environ.get("SPACY_MODELS_MEMORY_MB", 8192))
+
+
+def _model_size_mb(
+        pipeline: spacy.Language
+) -> float:
+    # the size of the model files is taken as an estimate of the memory the loaded pipeline needs
+    if pipeline.path is None or not Path(pipeline.path).exists():
+        return 0.0
+    return sum(f.stat().st_size for f in Path(pipeline.path).rglob("*") if f.is_file()) / 2 ** 20
+
+
+class SpacyModelRegistry:
+    """
+    Keeps loaded spaCy pipelines (with the 'negex' component already added) around between preprocessing jobs,
+    keyed by model, excluded components and negex config. Each job gets an instance of its own via 'lease';
+    the unused instances are evicted (least recently used first) when they exceed the memory budget.
+    """
+
+    def __init__(
+            self,
+            memory_mb: Optional[float] = SPACY_MODELS_MEMORY_MB,
+            logger: Optional[logging.Logger] = None
+    ):
+        self._memory_mb = memory_mb
+        self._logger = logging.getLogger(__name__) if logger is None else logger
+        self._lock = threading.Lock()
+        self._instances = []
+        self._loads = 0
+        self._hits = 0
+
+    @staticmethod
+    def negex_config(
+            omit_negated_chunks: bool = False,
+            negspacy_config=None
+    ) -> Optional[dict]:
+        """
+        :returns: the config 'negex' is added with by DataProcessing (None if negated chunks aren't omitted)
+        """
+        if not omit_negated_chunks:
+            return None
+        return validate_negspacy_config(negspacy_config) if negspacy_config is not None else {}
+
+    @staticmethod
+    def key(
+            model: str,
+            disable: Optional[Iterable[str]] = None,
+            negex_config: Optional[dict] = None
+    ) -> str:
+        return json.dumps([model, SpacyModelRegistry._components(disable), negex_config], sort_keys=True, default=str)
+
+    @staticmethod
+    def _components(
+            disable: Optional[Iterable[str]]
+    ) -> List[str]:
+        # 'disable' comes from the yaml config and might be the string 'None'
+        return sorted(set(disable)) if isinstance(disable, (list, tuple, set)) else []
+
+    @property
+    def memory_mb(self) -> float:
+        return sum(i["size_mb"] for i in self._instances)
+
+    def statistics(self) -> dict:
+        with self._lock:
+            return {
+                "instances": [{"model": i["model"], "exclude": i["exclude"], "negex": i["negex_config"] is not None,
+                               "in_use": i["in_use"], "size_mb": round(i["size_mb"], 1)} for i in self._instances],
+                "memory_mb": round(self.memory_mb, 1),
+                "memory_budget_mb": self._memory_mb,
+                "loads": self._loads,
+                "hits": self._hits
+            }
+
+    def prewarm(
+            self,
+            models: Union[str, Iterable[str]]
+    ) -> None:
+        for _model in ([m.strip() for m in models.split(",") if m.strip()] if isinstance(models, str) else models):
+            _start = time.perf_counter()
+            with self.lease(_model):
+                pass
+            self._logger.info(f"Pre-warmed spaCy model '{_model}' in {time.perf_counter() - _start:.1f}s.")
+
+    @contextlib.contextmanager
+    def lease(
+            self,
+            model: str,
+            disable: Optional[Iterable[str]] = None,
+            negex_config: Optional[dict] = None
+    ) -> Generator[spacy.Language, None, None]:
+        """
+        Hands out a pipeline that no other job uses at the same time; components the job adds to it
+        (e.g. the rule based chunker) are removed again, when the lease ends.
+        """
+        _instance = self._acquire(model, disable, negex_config)
+        if _instance is None:
+            _instance = self._load(model, disable, negex_config)
+        try:
+            yield _instance["pipeline"]
+        finally:
+            self._reset(_instance)
+            with self._lock:
+                _instance["in_use"] = False
+                _instance["last_used"] = time.monotonic()
+                self._evict()
+
+    def _acquire(
+            self,
+            model: str,
+            disable: Optional[Iterable[str]],
+            negex_config: Optional[dict]
+    ) -> Optional[dict]:
+        _key = self.key(model, disable, negex_config)
+        _exclude = self._components(disable)
+        with self._lock:
+            _idle = [i for i in self._instances if not i["in_use"] and i["model"] == model and i["exclude"] == _exclude]
+            # an idle instance with another negex config is still cheaper to adapt than loading the model again
+            _instance = next((i for i in _idle if i["key"] == _key), next(iter(_idle), None))
+            if _instance is None:
+                return None
+            _instance["in_use"] = True
+            self._hits += 1
+        if _instance["key"] != _key:
+            self._set_negex(_instance["pipeline"], negex_config)
+            _instance.update(key=_key, negex_config=negex_config, pipe_names=list(_instance["pipeline"].pipe_names))
+        return _instance
+
+    def _load(
+            self,
+            model: str,
+            disable: Optional[Iterable[str]],
+            negex_config: Optional[dict]
+    ) -> dict:
+        _exclude = self._components(disable)
+        _pipeline = load_spacy_model(model, self._logger, exclude=_exclude)
+        self._set_negex(_pipeline, negex_config)
+        _instance = {"key": self.key(model, disable, negex_config), "model": model, "exclude": _exclude,
+                     "negex_config": negex_config, "pipeline": _pipeline, "pipe_names": list(_pipeline.pipe_names),
+                     "size_mb": _model_size_mb(_pipeline), "in_use": True, "last_used": time.monotonic()}
+        with self._lock:
+            self._instances.append(_instance)
+            self._loads += 1
+        self._logger.info(f"Loaded spaCy model '{model}' ({_instance['size_mb']:.0f} MB); "
+                          f"{len(self._instances)} pipeline(s) loaded.")
+        return _instance
+
+    @staticmethod
+    def _set_negex(
+            pipeline: spacy.Language,
+            negex_config: Optional[dict]
+    ) -> None:
+        if "negex" in pipeline.pipe_names:
+            pipeline.remove_pipe("negex")
+        if negex_config is not None:
+            pipeline.add_pipe("negex", last=True, config=negex_config)
+
+    @staticmethod
+    def _reset(
+            instance: dict
+    ) -> None:
+        _pipeline = instance["pipeline"]
+        for _name in [p for p in _pipeline.component_names if p not in instance["pipe_names"]]:
+            _pipeline.remove_pipe(_name)
+        for _name in _pipeline.disabled:
+            _pipeline.enable_pipe(_name)
+
+    def _evict(self) -> None:
+        # has to be called with the lock held
+        if self._memory_mb is None:
+            return
+        for _instance in sorted([i for i in self._instances if not i["in_use"]], key=lambda i: i["last_used"]):
+            if self.memory_mb <= self._memory_mb:
+                break
+            self._instances.remove(_instance)
+            self._logger.info(f"Evicted spaCy model '{_instance['model']}' ({_instance['size_mb']:.0f} MB); "
+                              f"memory budget is {self._memory_mb} MB.")
+
+
+spacy_models = SpacyModelRegistry()
+
+
+def _data_processing_worker(model, process_factory, data_queue, create_kwargs, factory_method="create"):
+    # runs in its own (spawned) process: here spaCy may fork its 'n_process' children safely,
+    # which it can't from within the server's pipeline thread
+    getattr(process_factory, factory_method)(
+        pipeline=load_spacy_model(model, logging.getLogger(__name__)),
+        base_data=iter(data_queue.get, None),
+        **create_kwargs
+    )
 
 
 class PreprocessingUtil:
@@ -35,6 +241,19 @@ class PreprocessingUtil:
                  "label": labels.get(Path(f.filename).stem, None)}
                 for f in zip_archive.filelist if (not f.is_dir()) and (Path(f.filename).suffix.lstrip('.') == extension.lstrip('.'))]
 
+    def _stream_zip_content(self, archive_path: Path, labels) -> Generator[Dict[str, str], None, None]:
+        # opens the archive itself, so that members are only read & decoded when the consumer asks for them
+        extension = self.config.get("file_extension", "txt")
+        encoding = self.config.get('file_encoding', 'utf-8')
+        labels = {} if labels is None else labels
+        with zipfile.ZipFile(archive_path, mode='r') as archive:
+            for f in archive.filelist:
+                if f.is_dir() or (Path(f.filename).suffix.lstrip('.') != extension.lstrip('.')):
+                    continue
+                yield {"name": Path(f.filename).stem,
+                       "content": archive.read(f.filename).decode(encoding),
+                       "label": labels.get(Path(f.filename).stem, None)}
+
     @property
     def process_name(self):
         return self._process_name
@@ -60,7 +279,8 @@ class PreprocessingUtil:
             _pickle = Path(self._file_storage / process / f"{process}_{self.process_step}.pickle")
             _pickle.unlink()
 
-    def read_data(self, data: Union[FileStorage, Path, Generator], replace_keys: Optional[dict], label_getter: Optional[str]):
+    def read_data(self, data: Union[FileStorage, Path, Generator], replace_keys: Optional[dict] = None,
+                  label_getter: Optional[str] = None):
         try:
             if isinstance(data, FileStorage):
                 archive_path = Path(self._file_storage / data.filename)
@@ -90,6 +310,9 @@ class PreprocessingUtil:
             else:
                 self.data = None
                 return
+            if self.config is not None and get_bool_expression(self.config.get("stream_data", False)):
+                self.data = self._stream_zip_content(archive_path, self.labels)
+                return
             with zipfile.ZipFile(archive_path, mode='r') as archive:
                 self.data = self._read_zip_content(archive, self.labels)
         except Exception as e:
@@ -118,10 +341,8 @@ class PreprocessingUtil:
             base_config["spacy_model"] = _language_model_map.get(language, DEFAULT_SPACY_MODEL)
 
         base_config["corpus_name"] = process_name.lower() if process_name is not None else base_config["corpus_name"].lower()
-        # ToDo: Since n_process > 1 would induce Multiprocessing and this doesn't work with the Threading approach
-        #  to keep the server able to respond, the value will be popped here.
-        #  Maybe I can find a solution to this problem
-        base_config.pop("n_process", None)
+        # n_process > 1 is handled by 'start_process' with a dedicated worker process
+        # (multiprocessing from within the threaded server isn't safe otherwise)
 
         self.serializable_config = base_config.copy()
         if base_config.get("negspacy", False):
@@ -176,25 +397,84 @@ class PreprocessingUtil:
         config_yaml = yaml.safe_load(_file.open('rb'))
         return self.process_step, config_yaml
 
+    def _negex_config(self) -> Optional[dict]:
+        return spacy_models.negex_config(
+            self.config.get("omit_negated_chunks", False), self.config.get("negspacy_config", None))
+
+    def _start_worker_process(self, model, cache_name, process_factory, create_kwargs, factory_method="create"):
+        _context = multiprocessing.get_context("spawn")
+        _data_queue = _context.Queue(maxsize=WORKER_QUEUE_SIZE)
+        _worker = _context.Process(
+            target=_data_processing_worker,
+            args=(model, process_factory, _data_queue, create_kwargs, factory_method),
+            name=f"{cache_name}_{self.process_step}_worker"
+        )
+        _worker.start()
+        try:
+            for _entry in itertools.chain(self.data if self.data is not None else [], [None]):
+                while True:
+                    try:
+                        _data_queue.put(_entry, timeout=1)
+                        break
+                    except queue.Full:
+                        if not _worker.is_alive():
+                            raise RuntimeError(f"Worker process '{_worker.name}' died while receiving data.")
+            _worker.join()
+        finally:
+            if _worker.is_alive():
+                _worker.terminate()
+        if _worker.exitcode != 0:
+            raise RuntimeError(f"Worker process '{_worker.name}' failed with exit code {_worker.exitcode}.")
+        return process_factory.load(Path(self._file_storage / f"{cache_name}_{self.process_step}.pickle"))
+
     def start_process(self, cache_name, process_factory, process_tracker):
         config = self.config.copy()
         default_args = inspect.getfullargspec(process_factory.create)[0]
         _model = config.pop("spacy_model", DEFAULT_SPACY_MODEL)
+        _n_shards = int(config.pop("n_shards", None) or 1)
+
+        for x in list(config.keys()):
+            if x not in default_args:
+                config.pop(x)
+
+        add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.RUNNING, process_tracker)
+        _process = None
         try:
-            spacy_language = spacy.load(_model)
-        except IOError as e:
-            if _model != DEFAULT_SPACY_MODEL:
-                self._app.logger.error(f"{e}\nUsing default model {DEFAULT_SPACY_MODEL}.")
-                try:
-                    spacy_language = spacy.load(DEFAULT_SPACY_MODEL)
-                except IOError as e:
-                    self._app.logger.error(f"{e}\ntrying to download default model {DEFAULT_SPACY_MODEL}.")
-                    spacy.cli.download(DEFAULT_SPACY_MODEL)
-                    spacy_language = spacy.load(DEFAULT_SPACY_MODEL)
+            _create_kwargs = dict(
+                cache_name=f"{cache_name}_{self.process_step}",
+                cache_path=self._file_storage,
+                save_to_file=True,
+                **config
+            )
+            if _n_shards > 1:
+                self._app.logger.info(f"Parsing {_n_shards} shards in separate worker processes.")
+                _process = process_factory.create_sharded(
+                    pipeline=_model,
+                    base_data=self.data,
+                    n_shards=_n_shards,
+                    **_create_kwargs
+                )
+            elif int(config.get("n_process", None) or 1) > 1:
+                self._app.logger.info(f"Parsing with {config['n_process']} processes in a dedicated worker process.")
+                _process = self._start_worker_process(_model, cache_name, process_factory, _create_kwargs)
             else:
-                self._app.logger.error(f"{e}\ntrying to download default model {DEFAULT_SPACY_MODEL}.")
-                spacy.cli.download(DEFAULT_SPACY_MODEL)
-                spacy_language = spacy.load(DEFAULT_SPACY_MODEL)
+                with spacy_models.lease(_model, config.get("disable", None), self._negex_config()) as _pipeline:
+                    _process = process_factory.create(
+                        pipeline=_pipeline,
+                        base_data=self.data,
+                        **_create_kwargs
+                    )
+            add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.FINISHED, process_tracker)
+        except Exception as e:
+            add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.ABORTED, process_tracker)
+            self._app.logger.error(e)
+
+        return _process
+
+    def start_append(self, cache_name, process_factory, process_tracker):
+        config = self.config.copy()
+        default_args = inspect.getfullargspec(process_factory.append)[0]
+        _model = config.pop("spacy_model", DEFAULT_SPACY_MODEL)
 
         for x in list(config.keys()):
             if x not in default_args:
@@ -203,14 +483,24 @@ class PreprocessingUtil:
         add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.RUNNING, process_tracker)
         _process = None
         try:
-            _process = process_factory.create(
-                pipeline=spacy_language,
-                base_data=self.data,
+            _append_kwargs = dict(
+                data_obj=Path(self._file_storage / f"{cache_name}_{self.process_step}.pickle"),
                 cache_name=f"{cache_name}_{self.process_step}",
                 cache_path=self._file_storage,
                 save_to_file=True,
                 **config
             )
+            if int(config.get("n_process", None) or 1) > 1:
+                self._app.logger.info(f"Parsing with {config['n_process']} processes in a dedicated worker process.")
+                _process = self._start_worker_process(_model, cache_name, process_factory, _append_kwargs, "append")
+            else:
+                # the data object adds 'negex' with the config it was created with (and the lease removes it again)
+                with spacy_models.lease(_model, config.get("disable", None)) as _pipeline:
+                    _process = process_factory.append(
+                        pipeline=_pipeline,
+                        base_data=self.data,
+                        **_append_kwargs
+                    )
             add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.FINISHED, process_tracker)
         except Exception as e:
             add_status_to_running_process(self.process_name, self.process_step, ProcessStatus.ABORTED, process_tracker)
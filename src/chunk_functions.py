@@ -0,0 +1,481 @@
+from typing import Optional, Iterable, Dict, List, Union, Iterator, Any, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+class ChunkTable:
+    """
+    Columnar representation of the aggregated noun chunks ('data_chunk_sets').
+
+    Each phrase is interned once and its position is its id; the occurrence counts are held in a numpy array and the
+    documents a phrase occurs in are stored as CSR postings (``indices[indptr[i]:indptr[i + 1]]`` are the document
+    indices of phrase ``i``). Indexing or iterating the table yields the former ``{"text", "doc", "count"}`` dicts,
+    where "doc" holds the document ids, so existing consumers keep working.
+    """
+    def __init__(
+            self,
+            texts: Optional[List[str]] = None,
+            counts: Optional[Iterable[int]] = None,
+            indptr: Optional[Iterable[int]] = None,
+            indices: Optional[Iterable[int]] = None,
+            doc_ids: Optional[Iterable[Any]] = None
+    ) -> None:
+        self._texts = list(texts) if texts is not None else list()
+        self._text_ids = {t: i for i, t in enumerate(self._texts)}
+        self.counts = np.asarray(counts if counts is not None else [], dtype=np.int64)
+        self.indptr = np.asarray(indptr if indptr is not None else [0], dtype=np.int64)
+        self.indices = np.asarray(indices if indices is not None else [], dtype=np.int64)
+        self._doc_ids = list(doc_ids) if doc_ids is not None else None
+        self._text_array = None
+        if not (len(self._texts) == self.counts.shape[0] == self.indptr.shape[0] - 1):
+            raise ValueError("'texts', 'counts' and 'indptr' of a ChunkTable need to be aligned.")
+
+    @classmethod
+    def from_postings(
+            cls,
+            texts: List[str],
+            counts: Iterable[int],
+            postings: Iterable[Iterable[int]],
+            doc_ids: Optional[Iterable[Any]] = None
+    ) -> 'ChunkTable':
+        _postings = [np.unique(np.asarray(list(p), dtype=np.int64)) for p in postings]
+        _indptr = np.zeros(len(_postings) + 1, dtype=np.int64)
+        np.cumsum([p.shape[0] for p in _postings], out=_indptr[1:])
+        _indices = np.concatenate(_postings) if len(_postings) > 0 else np.asarray([], dtype=np.int64)
+        return cls(texts=texts, counts=counts, indptr=_indptr, indices=_indices, doc_ids=doc_ids)
+
+    @classmethod
+    def from_document_matrix(
+            cls,
+            texts: List[str],
+            document_phrase_matrix: sparse.spmatrix,
+            doc_ids: Optional[Iterable[Any]] = None
+    ) -> 'ChunkTable':
+        # the columns of a (documents x phrases) count matrix in CSC format are exactly the postings of the phrases
+        _csc = sparse.csc_matrix(document_phrase_matrix)
+        _csc.sum_duplicates()
+        _csc.eliminate_zeros()
+        return cls(texts=texts, counts=np.asarray(_csc.sum(axis=0)).ravel(), indptr=_csc.indptr,
+                   indices=_csc.indices, doc_ids=doc_ids)
+
+    @classmethod
+    def from_dicts(
+            cls,
+            chunk_set_dicts: Iterable[Dict[str, Any]]
+    ) -> 'ChunkTable':
+        # used for the list of dicts that older pickles hold; the document ids are mapped onto a dense index
+        _chunk_set_dicts = list(chunk_set_dicts)
+        _doc_ids = sorted(set(d for csd in _chunk_set_dicts for d in csd["doc"]), key=lambda x: (str(type(x)), x))
+        _doc_index = {d: i for i, d in enumerate(_doc_ids)}
+        return cls.from_postings(
+            texts=[csd["text"] for csd in _chunk_set_dicts],
+            counts=[csd["count"] for csd in _chunk_set_dicts],
+            postings=[[_doc_index[d] for d in csd["doc"]] for csd in _chunk_set_dicts],
+            doc_ids=_doc_ids
+        )
+
+    def __len__(
+            self
+    ) -> int:
+        return len(self._texts)
+
+    def __iter__(
+            self
+    ) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def __getitem__(
+            self,
+            item: Union[int, np.integer, slice]
+    ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(item, slice):
+            return [self._row(i) for i in range(*item.indices(len(self)))]
+        _item = int(item)
+        if _item < 0:
+            _item += len(self)
+        if not 0 <= _item < len(self):
+            raise IndexError("ChunkTable index out of range")
+        return self._row(_item)
+
+    def _row(
+            self,
+            idx: int
+    ) -> Dict[str, Any]:
+        return {"text": self._texts[idx], "doc": self.docs(idx, as_ids=True), "count": int(self.counts[idx])}
+
+    @property
+    def texts(
+            self
+    ) -> List[str]:
+        return self._texts
+
+    @property
+    def text_ids(
+            self
+    ) -> Dict[str, int]:
+        return self._text_ids
+
+    @property
+    def text_array(
+            self
+    ) -> np.ndarray:
+        if self._text_array is None or self._text_array.shape[0] != len(self._texts):
+            self._text_array = np.asarray(self._texts, dtype=object)
+        return self._text_array
+
+    @property
+    def doc_counts(
+            self
+    ) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def phrase_id(
+            self,
+            text: str
+    ) -> Optional[int]:
+        return self._text_ids.get(text, None)
+
+    def docs(
+            self,
+            idx: int,
+            as_ids: bool = False
+    ) -> Union[np.ndarray, list]:
+        _docs = self.indices[self.indptr[idx]:self.indptr[idx + 1]]
+        if not as_ids:
+            return _docs
+        if self._doc_ids is None:
+            return _docs.tolist()
+        return [self._doc_ids[d] for d in _docs]
+
+    def take(
+            self,
+            ids: Iterable[int]
+    ) -> 'ChunkTable':
+        _ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64)
+        _starts = self.indptr[_ids]
+        _lengths = self.indptr[_ids + 1] - _starts
+        _indptr = np.zeros(_ids.shape[0] + 1, dtype=np.int64)
+        np.cumsum(_lengths, out=_indptr[1:])
+        # gathers the posting rows of all selected phrases in one go
+        _gather = np.repeat(_starts - _indptr[:-1], _lengths) + np.arange(_indptr[-1])
+        return ChunkTable(
+            texts=[self._texts[i] for i in _ids],
+            counts=self.counts[_ids],
+            indptr=_indptr,
+            indices=self.indices[_gather],
+            doc_ids=self._doc_ids
+        )
+
+    def add(
+            self,
+            texts: List[str],
+            counts: Iterable[int],
+            postings: Iterable[Iterable[int]],
+            doc_ids: Optional[Dict[int, Any]] = None
+    ) -> np.ndarray:
+        """
+        Merges phrases into the table: known phrases get their counts and postings updated, unknown phrases are
+        appended at the end (so existing ids stay valid).
+
+        :returns: the ids of the appended phrases
+        """
+        _n_old = len(self)
+        _ids = np.empty(len(texts), dtype=np.int64)
+        for i, _text in enumerate(texts):
+            _id = self._text_ids.get(_text, None)
+            if _id is None:
+                _id = len(self._texts)
+                self._texts.append(_text)
+                self._text_ids[_text] = _id
+            _ids[i] = _id
+        _n_new = len(self._texts)
+
+        _counts = np.zeros(_n_new, dtype=np.int64)
+        _counts[:_n_old] = self.counts
+        np.add.at(_counts, _ids, np.asarray(list(counts), dtype=np.int64))
+
+        _postings = [np.asarray(list(p), dtype=np.int64) for p in postings]
+        _rows = np.concatenate([np.repeat(np.arange(_n_old, dtype=np.int64), self.doc_counts)] +
+                               [np.full(p.shape[0], _id, dtype=np.int64) for _id, p in zip(_ids, _postings)])
+        _cols = np.concatenate([self.indices] + _postings)
+        _order = np.lexsort((_cols, _rows))
+        _rows, _cols = _rows[_order], _cols[_order]
+        _unique = np.ones(_rows.shape[0], dtype=bool)
+        _unique[1:] = (_rows[1:] != _rows[:-1]) | (_cols[1:] != _cols[:-1])
+
+        self.counts = _counts
+        self.indices = _cols[_unique]
+        self.indptr = np.zeros(_n_new + 1, dtype=np.int64)
+        np.cumsum(np.bincount(_rows[_unique], minlength=_n_new), out=self.indptr[1:])
+
+        if doc_ids:
+            if self._doc_ids is None:
+                self._doc_ids = list(range(int(self.indices.max()) + 1 if self.indices.shape[0] > 0 else 0))
+            for _index, _doc_id in sorted(doc_ids.items()):
+                while len(self._doc_ids) <= _index:
+                    self._doc_ids.append(len(self._doc_ids))
+                self._doc_ids[_index] = _doc_id
+        return np.arange(_n_old, _n_new, dtype=np.int64)
+
+    def to_dicts(
+            self
+    ) -> List[Dict[str, Any]]:
+        return list(self)
+
+
+class ChunkFeatures:
+    """
+    Compact store of the noun chunk occurrences, filled once while parsing: for every chunk its document index,
+    negation flag, the position of its head, its text ('span') and character offset in the document (-1 if unknown),
+    and for every token that survives the cleaning (see
+    ``data_functions.clean_span``; stop words, determiners, pronouns, numbers and whitespace are dropped) the ids of
+    its text, lemma and POS tag in a shared string table. ``indptr[i]:indptr[i + 1]`` are the tokens of chunk ``i``;
+    a head of -1 marks chunks that don't yield a phrase.
+
+    All phrase variants (text or lemma, head prepended or head only, case-sensitive or not) are derived from these
+    arrays, so the spaCy docs aren't needed again. Optionally, a vector per chunk (e.g. pooled transformer outputs)
+    is kept as well.
+    """
+    def __init__(
+            self
+    ) -> None:
+        self._strings = list()
+        self._string_ids = dict()
+        self._lower_ids = np.asarray([], dtype=np.int64)
+        self.doc_ids = dict()
+        self._columns = {
+            "doc_index": np.asarray([], dtype=np.int64),
+            "negated": np.asarray([], dtype=bool),
+            "head": np.asarray([], dtype=np.int64),
+            "span": np.asarray([], dtype=np.int64),
+            "char_offset": np.asarray([], dtype=np.int64),
+            "lengths": np.asarray([], dtype=np.int64),
+            "text": np.asarray([], dtype=np.int64),
+            "lemma": np.asarray([], dtype=np.int64),
+            "pos": np.asarray([], dtype=np.int64)
+        }
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._pending = list()
+        # blocks of (number of chunks, their vectors or None)
+        self._vectors = list()
+
+    def __len__(
+            self
+    ) -> int:
+        return self._column("doc_index").shape[0]
+
+    def _column(
+            self,
+            name: str
+    ) -> np.ndarray:
+        if len(self._pending) > 0:
+            # the chunks are added per document, so they are only concatenated once they are read
+            for _name in self._columns.keys():
+                self._columns[_name] = np.concatenate([self._columns[_name]] + [p[_name] for p in self._pending])
+            self._indptr = np.zeros(self._columns["lengths"].shape[0] + 1, dtype=np.int64)
+            np.cumsum(self._columns["lengths"], out=self._indptr[1:])
+            self._pending = list()
+        return self._indptr if name == "indptr" else self._columns[name]
+
+    doc_index = property(lambda self: self._column("doc_index"))
+    negated = property(lambda self: self._column("negated"))
+    head = property(lambda self: self._column("head"))
+    span = property(lambda self: self._column("span"))
+    char_offset = property(lambda self: self._column("char_offset"))
+    indptr = property(lambda self: self._column("indptr"))
+    text = property(lambda self: self._column("text"))
+    lemma = property(lambda self: self._column("lemma"))
+    pos = property(lambda self: self._column("pos"))
+
+    @property
+    def strings(
+            self
+    ) -> List[str]:
+        return self._strings
+
+    def intern(
+            self,
+            strings: Iterable[str]
+    ) -> np.ndarray:
+        _ids = []
+        for _string in strings:
+            _id = self._string_ids.get(_string, None)
+            if _id is None:
+                _id = len(self._strings)
+                self._strings.append(_string)
+                self._string_ids[_string] = _id
+            _ids.append(_id)
+        return np.asarray(_ids, dtype=np.int64)
+
+    def extend(
+            self,
+            doc_index: Iterable[int],
+            negated: Iterable[bool],
+            head: Iterable[int],
+            lengths: Iterable[int],
+            text: Iterable[str],
+            lemma: Iterable[str],
+            pos: Iterable[str],
+            span: Optional[Iterable[str]] = None,
+            char_offset: Optional[Iterable[Optional[int]]] = None,
+            doc_ids: Optional[Dict[int, Any]] = None,
+            vectors: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        Appends chunks; ``lengths`` are the numbers of (cleaned) tokens per chunk and ``text``, ``lemma`` & ``pos``
+        hold the tokens of all chunks one after the other.
+        """
+        _doc_index = np.asarray(list(doc_index), dtype=np.int64)
+        self._add_vectors(_doc_index.shape[0], vectors)
+        self._pending.append({
+            "doc_index": _doc_index,
+            "negated": np.asarray(list(negated), dtype=bool),
+            "head": np.asarray(list(head), dtype=np.int64),
+            "span": self.intern([""] * _doc_index.shape[0] if span is None else span),
+            "char_offset": np.asarray([-1 if o is None else o for o in char_offset] if char_offset is not None
+                                      else np.full(_doc_index.shape[0], -1), dtype=np.int64),
+            "lengths": np.asarray(list(lengths), dtype=np.int64),
+            "text": self.intern(text),
+            "lemma": self.intern(lemma),
+            "pos": self.intern(pos)
+        })
+        if doc_ids:
+            self.doc_ids.update(doc_ids)
+
+    def merge(
+            self,
+            other: 'ChunkFeatures',
+            doc_offset: int = 0
+    ) -> None:
+        """
+        Appends all chunks of another store (e.g. of a shard of the corpus), re-interning its strings and shifting
+        its document indexes by ``doc_offset``.
+        """
+        _string_map = self.intern(other.strings)
+        _chunk = {_name: other._column(_name) for _name in self._columns.keys()}
+        for _name in ["span", "text", "lemma", "pos"]:
+            _chunk[_name] = _string_map[_chunk[_name]]
+        _chunk["doc_index"] = _chunk["doc_index"] + doc_offset
+        self._add_vectors(_chunk["doc_index"].shape[0], other.vectors)
+        self._pending.append(_chunk)
+        self.doc_ids.update({i + doc_offset: _id for i, _id in other.doc_ids.items()})
+
+    def _add_vectors(
+            self,
+            n_chunks: int,
+            vectors: Optional[np.ndarray] = None
+    ) -> None:
+        if getattr(self, "_vectors", None) is None:
+            # older pickles don't have vectors
+            self._vectors = [(len(self), None)]
+        self._vectors.append((n_chunks, None if vectors is None else np.asarray(vectors, dtype=np.float32)))
+
+    @property
+    def vectors(
+            self
+    ) -> Optional[np.ndarray]:
+        """
+        :returns: the vector of every chunk (NaN for chunks that were added without one); None if there are none
+        """
+        _blocks = [(n, v) for n, v in getattr(self, "_vectors", list()) if n > 0]
+        _width = next((v.shape[1] for _, v in _blocks if v is not None), None)
+        if _width is None:
+            return None
+        if len(_blocks) > 1:
+            _vectors = np.concatenate([v if v is not None else np.full((n, _width), np.nan, dtype=np.float32)
+                                       for n, v in _blocks])
+            self._vectors = [(_vectors.shape[0], _vectors)]
+            return _vectors
+        return _blocks[0][1]
+
+    def chunk_dict(
+            self,
+            idx: int
+    ) -> Optional[dict]:
+        """
+        :returns: the cleaned chunk as ``data_functions.clean_span`` returns it (None if it doesn't yield a phrase)
+        """
+        if self.head[idx] < 0:
+            return None
+        _tokens = slice(self.indptr[idx], self.indptr[idx + 1])
+        return {'head_idx': int(self.head[idx]),
+                'lemma': [self._strings[i] for i in self.lemma[_tokens]],
+                'text': [self._strings[i] for i in self.text[_tokens]],
+                'pos': [self._strings[i] for i in self.pos[_tokens]]}
+
+    def _lowercase_ids(
+            self
+    ) -> np.ndarray:
+        # maps every string id onto the id of the lowercased string (which is interned as well)
+        while self._lower_ids.shape[0] < len(self._strings):
+            _start = self._lower_ids.shape[0]
+            _lower = self.intern([s.lower() for s in self._strings[_start:]])
+            self._lower_ids = np.concatenate([self._lower_ids, _lower])
+        return self._lower_ids
+
+    def phrases(
+            self,
+            use_lemma: bool = False,
+            prepend_head: bool = False,
+            head_only: bool = False,
+            case_sensitive: bool = False,
+            chunks: Optional[Iterable[int]] = None
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Derives the phrase of every chunk (as ``data_functions.get_actual_str`` does for a single chunk) without
+        touching the single occurrences: the token id sequences are deduplicated per length with numpy and only the
+        distinct ones are joined to strings.
+
+        :returns: the distinct phrases (in order of their first occurrence) and for every selected chunk the index
+            of its phrase (-1 if the chunk doesn't yield one)
+        """
+        _chunks = np.arange(len(self), dtype=np.int64) if chunks is None else np.asarray(chunks, dtype=np.int64)
+        _inverse = np.full(_chunks.shape[0], -1, dtype=np.int64)
+        _valid = np.flatnonzero(self.head[_chunks] >= 0)
+        _tokens = self.lemma if use_lemma else self.text
+        if not case_sensitive:
+            _tokens = self._lowercase_ids()[_tokens]
+
+        _sel = _chunks[_valid]
+        _starts = self.indptr[_sel]
+        if head_only:
+            _lengths = np.ones(_sel.shape[0], dtype=np.int64)
+            _gather = _starts + self.head[_sel]
+        else:
+            _lengths = self.indptr[_sel + 1] - _starts
+            _offsets = np.zeros(_sel.shape[0] + 1, dtype=np.int64)
+            np.cumsum(_lengths, out=_offsets[1:])
+            _gather = np.repeat(_starts - _offsets[:-1], _lengths) + np.arange(_offsets[-1])
+            if prepend_head:
+                # moves the head in front of the other tokens of its chunk
+                _local = np.arange(_offsets[-1]) - np.repeat(_offsets[:-1], _lengths)
+                _key = np.where(_local == np.repeat(self.head[_sel], _lengths), -1, _local)
+                _gather = _gather[np.lexsort((_key, np.repeat(np.arange(_sel.shape[0]), _lengths)))]
+        _sequences = _tokens[_gather]
+        _seq_offsets = np.zeros(_sel.shape[0] + 1, dtype=np.int64)
+        np.cumsum(_lengths, out=_seq_offsets[1:])
+
+        _unique_rows, _first, _group_inverse = [], [], []
+        for _length in np.unique(_lengths):
+            _members = np.flatnonzero(_lengths == _length)
+            _matrix = _sequences[_seq_offsets[_members][:, None] + np.arange(_length)]
+            _rows, _index, _inv = np.unique(_matrix, axis=0, return_index=True, return_inverse=True)
+            _group_inverse.append((_members, _inv.ravel() + len(_unique_rows)))
+            _unique_rows.extend(_rows)
+            _first.extend(_members[_index])
+
+        _phrases, _phrase_ids = [], dict()
+        _row_to_phrase = np.empty(len(_unique_rows), dtype=np.int64)
+        for _row in np.argsort(np.asarray(_first, dtype=np.int64), kind="stable"):
+            _phrase = " ".join(self._strings[i] for i in _unique_rows[_row])
+            _id = _phrase_ids.get(_phrase, None)
+            if _id is None:
+                _id = len(_phrases)
+                _phrases.append(_phrase)
+                _phrase_ids[_phrase] = _id
+            _row_to_phrase[_row] = _id
+        for _members, _inv in _group_inverse:
+            _inverse[_valid[_members]] = _row_to_phrase[_inv]
+        return _phrases, _inverse
@@ -23,7 +23,7 @@ from sklearn.metrics import adjusted_rand_score
 from sklearn.preprocessing import normalize, MinMaxScaler
 from yellowbrick.cluster import kelbow_visualizer
 from scipy.sparse.csgraph import shortest_path, construct_dist_matrix, NegativeCycleError
-from sklearn.feature_extraction.text import TfidfVectorizer as tfidfVec
+from sklearn.feature_extraction.text import TfidfVectorizer as tfidfVec, TfidfTransformer
 #import sknetwork as skn
 
 from data_functions import DataProcessingFactory, clean_span, get_actual_str
@@ -122,9 +122,10 @@ class WordEmbeddingClustering:
                 self,
                 exclusion_ids: Optional[list] = None
         ) -> list:
+            _texts = self._data_proc.data_chunk_sets.text_array
+            _labels = np.asarray(self._outer_instance._cluster_obj.labels_)
             return [
-                " ".join([self._data_proc.data_chunk_sets[i][self._outer_instance._text_field_value]
-                          for i, j in enumerate(self._outer_instance._cluster_obj.labels_ == n) if j])
+                " ".join(_texts[_labels == n])
                 for n in range(self._outer_instance._cluster_obj.n_clusters) if
                 n not in (self._outer_instance._exclusion_ids if exclusion_ids is None else exclusion_ids)
             ]
@@ -134,11 +135,22 @@ class WordEmbeddingClustering:
                 use_lemma: bool = False,
                 head_only: bool = False
         ) -> list:
-            _dw_matrix = defaultdict(list)
             _outer = self._outer_instance
+            if _outer._text_id_field_value == "doc_index":
+                # the phrases come from the chunk feature store; grouped by document with one sort
+                _texts, _doc_index = self._data_proc.noun_chunk_phrases(use_lemma=use_lemma, head_only=head_only)
+                _order = np.argsort(_doc_index, kind="stable")
+                _keys, _starts = np.unique(_doc_index[_order], return_index=True)
+                _dw_texts = dict(zip(_keys.tolist(), (" ".join(t) for t in np.split(_texts[_order], _starts[1:]))))
+                for _missing_id in set(range(self._data_proc.documents_n)).difference(set(_dw_texts.keys())):
+                    _dw_texts[_missing_id] = ""
+                return [text for _, text in sorted(_dw_texts.items(), key=lambda item: item[0])]
+
+            _dw_matrix = defaultdict(list)
             _text_field = _outer._text_field_value if not use_lemma else _outer._lemma_field_value
             for _d in self._data_proc.noun_chunks_corpus:
-                _chunk_dict = clean_span(_d["spacy_chunk"])
+                _chunk_dict = (clean_span(_d["spacy_chunk"], _d.get("root_i", None)) if _d["spacy_chunk"] is not None
+                               else _d["chunk_dict"])
 
                 _text = ""
                 if _chunk_dict is not None:
@@ -218,6 +230,7 @@ class WordEmbeddingClustering:
             self._outer_instance = outer_instance
             self._sentence_embed = outer_instance._sentence_embed_obj
             self._data_proc = outer_instance._sentence_embed_obj.data_processing_obj
+            self._phrase_variants = self._data_proc.phrase_variants
             self._concept_graphs = None
             self._document_concept_matrix = None
 
@@ -239,13 +252,11 @@ class WordEmbeddingClustering:
 
         l2_norm_document_concept_matrix = property(get_norm_document_concept_matrix)
 
-        def _filter_entries(self, iter: Iterable, filter_list: Optional[
-            list] = None):  # ToDo: use vectorized methods since feature_names are already ndarrays
-            if filter_list is None:
+        def _filter_entries(self, iter: Iterable, filter_mask: Optional[np.ndarray] = None):
+            if filter_mask is None:
                 return iter
-            return [_idx for _idx in iter
-                    if self._sentence_embed.data_processing_obj.data_chunk_sets[_idx][
-                        self._outer_instance._text_field_value] in filter_list]
+            _ids = np.asarray(list(iter), dtype=np.int64)
+            return _ids[filter_mask[_ids]].tolist()
 
         @cache
         def _concept_clusters(
@@ -256,9 +267,8 @@ class WordEmbeddingClustering:
                 restrict_to_cluster: bool = False,
         ) -> Iterable[List[int]]:
             _meaningful_clusters = []
-            tfidf_filter = self._data_proc.tfidf_filter
-            if tfidf_filter is not None:
-                logging.info("Filtering phrases")
+            logging.info("Filtering phrases")
+            _filter_mask = self._data_proc.phrase_filter_mask
             for i, _center in enumerate(self._outer_instance._cluster_obj.cluster_centers_):
                 if i in (self._outer_instance._exclusion_ids if exclusion_ids is None else exclusion_ids):
                     continue
@@ -273,7 +283,7 @@ class WordEmbeddingClustering:
                                     distance=cluster_distance, vector_dim=self._sentence_embed.embedding_dim
                                 )
                             ],
-                            tfidf_filter.get_feature_names_out().tolist() if tfidf_filter is not None else None
+                            _filter_mask
                         )
                     )
                 else:
@@ -283,7 +293,7 @@ class WordEmbeddingClustering:
                                 _center, self._sentence_embed.sentence_embeddings,
                                 distance=cluster_distance, vector_dim=self._sentence_embed.embedding_dim
                             ),
-                            tfidf_filter.get_feature_names_out().tolist() if tfidf_filter is not None else None
+                            _filter_mask
                         )
                     )
 
@@ -299,7 +309,8 @@ class WordEmbeddingClustering:
                 graph_weight_cut_off: float = .5
         ) -> nx.Graph:
             gc = GraphCreator(chunk_set_dict=self._data_proc.data_chunk_sets,
-                              embeddings=self._sentence_embed.sentence_embeddings)
+                              embeddings=self._sentence_embed.sentence_embeddings,
+                              variants=self._phrase_variants)
             graph = gc.build_graph_from_cluster(cluster=cluster, weight_on_cosine=graph_cosine_weight,
                                                 merge_threshold=graph_merge_threshold,
                                                 weight_cut_off=graph_weight_cut_off)
@@ -354,18 +365,20 @@ class WordEmbeddingClustering:
                 normalize: bool = False
         ):
             logging.info("Algorithm 4")
-            _tfidf_filter = tfidfVec(min_df=1, max_df=1.0, stop_words=None, analyzer=lambda x: re.split(self._data_proc._chunk_boundary, x))
-            _tfidf_filter_vec = _tfidf_filter.fit_transform(self._data_proc.document_chunk_matrix).todense()
-            _tfidf_vocab = _tfidf_filter.vocabulary_
-            _scaler = MinMaxScaler()
-            _tfidf_filter_vec_norm = _scaler.fit_transform(_tfidf_filter_vec)
+            _tfidf = TfidfTransformer().fit_transform(self._data_proc.document_phrase_matrix).tocsc()
+            # min-max scaling per phrase; the (mostly zero) matrix is only scaled at the entries that are looked up
+            _tfidf_min = _tfidf.min(axis=0).toarray().ravel()
+            _tfidf_range = _tfidf.max(axis=0).toarray().ravel() - _tfidf_min
+            _tfidf_range[_tfidf_range == 0.] = 1.
+            _tfidf_ids = self._data_proc.data_chunk_sets.text_ids
 
             _dump_list = []
             for j, concept_graph in tqdm(enumerate(concept_graphs), total=len(concept_graphs)):
                 concept_graph: nx.Graph
                 _graph = concept_graph.copy(as_view=False)
                 for (nid, ndict) in concept_graph.nodes(data=True):
-                    _graph.add_weighted_edges_from(((nid, f"d{d}", _tfidf_filter_vec_norm[d, _tfidf_vocab[ndict['label']]])
+                    _p = _tfidf_ids[ndict['label']]
+                    _graph.add_weighted_edges_from(((nid, f"d{d}", (_tfidf[d, _p] - _tfidf_min[_p]) / _tfidf_range[_p])
                                                     for d in ndict['documents']))
                 _doc_array = []
                 _doc_eigen_array = []
@@ -510,12 +523,8 @@ class WordEmbeddingClustering:
                 filter_stop: Optional[list] = None,
         ):
             filter_stop = filter_stop if filter_stop is not None else []
-            if (self._data_proc.tfidf_filter is not None and (
-                    self._data_proc.tfidf_filter.get_params().get("min_df", -1) != filter_min_df or
-                    self._data_proc.tfidf_filter.get_params().get("max_df", -1) != filter_max_df or
-                    self._data_proc.tfidf_filter.get_params().get("stop_words", -1) != filter_stop)) or (
-                    self._data_proc.tfidf_filter is None and (
-                    filter_min_df != 1 or filter_max_df != 1. or filter_stop is not None)):
+            if self._data_proc.filter_params != {"min_df": filter_min_df, "max_df": filter_max_df,
+                                                 "stop_words": filter_stop}:
                 logging.info(
                     f"Resetting tfidf filter with min_df: {filter_min_df}, max_df: {filter_max_df}, stopwords: {filter_stop}")
                 self._data_proc.reset_filter(filter_min_df=filter_min_df, filter_max_df=filter_max_df,
@@ -658,6 +667,20 @@ class PhraseClusterFactory:
         assert isinstance(_data, PhraseClusterFactory.PhraseCluster)
         return _data
 
+    @staticmethod
+    def append(
+            cluster_obj: Union['PhraseClusterFactory.PhraseCluster', pathlib.Path, str],
+            sentence_embeddings: Union[SentenceEmbeddingsFactory.SentenceEmbeddings, np.ndarray],
+            cache_path: pathlib.Path,
+            cache_name: str
+    ):
+        _cluster_obj = (cluster_obj if isinstance(cluster_obj, PhraseClusterFactory.PhraseCluster)
+                        else PhraseClusterFactory.load(cluster_obj))
+        _new_labels = _cluster_obj.assign_new_embeddings(sentence_embeddings)
+        logging.info(f"Assigned {_new_labels.shape[0]} new phrases to the existing concept clusters.")
+        save_pickle(_cluster_obj, (cache_path / pathlib.Path(f"{cache_name}.pickle")))
+        return _cluster_obj
+
     class PhraseCluster:
         """
 
@@ -693,6 +716,7 @@ class PhraseClusterFactory:
                 self._down_scale_alg_kwargs["n_neighbors"] = int(_n_neighbors)
 
             self._down_scale_obj = {"umap": umap.UMAP, None: NoneDownScaleObj}[down_scale_algorithm](**self._down_scale_alg_kwargs)
+            self._cluster_by_down_scale = cluster_by_down_scale
             self._concept_cluster = None
             self._kelbow = None
 
@@ -714,6 +738,30 @@ class PhraseClusterFactory:
                 f"kelbow ({self._kelbow.metric})": self._kelbow_alg_kwargs
             }
 
+        def assign_new_embeddings(
+                self,
+                sentence_embeddings: Union[SentenceEmbeddingsFactory.SentenceEmbeddings, np.ndarray]
+        ) -> np.ndarray:
+            """
+            Assigns the embeddings that were appended since fitting to the existing clusters (no refitting).
+
+            :returns: the cluster labels of the new embeddings
+            """
+            _sentence_emb = sentence_embeddings.sentence_embeddings if not isinstance(
+                sentence_embeddings, np.ndarray) else sentence_embeddings
+            _new_emb = _sentence_emb[self._sentence_emb.shape[0]:]
+            if _new_emb.shape[0] == 0:
+                return np.asarray([], dtype=int)
+
+            _predict_emb = _new_emb
+            if (self._cluster_alg == "affinity-prop" and getattr(self, "_cluster_by_down_scale", True) and
+                    not isinstance(self._down_scale_obj, NoneDownScaleObj)):
+                _predict_emb = self._down_scale_obj.transform(_new_emb)
+            _new_labels = self._concept_cluster.predict(_predict_emb)
+            self._concept_cluster.labels_ = np.concatenate([self._concept_cluster.labels_, _new_labels])
+            self._sentence_emb = _sentence_emb
+            return _new_labels
+
         def _build_concept_cluster(
                 self,
                 cluster_by_down_scale: bool = True
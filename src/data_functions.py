@@ -1,28 +1,42 @@
 import copy
+import hashlib
 import io
+import json
 import logging
 import os
 import pathlib
 import re
 import itertools
+import multiprocessing
+import sqlite3
+import time
 import zipfile
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from random import sample
 
 import numpy as np
+from scipy import sparse
+from spacy.attrs import IS_STOP, POS, LIKE_NUM, IS_SPACE, ORTH, LEMMA
+from spacy.parts_of_speech import NAMES as POS_NAMES
+from spacy.symbols import DET, PRON
+from spacy.matcher import Matcher
+from spacy.tokens import DocBin, Span
 from spacy.tokens.doc import Doc
+from spacy.vocab import Vocab
+from spacy.util import filter_spans
 from tqdm.autonotebook import tqdm
-from typing import Optional, Generator, Union, Iterable, Dict, List, Set, Callable, Any
+from typing import Optional, Generator, Union, Iterable, Dict, List, Set, Callable, Any, Tuple
 
 import spacy
-from functools import lru_cache
+from bisect import bisect_left
 
 from spacy import Language
-from sklearn.feature_extraction.text import TfidfVectorizer as tfidfVec
 
 from src.negspacy.utils import FeaturesOfInterest
 from src.negspacy.negation import Negex
 from util_functions import load_pickle, save_pickle
+from chunk_functions import ChunkTable, ChunkFeatures
 
 
 # ToDo: this needs to be called whenever a data_proc object is used/loaded by another class
@@ -37,6 +51,193 @@ def _set_extensions(
         Doc.set_extension("doc_name", default=None)
     if not Doc.has_extension("doc_topic"):
         Doc.set_extension("doc_topic", default=None)
+    if not Doc.has_extension("doc_offset"):
+        Doc.set_extension("doc_offset", default=None)
+
+
+# the spaCy model that is used when a given model can't be loaded
+DEFAULT_SPACY_MODEL = "en_core_web_trf"
+SEGMENTATION_MODES = ("line", "paragraph", "document", "token_budget")
+CHUNKERS = ("parser", "rule")
+# variants of a phrase are grouped by their punctuation/hyphen/whitespace free 'surface' or by their 'lemma' form
+CANONICALIZATIONS = ("surface", "lemma")
+# rule based noun chunks are stored as span group under this key (see 'rule_noun_chunker')
+NOUN_CHUNK_SPAN_KEY = "noun_chunks"
+# (determiner/possessive) (adverbs, adjectives, numbers) nouns
+RULE_CHUNK_PATTERNS = [
+    [{"POS": {"IN": ["DET", "PRON"]}, "OP": "?"},
+     {"POS": {"IN": ["ADV", "ADJ", "NUM"]}, "OP": "*"},
+     {"POS": {"IN": ["NOUN", "PROPN"]}, "OP": "+"}]
+]
+# a length bucket spans this many batches; the segments within it are parsed ordered by length
+LENGTH_BUCKET_BATCHES = 16
+# the annotations (as spaCy components declare them in 'assigns') the preprocessing reads with every config, see
+# 'plan_components'; the lemmas are among them, so that 'use_lemma' can be switched after the parsing
+PREPROCESSING_ANNOTATIONS = ("token.pos", "token.tag", "token.lemma", "token.is_sent_start", "doc.sents")
+LEMMATIZER_COMPONENTS = ("lemmatizer", "trainable_lemmatizer")
+# the expected speedup of a pruned pipeline is measured on this many segments (only with the debug log level)
+PRUNING_SAMPLE_SIZE = 32
+# file name of the parse cache in the cache folder (if 'parse_cache' is just switched on)
+PARSE_CACHE_FILE = "parse_cache.sqlite"
+# how many of the most frequent boilerplate segments are listed in the statistics
+BOILERPLATE_TOP_N = 10
+
+
+@Language.component("line_boundaries")
+def line_boundaries(
+        doc: Doc
+) -> Doc:
+    # segments that span several lines are parsed with a sentence start at every line, so that noun chunks (and the
+    # negation scopes) are the same as if each line was parsed on its own
+    for _token in doc[1:]:
+        _previous = doc[_token.i - 1]
+        if _previous.is_space and "\n" in _previous.text and not _token.is_space:
+            _token.is_sent_start = True
+    return doc
+
+
+@Language.component("token_vectors")
+def token_vectors(
+        doc: Doc
+) -> Doc:
+    # pools the transformer's wordpiece outputs onto the tokens ('doc.tensor') and drops them right away; the noun
+    # chunk vectors are pooled from these (see 'pool_embeddings')
+    _trf_data = doc._.trf_data if Doc.has_extension("trf_data") else None
+    if _trf_data is not None and len(getattr(_trf_data, "tensors", [])) > 0:
+        doc.tensor = wordpiece_token_vectors(_trf_data.tensors[0], _trf_data.align.lengths,
+                                             _trf_data.align.dataXd, len(doc))
+        doc._.trf_data = None
+    return doc
+
+
+@Language.factory("rule_noun_chunker", default_config={"patterns": None})
+def create_rule_noun_chunker(
+        nlp: Language,
+        name: str,
+        patterns: Optional[List[List[dict]]] = None
+) -> 'RuleNounChunker':
+    return RuleNounChunker(nlp, patterns)
+
+
+class RuleNounChunker:
+    """
+    Builds noun chunks from the POS tags with a spaCy ``Matcher`` (longest, non-overlapping matches), so that the
+    (expensive) dependency parser isn't needed for them; the last token of a chunk is taken as its root.
+    """
+    def __init__(
+            self,
+            nlp: Language,
+            patterns: Optional[List[List[dict]]] = None
+    ) -> None:
+        self.matcher = Matcher(nlp.vocab)
+        self.matcher.add("NOUN_CHUNK", RULE_CHUNK_PATTERNS if patterns is None else patterns, greedy="LONGEST")
+
+    def __call__(
+            self,
+            doc: Doc
+    ) -> Doc:
+        doc.spans[NOUN_CHUNK_SPAN_KEY] = filter_spans(self.matcher(doc, as_spans=True))
+        return doc
+
+
+class ParseCache:
+    """
+    Persistent (sqlite) store of parsed segments, addressed by the hash of their text within a namespace that is the
+    hash of the pipeline setup (model, enabled components and their config, incl. negex). The docs are stored with
+    their noun chunks and negation flags, but without the tensors (unless token vectors are pooled, see
+    'token_vectors').
+    """
+    def __init__(
+            self,
+            file_path: Union[pathlib.Path, str],
+            write_batch: int = 256
+    ) -> None:
+        self._file_path = pathlib.Path(file_path)
+        self._file_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self._file_path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS parses "
+                                 "(namespace TEXT, text_hash TEXT, doc BLOB, PRIMARY KEY (namespace, text_hash))")
+        self._write_batch = write_batch
+        self._pending = dict()
+
+    @staticmethod
+    def namespace(
+            pipeline: Language,
+            disable: Optional[Iterable[str]] = None
+    ) -> str:
+        _disable = [] if disable is None else disable
+        _components = [(p, pipeline.get_pipe_config(p)) for p in pipeline.pipe_names if p not in _disable]
+        _key = [pipeline.meta.get("lang"), pipeline.meta.get("name"), pipeline.meta.get("version"), _components]
+        return hashlib.sha1(json.dumps(_key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def text_hash(
+            text: str
+    ) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def contains(
+            self,
+            namespace: str,
+            text_hash: str
+    ) -> bool:
+        return (namespace, text_hash) in self._pending or self._connection.execute(
+            "SELECT 1 FROM parses WHERE namespace = ? AND text_hash = ?", (namespace, text_hash)).fetchone() is not None
+
+    def get(
+            self,
+            namespace: str,
+            text_hash: str,
+            vocab: Vocab
+    ) -> Optional[Doc]:
+        _bytes = self._pending.get((namespace, text_hash), None)
+        if _bytes is None:
+            _row = self._connection.execute(
+                "SELECT doc FROM parses WHERE namespace = ? AND text_hash = ?", (namespace, text_hash)).fetchone()
+            if _row is None:
+                return None
+            _bytes = _row[0]
+        return Doc(vocab).from_bytes(_bytes)
+
+    def put(
+            self,
+            namespace: str,
+            text_hash: str,
+            doc: Doc,
+            tensor: bool = False
+    ) -> None:
+        self._pending[(namespace, text_hash)] = doc.to_bytes(exclude=[] if tensor else ["tensor"])
+        if len(self._pending) >= self._write_batch:
+            self.flush()
+
+    def flush(
+            self
+    ) -> None:
+        if len(self._pending) == 0:
+            return
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO parses VALUES (?, ?, ?)",
+                                         [(n, h, b) for (n, h), b in self._pending.items()])
+        self._pending = dict()
+
+    def close(
+            self
+    ) -> None:
+        self.flush()
+        self._connection.close()
+
+    @staticmethod
+    def from_config(
+            parse_cache: Union[bool, str, pathlib.Path, None],
+            cache_path: pathlib.Path
+    ) -> Optional['ParseCache']:
+        """
+        :returns: the cache at the given path, in the cache folder if 'parse_cache' is just True, or None
+        """
+        if isinstance(parse_cache, (str, pathlib.Path)):
+            return ParseCache(parse_cache)
+        return ParseCache(cache_path / PARSE_CACHE_FILE) if parse_cache else None
 
 
 class DataProcessingFactory:
@@ -46,7 +247,14 @@ class DataProcessingFactory:
             file_path: Union[pathlib.Path, str, io.IOBase]
     ) -> 'DataProcessing':
         _set_extensions()
-        return load_pickle(file_path)
+        _data_processing = load_pickle(file_path)
+        _doc_bin_path = getattr(_data_processing, "_doc_bin_path", None)
+        if _doc_bin_path is not None and isinstance(file_path, (str, pathlib.Path)):
+            # the docs are expected next to the pickle, even if the storage folder was moved in the meantime
+            _sibling = pathlib.Path(file_path).absolute().parent / _doc_bin_path.name
+            if _sibling.exists():
+                _data_processing._doc_bin_path = _sibling
+        return _data_processing
 
     @staticmethod
     def create(
@@ -71,7 +279,20 @@ class DataProcessingFactory:
             disable: Optional[Iterable[str]] = None,
             categories: Optional[list] = None,
             omit_negated_chunks: bool = True,
-            negspacy_config: Optional[dict] = None
+            negspacy_config: Optional[dict] = None,
+            stream_data: bool = False,
+            doc_bin: bool = True,
+            segmentation: str = "line",
+            segment_token_budget: int = 256,
+            batch_size: Optional[int] = None,
+            length_bucketing: bool = True,
+            keep_docs: Optional[bool] = None,
+            chunker: str = "parser",
+            prune_components: bool = True,
+            parse_cache: Union[bool, str, pathlib.Path] = False,
+            boilerplate_max_df: Optional[Union[int, float]] = None,
+            canonicalize: Optional[str] = None,
+            pool_embeddings: bool = False
     ):
         def _get_label_from_file(
                 fi: pathlib.Path
@@ -125,30 +346,158 @@ class DataProcessingFactory:
         _cache_name = cache_name if cache_name is not None else (
             _base_path.name if _base_path is not None else "processed_data")
 
-        _data_processing = DataProcessingFactory.DataProcessing(
-            pipeline=pipeline,
-            data_entries=(_file_like_data_entries(_base_path, _sub_path, _file_ext, subset, categories)
-                          if _base_path is not None else base_data),
-            file_encoding=file_encoding,
-            n_process=n_process,
-            use_lemma=use_lemma,
-            prepend_head=prepend_head,
-            head_only=head_only,
-            case_sensitive=case_sensitive,
-            filter_min_df=filter_min_df,
-            filter_max_df=filter_max_df,
-            filter_stop=filter_stop,
-            disable=disable,
-            omit_negated_chunks=omit_negated_chunks,
-            negspacy_config=negspacy_config
-        )
+        _parse_cache = ParseCache.from_config(parse_cache, _cache_path)
+        try:
+            _data_processing = DataProcessingFactory.DataProcessing(
+                pipeline=pipeline,
+                data_entries=(_file_like_data_entries(_base_path, _sub_path, _file_ext, subset, categories)
+                              if _base_path is not None else base_data),
+                file_encoding=file_encoding,
+                n_process=n_process,
+                use_lemma=use_lemma,
+                prepend_head=prepend_head,
+                head_only=head_only,
+                case_sensitive=case_sensitive,
+                filter_min_df=filter_min_df,
+                filter_max_df=filter_max_df,
+                filter_stop=filter_stop,
+                disable=disable,
+                omit_negated_chunks=omit_negated_chunks,
+                negspacy_config=negspacy_config,
+                stream_data=stream_data,
+                segmentation=segmentation,
+                segment_token_budget=segment_token_budget,
+                batch_size=batch_size,
+                length_bucketing=length_bucketing,
+                keep_docs=keep_docs,
+                chunker=chunker,
+                prune_components=prune_components,
+                parse_cache=_parse_cache,
+                boilerplate_max_df=boilerplate_max_df,
+                canonicalize=canonicalize,
+                pool_embeddings=pool_embeddings
+            )
+        finally:
+            if _parse_cache is not None:
+                _parse_cache.close()
 
         if save_to_file:
             delattr(_data_processing, '_data_entries')  # remove as it's not needed and makes problems when serializing
+            if doc_bin and _data_processing._keep_docs:
+                # the spaCy docs are stored separately, so that the pickle only holds the (small) aggregates
+                _data_processing.save_doc_bin(pathlib.Path(_cache_path / pathlib.Path(f"{_cache_name}_docs.spacy")))
             final_cache = pathlib.Path(_cache_path / pathlib.Path(f"{_cache_name}.pickle"))
             save_pickle(_data_processing, final_cache)
         return _data_processing
 
+    @staticmethod
+    def append(
+            pipeline: Language,
+            base_data: Iterable[Dict[str, str]],
+            data_obj: Union['DataProcessingFactory.DataProcessing', pathlib.Path, str],
+            cache_path: Optional[pathlib.Path] = None,
+            cache_name: Optional[str] = None,
+            n_process: int = 1,
+            disable: Optional[Iterable[str]] = None,
+            save_to_file: bool = True,
+            doc_bin: bool = True,
+            parse_cache: Union[bool, str, pathlib.Path] = False
+    ):
+        _data_processing = (data_obj if isinstance(data_obj, DataProcessingFactory.DataProcessing)
+                            else DataProcessingFactory.load(data_obj))
+        _cache_path = ((pathlib.Path(os.getcwd()) / pathlib.Path("cache")).absolute()
+                       if cache_path is None else cache_path.resolve())
+        _cache_name = cache_name if cache_name is not None else "processed_data"
+
+        _parse_cache = ParseCache.from_config(parse_cache, _cache_path)
+        try:
+            _data_processing.append_documents(
+                pipeline=pipeline,
+                data_entries=base_data,
+                n_process=n_process,
+                disable=disable if (isinstance(disable, Iterable) or disable is None) else [],
+                parse_cache=_parse_cache
+            )
+        finally:
+            if _parse_cache is not None:
+                _parse_cache.close()
+
+        if save_to_file:
+            if hasattr(_data_processing, '_data_entries'):
+                delattr(_data_processing, '_data_entries')
+            if doc_bin and getattr(_data_processing, "_keep_docs", True):
+                _data_processing.save_doc_bin(pathlib.Path(_cache_path / pathlib.Path(f"{_cache_name}_docs.spacy")))
+            save_pickle(_data_processing, pathlib.Path(_cache_path / pathlib.Path(f"{_cache_name}.pickle")))
+        return _data_processing
+
+    @staticmethod
+    def create_sharded(
+            pipeline: Union[str, Callable[[], Language]],
+            base_data: Iterable[Dict[str, str]],
+            n_shards: int = 2,
+            n_workers: Optional[int] = None,
+            cache_path: Optional[pathlib.Path] = None,
+            cache_name: Optional[str] = None,
+            save_to_file: bool = True,
+            doc_bin: bool = True,
+            **kwargs
+    ):
+        """
+        Splits the data into 'n_shards' shards (see 'shard_data'), processes every shard in its own spawned process
+        (at most 'n_workers' at a time) and merges the results. Since each process loads its own pipeline, it's given
+        by name (loaded with 'load_spacy_model', which falls back to 'DEFAULT_SPACY_MODEL') or as a picklable function
+        that returns it; the remaining arguments are passed on to 'create'.
+        The shards are kept as '{cache_name}_shard-{i}' next to the merged result; note that boilerplate (see
+        'boilerplate_max_df') is detected per shard.
+        """
+        _cache_path = ((pathlib.Path(os.getcwd()) / pathlib.Path("cache")).absolute()
+                       if cache_path is None else cache_path.resolve())
+        _cache_name = cache_name if cache_name is not None else "processed_data"
+        _shards = [s for s in shard_data(base_data, n_shards) if len(s) > 0]
+        _shard_names = [f"{_cache_name}_shard-{i}" for i in range(len(_shards))]
+        logging.info(f"Processing {sum(len(s) for s in _shards)} documents in {len(_shards)} shards.")
+
+        with ProcessPoolExecutor(max_workers=n_workers if n_workers is not None else len(_shards),
+                                 mp_context=multiprocessing.get_context("spawn")) as _executor:
+            _shard_files = list(_executor.map(
+                _create_shard, itertools.repeat(pipeline), _shards, itertools.repeat(_cache_path), _shard_names,
+                itertools.repeat(dict(kwargs, doc_bin=doc_bin))))
+        return DataProcessingFactory.merge(
+            shards=_shard_files, cache_path=_cache_path, cache_name=_cache_name, save_to_file=save_to_file,
+            doc_bin=doc_bin)
+
+    @staticmethod
+    def merge(
+            shards: Iterable[Union['DataProcessingFactory.DataProcessing', pathlib.Path, str]],
+            cache_path: Optional[pathlib.Path] = None,
+            cache_name: Optional[str] = None,
+            save_to_file: bool = True,
+            doc_bin: bool = True
+    ):
+        """
+        Merges shards of a corpus (in corpus order) that were processed with the same options, e.g. by
+        'create_sharded' or by 'create' on other hosts with the parts that 'shard_data' returns. The spaCy docs of the
+        shards are taken over (with shifted document indexes).
+        """
+        _shards = [s if isinstance(s, DataProcessingFactory.DataProcessing) else DataProcessingFactory.load(s)
+                   for s in shards]
+        if len(_shards) == 0:
+            raise ValueError("There are no shards to merge.")
+        _cache_path = ((pathlib.Path(os.getcwd()) / pathlib.Path("cache")).absolute()
+                       if cache_path is None else cache_path.resolve())
+        _cache_name = cache_name if cache_name is not None else "processed_data"
+
+        _data_processing = copy.copy(_shards[0])
+        _data_processing.merge_shards(_shards)
+
+        if save_to_file:
+            if hasattr(_data_processing, '_data_entries'):
+                delattr(_data_processing, '_data_entries')
+            if doc_bin and getattr(_data_processing, "_keep_docs", True):
+                _data_processing.save_doc_bin(pathlib.Path(_cache_path / pathlib.Path(f"{_cache_name}_docs.spacy")))
+            save_pickle(_data_processing, pathlib.Path(_cache_path / pathlib.Path(f"{_cache_name}.pickle")))
+        return _data_processing
+
     class DataProcessing:
         def __init__(
                 self,
@@ -165,31 +514,77 @@ class DataProcessingFactory:
                 filter_stop: Optional[list] = None,
                 disable: Optional[Iterable[str]] = None,
                 omit_negated_chunks: bool = True,
-                negspacy_config: Optional[dict] = None
+                negspacy_config: Optional[dict] = None,
+                stream_data: bool = False,
+                segmentation: str = "line",
+                segment_token_budget: int = 256,
+                batch_size: Optional[int] = None,
+                length_bucketing: bool = True,
+                keep_docs: Optional[bool] = None,
+                chunker: str = "parser",
+                prune_components: bool = True,
+                parse_cache: Optional[ParseCache] = None,
+                boilerplate_max_df: Optional[Union[int, float]] = None,
+                canonicalize: Optional[str] = None,
+                pool_embeddings: bool = False
         ) -> None:
-            self._data_entries = [d for d in data_entries]
+            if segmentation not in SEGMENTATION_MODES:
+                raise ValueError(f"'segmentation' needs to be one of {SEGMENTATION_MODES}, got '{segmentation}'.")
+            if chunker not in CHUNKERS:
+                raise ValueError(f"'chunker' needs to be one of {CHUNKERS}, got '{chunker}'.")
+            if canonicalize is not None and canonicalize not in CANONICALIZATIONS:
+                raise ValueError(f"'canonicalize' needs to be one of {CANONICALIZATIONS} or None, got '{canonicalize}'.")
+            # when streaming, the entries are consumed lazily by the spaCy pipeline and never held as a whole
+            self._stream_data = stream_data
+            self._data_entries = iter(data_entries) if stream_data else [d for d in data_entries]
             self._file_encoding = file_encoding
+            self._segmentation = segmentation
+            self._segment_token_budget = segment_token_budget
+            self._batch_size = batch_size
+            self._length_bucketing = length_bucketing
+            # without the docs, everything is served from the chunk feature store (and the docs can't be looked up);
+            # streamed data doesn't keep them by default, as the memory would grow with the corpus size otherwise
+            self._keep_docs = (not stream_data) if keep_docs is None else keep_docs
+            if stream_data and self._keep_docs:
+                logging.warning("The parsed docs are kept although the data is streamed ('keep_docs=True'); "
+                                "the memory still grows with the corpus size.")
+            self._chunker = chunker
+            self._prune_components = prune_components
+            # the components of the pipeline that didn't run, so their annotations are missing from the chunk features
+            self._disabled_components = list()
+            self._boilerplate_max_df = boilerplate_max_df
+            self._canonicalize = canonicalize
+            self._pool_embeddings = pool_embeddings
+            self._phrase_embeddings = None
+            self._canonical_ids = dict()
+            self._phrase_variants = dict()
+            self._boilerplate = dict()
+            self._boilerplate_stats = {"skipped_segments": 0, "skipped_characters": 0, "near_duplicates": 0}
             self._prepend_head = prepend_head
             self._use_lemma = use_lemma
             self._head_only = head_only
             self._data_corpus_tuples = list()
             self._text_id_to_doc_name = dict()
             self._processed_docs = list()
-            self._document_chunk_matrix = list()
-            self._chunk_set_dicts = list()
+            self._doc_bin_path = None
+            self._language = pipeline.lang
+            self._document_phrase_matrix = None
+            self._chunk_set_dicts = ChunkTable()
+            self._chunk_features = ChunkFeatures()
             self._true_labels = list()
             self._true_labels_dict = dict()
             self._view = None
-            self._cache_obj = [self._document_list, self.get_document_by_id, self.get_document_by_name,
-                               self.get_document_ids_by_topic, self.get_document_names_by_topic]
+            self._doc_name_to_index = dict()
+            self._doc_id_to_index = dict()
+            self._doc_indexes = None
+            self._label_bitmaps = None
             self._options_key = (None, None, None,)
             self._tfidf_vec = None
-            self._chunk_boundary = "<chunk-boundary/>"
             self._filter_min_df = filter_min_df
             self._filter_max_df = filter_max_df
             self._filter_stop = filter_stop if filter_stop is not None else []
-            self._tfidf_filter = None
-            self._tfidf_filter_vec = None
+            self._phrase_filter_mask = None
+            self._phrase_restriction = None
             self._negspacy = {"enabled": omit_negated_chunks, "config": negspacy_config}
             self._process_documents(
                 pipeline=pipeline,
@@ -197,20 +592,61 @@ class DataProcessingFactory:
                 case_sensitive=case_sensitive,
                 disable=disable if (isinstance(disable, Iterable) or disable is None) else [],
                 omit_negated_chunks=omit_negated_chunks,
-                negspacy_config=negspacy_config
+                negspacy_config=negspacy_config,
+                parse_cache=parse_cache
             )
 
         # ToDo: some method to set 'doc_topic' outside init?
 
-        @lru_cache()
+        def __getstate__(
+                self
+        ) -> dict:
+            _state = self.__dict__.copy()
+            if _state.get("_doc_bin_path", None) is not None:
+                _state["_processed_docs"] = None
+                _state["_data_corpus_tuples"] = list()
+            return _state
+
+        def __setstate__(
+                self,
+                state: dict
+        ) -> None:
+            state.pop("_cache_obj", None)  # older pickles hold the (now removed) lru caches
+            self.__dict__.update(state)
+            if self._view is not None and "docs" not in self._view:
+                self.set_view_by_labels(self._view['labels'])
+
+        @property
+        def _docs(
+                self
+        ) -> List[Doc]:
+            # loads the docs only when something actually needs them
+            if not getattr(self, "_keep_docs", True):
+                raise ValueError("The spaCy docs were discarded after the noun chunk extraction ('keep_docs=False').")
+            if self._processed_docs is None:
+                _set_extensions()
+                logging.info(f"Loading processed documents from '{self._doc_bin_path}'")
+                _doc_bin = DocBin(store_user_data=True).from_disk(self._doc_bin_path)
+                self._processed_docs = list(_doc_bin.get_docs(spacy.blank(self._language).vocab))
+            return self._processed_docs
+
+        def save_doc_bin(
+                self,
+                file_path: pathlib.Path
+        ) -> None:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            _doc_bin = DocBin(store_user_data=True, docs=self._docs)
+            _doc_bin.to_disk(file_path)
+            self._doc_bin_path = file_path.absolute()
+
         def _document_list(
                 self
         ) -> List[str]:
+            _names = [v for k, v in sorted(self._text_id_to_doc_name.items(), key=lambda item: item[0])]
             if self._view is None:
-                return [v for k, v in sorted(self._text_id_to_doc_name.items(), key=lambda item: item[0])]
+                return _names
             else:
-                return [v for k, v in sorted(self._text_id_to_doc_name.items(), key=lambda item: item[0])
-                        if self._true_labels[k] in self._view['labels']]
+                return np.asarray(_names, dtype=object)[self._view['docs']].tolist()
 
         @property
         def document_list(
@@ -231,7 +667,7 @@ class DataProcessingFactory:
             if self._view is None:
                 return self._true_labels
             else:
-                return [l for l in self._true_labels if l.lower() in self._view['labels']]
+                return np.asarray(self._true_labels, dtype=object)[self._view['docs']].tolist()
 
         @property
         def topics(
@@ -240,32 +676,79 @@ class DataProcessingFactory:
             if self._view is None:
                 return set(self._true_labels)
             else:
-                return set([l.lower() for l in self._true_labels]).intersection(self._view['labels'])
+                return set(self._view['labels']).intersection(self.label_bitmaps["labels"].keys())
 
         @property
         def documents_n(
                 self
         ) -> int:
-            return len(self._document_list())
+            if self._view is None:
+                return len(self._text_id_to_doc_name)
+            return int(self._view['docs'].sum())
 
         @property
-        @lru_cache()
         def data_chunk_sets(
                 self
-        ) -> list:
-            if self._view is None:
+        ) -> ChunkTable:
+            if isinstance(self._chunk_set_dicts, list):
+                # older pickles hold the chunk sets as a list of dicts
+                self._chunk_set_dicts = ChunkTable.from_dicts(self._chunk_set_dicts)
+            _view_ids = self._view_phrase_ids()
+            if _view_ids is None:
                 return self._chunk_set_dicts
             else:
-                return [csd for i, csd in enumerate(self._chunk_set_dicts) if i in self._view['ids']]
+                return self._chunk_set_dicts.take(_view_ids)
+
+        def _view_phrase_ids(
+                self
+        ) -> Optional[np.ndarray]:
+            _restriction = getattr(self, "_phrase_restriction", None)
+            if self._view is None:
+                return _restriction
+            if _restriction is None:
+                return self._view['ids']
+            if self._view.get('restricted_ids', None) is None:
+                self._view['restricted_ids'] = _restriction[np.isin(_restriction, self._view['ids'])]
+            return self._view['restricted_ids']
+
+        @property
+        def phrase_ids(
+                self
+        ) -> np.ndarray:
+            """
+            The ids of the rows of ``data_chunk_sets`` in the full chunk table (a phrase keeps its id when documents
+            are appended).
+            """
+            _ids = self._view_phrase_ids()
+            return np.arange(len(self._chunk_set_dicts)) if _ids is None else _ids
+
+        def restrict_phrases(
+                self,
+                phrase_ids: Optional[Union[np.ndarray, List[int]]] = None
+        ) -> None:
+            """
+            Restricts ``data_chunk_sets`` (and everything aligned with it) to the given phrases on top of the view,
+            e.g. to the phrases that were embedded, in the given order; None lifts the restriction.
+            """
+            if phrase_ids is None:
+                self._phrase_restriction = None
+            else:
+                _ids = np.asarray(phrase_ids, dtype=np.int64)
+                self._phrase_restriction = _ids[np.sort(np.unique(_ids, return_index=True)[1])]
+            if self._view is not None:
+                self._view['restricted_ids'] = None
 
         @property
         def processed_docs(
                 self
         ) -> list:
             if self._view is None:
-                return self._processed_docs
-            else:
-                return [d for d in self._processed_docs if d._.doc_topic.lower() in self._view['labels']]
+                return self._docs
+            if self._view.get('positions', None) is None:
+                _position_doc_index = np.asarray(self.document_indexes["doc_index"], dtype=np.int64)
+                self._view['positions'] = np.flatnonzero(self._view['docs'][_position_doc_index])
+            _docs = self._docs
+            return [_docs[p] for p in self._view['positions']]
 
         @property
         def chunk_sets_n(
@@ -279,36 +762,134 @@ class DataProcessingFactory:
         ) -> Generator:
             # ToDo: utilize blacklist for noun chunks that should not be included [sie, er, die, etc.] - or check if later on this is done and switch accordingly
             #  because here every superfluous chunk will be run through negex and slows process down and probably  induces errors
-            for doc in self._processed_docs:
-                for ch in doc.noun_chunks:
+            if not getattr(self, "_keep_docs", True):
+                return self._stored_noun_chunks()
+            return self._noun_chunks(self.processed_docs)
+
+        def _noun_chunks(
+                self,
+                docs: Iterable[Doc]
+        ) -> Generator:
+            for doc in docs:
+                _rule_chunks = NOUN_CHUNK_SPAN_KEY in doc.spans
+                for ch in (doc.spans[NOUN_CHUNK_SPAN_KEY] if _rule_chunks else doc.noun_chunks):
                     _negated = not (not hasattr(ch, "_") or
                                     (hasattr(ch, "_") and not getattr(getattr(ch, "_"), "negex", True)))
                     if not (re.match(r"\W", ch.text) and len(ch.text) == 1):
-                        if self._view is None or doc._.doc_topic in self._view['labels']:
-                            yield {"spacy_chunk": ch, "doc_id": doc._.doc_id, "doc_index": doc._.doc_index,
-                                   "doc_name": doc._.doc_name, "doc_topic": doc._.doc_topic, "negated": _negated}
+                        yield {"spacy_chunk": ch, "doc_id": doc._.doc_id, "doc_index": doc._.doc_index,
+                               "doc_name": doc._.doc_name, "doc_topic": doc._.doc_topic, "negated": _negated,
+                               "char_offset": (doc._.doc_offset + ch.start_char
+                                               if doc._.doc_offset is not None else None),
+                               "root_i": ch.end - 1 if _rule_chunks else None}
+
+        def _stored_noun_chunks(
+                self
+        ) -> Generator:
+            # same entries as '_noun_chunks' (of the current view), but without the spaCy span: the cleaned chunk is
+            # given as 'chunk_dict' instead
+            _features = self.chunk_features
+            _chunks = (np.arange(len(_features)) if self._view is None
+                       else np.flatnonzero(self._view['docs'][_features.doc_index]))
+            _strings = _features.strings
+            for c, _doc_index, _negated, _span, _offset in zip(
+                    _chunks.tolist(), _features.doc_index[_chunks].tolist(), _features.negated[_chunks].tolist(),
+                    _features.span[_chunks].tolist(), _features.char_offset[_chunks].tolist()):
+                yield {"spacy_chunk": None, "text": _strings[_span], "doc_id": _features.doc_ids.get(_doc_index),
+                       "doc_index": _doc_index, "doc_name": self._text_id_to_doc_name.get(_doc_index),
+                       "doc_topic": self._true_labels[_doc_index], "negated": _negated,
+                       "char_offset": _offset if _offset >= 0 else None, "root_i": None,
+                       "chunk_dict": _features.chunk_dict(c)}
 
         @property
-        def document_chunk_matrix(
+        def chunk_features(
                 self
-        ) -> List[List[str]]:
-            return self._document_chunk_matrix
+        ) -> ChunkFeatures:
+            if getattr(self, "_chunk_features", None) is None:
+                # older pickles don't have the feature store; it's extracted from the docs once
+                self._chunk_features = ChunkFeatures()
+                for _ in self._extract_chunk_features(self._docs):
+                    pass
+            return self._chunk_features
+
+        def _extract_chunk_features(
+                self,
+                docs: Iterable[Doc]
+        ) -> Generator[Doc, None, None]:
+            # passes the docs through and captures the cleaned tokens of their noun chunks on the way
+            _pool = getattr(self, "_pool_embeddings", False)
+            for doc in docs:
+                _chunks = list(self._noun_chunks([doc]))
+                self._chunk_features.extend(
+                    doc_index=[ch["doc_index"] for ch in _chunks],
+                    negated=[ch["negated"] for ch in _chunks],
+                    span=[ch["spacy_chunk"].text for ch in _chunks],
+                    char_offset=[ch["char_offset"] for ch in _chunks],
+                    doc_ids={doc._.doc_index: doc._.doc_id},
+                    vectors=span_vectors(doc, [ch["spacy_chunk"] for ch in _chunks]) if _pool else None,
+                    **clean_spans(doc, [ch["spacy_chunk"] for ch in _chunks], [ch["root_i"] for ch in _chunks])
+                )
+                if _pool:
+                    doc.tensor = np.zeros((0,), dtype=np.float32)
+                yield doc
+
+        def noun_chunk_phrases(
+                self,
+                use_lemma: bool = False,
+                prepend_head: bool = False,
+                head_only: bool = False,
+                case_sensitive: bool = False
+        ) -> Tuple[np.ndarray, np.ndarray]:
+            """
+            :returns: the phrase of every noun chunk in the current view (an empty string if a chunk doesn't yield
+                one) and the index of its document
+            """
+            self._check_lemmas(use_lemma)
+            _features = self.chunk_features
+            _chunks = (np.arange(len(_features)) if self._view is None
+                       else np.flatnonzero(self._view['docs'][_features.doc_index]))
+            _phrases, _inverse = _features.phrases(use_lemma=use_lemma, prepend_head=prepend_head,
+                                                   head_only=head_only, case_sensitive=case_sensitive, chunks=_chunks)
+            return np.asarray(_phrases + [""], dtype=object)[_inverse], _features.doc_index[_chunks]
 
         @property
-        def tfidf_filter(
+        def document_phrase_matrix(
                 self
-        ) -> Optional[tfidfVec]:
-            if self._tfidf_filter is None:
-                if self._filter_min_df != 1 or self._filter_max_df != 1.0 or self._filter_stop is not None:
-                    filter_stop = self._filter_stop if self._filter_stop is not None else []
-                    self._tfidf_filter = tfidfVec(
-                        min_df=self._filter_min_df, max_df=self._filter_max_df, stop_words=filter_stop,
-                        analyzer=lambda x: re.split(self._chunk_boundary, x)
-                    )
-                    self._tfidf_filter_vec = self._tfidf_filter.fit_transform(self.document_chunk_matrix)
-                else:
-                    return None
-            return self._tfidf_filter
+        ) -> sparse.csr_matrix:
+            """
+            (documents x phrases) matrix with the number of (not negated) occurrences of a phrase in a document;
+            the columns are aligned with ``data_chunk_sets``.
+            """
+            _view_ids = self._view_phrase_ids()
+            if _view_ids is None:
+                return self._full_document_phrase_matrix()
+            return self._full_document_phrase_matrix()[:, _view_ids]
+
+        @property
+        def filter_params(
+                self
+        ) -> dict:
+            return {"min_df": self._filter_min_df, "max_df": self._filter_max_df, "stop_words": self._filter_stop}
+
+        @property
+        def phrase_filter_mask(
+                self
+        ) -> np.ndarray:
+            """
+            Boolean mask over ``data_chunk_sets`` of the phrases that pass the document frequency (``filter_min_df``,
+            ``filter_max_df``; int: absolute, float: proportion of documents) and stop phrase (``filter_stop``) filter.
+            """
+            if getattr(self, "_phrase_filter_mask", None) is None:
+                _matrix = self._full_document_phrase_matrix()
+                _n_docs = _matrix.shape[0]
+                _df = np.diff(sparse.csc_matrix(_matrix).indptr)
+                _min_count = self._filter_min_df if isinstance(self._filter_min_df, int) else self._filter_min_df * _n_docs
+                _max_count = self._filter_max_df if isinstance(self._filter_max_df, int) else self._filter_max_df * _n_docs
+                _mask = (_df >= max(_min_count, 1)) & (_df <= _max_count)
+                if self._filter_stop:
+                    _mask &= ~np.isin(self._chunk_set_dicts.text_array, np.asarray(self._filter_stop, dtype=object))
+                self._phrase_filter_mask = _mask
+            _view_ids = self._view_phrase_ids()
+            return self._phrase_filter_mask if _view_ids is None else self._phrase_filter_mask[_view_ids]
 
         def reset_filter(
                 self,
@@ -318,74 +899,190 @@ class DataProcessingFactory:
         ) -> None:
             self._filter_min_df = filter_min_df
             self._filter_max_df = filter_max_df
-            self._filter_stop = filter_stop
-            self._tfidf_filter = None
-            self._tfidf_filter_vec = None
+            self._filter_stop = filter_stop if filter_stop is not None else []
+            self._phrase_filter_mask = None
+
+        def _full_document_phrase_matrix(
+                self
+        ) -> sparse.csr_matrix:
+            if getattr(self, "_document_phrase_matrix", None) is None:
+                self._document_phrase_matrix = self._legacy_document_phrase_matrix()
+            return self._document_phrase_matrix
+
+        def _legacy_document_phrase_matrix(
+                self
+        ) -> sparse.csr_matrix:
+            # older pickles only hold the concatenated chunk strings per document
+            _chunk_boundary = getattr(self, "_chunk_boundary", "<chunk-boundary/>")
+            if isinstance(self._chunk_set_dicts, list):
+                self._chunk_set_dicts = ChunkTable.from_dicts(self._chunk_set_dicts)
+            _text_ids = self._chunk_set_dicts.text_ids
+            _rows, _cols = [], []
+            for _doc_index, _doc_str in enumerate(getattr(self, "_document_chunk_matrix", [])):
+                for _text in _doc_str.split(_chunk_boundary):
+                    if _text in _text_ids:
+                        _rows.append(_doc_index)
+                        _cols.append(_text_ids[_text])
+            return sparse.csr_matrix(
+                (np.ones(len(_rows), dtype=np.int64), (_rows, _cols)),
+                shape=(len(self._text_id_to_doc_name), len(self._chunk_set_dicts))
+            )
+
+        def _build_document_lookups(
+                self
+        ) -> None:
+            # objects from before the lookups were kept; the ids are only known for documents with noun chunks
+            if getattr(self, "_doc_name_to_index", None) is None:
+                self._doc_name_to_index = dict()
+                for _index, _name in sorted(self._text_id_to_doc_name.items(), key=lambda item: item[0]):
+                    self._doc_name_to_index.setdefault(_name, _index)
+            if getattr(self, "_doc_id_to_index", None) is None:
+                self._doc_id_to_index = dict()
+                for _index, _id in sorted(self.chunk_features.doc_ids.items(), key=lambda item: item[0]):
+                    self._doc_id_to_index.setdefault(_id, _index)
 
         def doc_id_from_name(
                 self,
                 name: str
         ) -> int:
-            _id = list(self._text_id_to_doc_name.keys())[list(self._text_id_to_doc_name.values()).index(name)]
-            if (self._view is None) or (self._true_labels[_id].lower() in self._view['labels']):
+            self._build_document_lookups()
+            _id = self._doc_name_to_index.get(name, None)
+            if _id is None:
+                raise ValueError(f"'{name}' is not a known document name.")
+            if self._in_view(_id):
                 return _id
 
         def doc_name_from_id(
                 self,
                 doc_id: int
         ) -> str:
-            if (self._view is None) or (self._true_labels[doc_id].lower() in self._view['labels']):
+            if self._in_view(doc_id):
                 return self._text_id_to_doc_name[doc_id]
 
-        @lru_cache()
+        def _in_view(
+                self,
+                doc_index: int
+        ) -> bool:
+            return self._view is None or bool(self._view['docs'][doc_index])
+
+        @property
+        def document_indexes(
+                self
+        ) -> dict:
+            """
+            Lookup tables that are built once the documents are processed (and extended on append):
+            'id' & 'name' map to the positions of the documents' spaCy docs, 'topic_ids' & 'topic_names' map a
+            (lowercased) topic to the sorted ids & names of its documents and 'doc_index' holds the document index of
+            every position.
+            """
+            if getattr(self, "_doc_indexes", None) is None:
+                self._doc_indexes = {"id": dict(), "name": dict(), "topic_ids": dict(), "topic_names": dict(),
+                                     "doc_index": list()}
+                self._index_documents(self._docs)
+            return self._doc_indexes
+
+        def _index_documents(
+                self,
+                docs: Iterable[Doc],
+                start: int = 0,
+                positions: bool = True
+        ) -> None:
+            if getattr(self, "_doc_indexes", None) is None:
+                self._doc_indexes = {"id": dict(), "name": dict(), "topic_ids": dict(), "topic_names": dict(),
+                                     "doc_index": list()}
+            _indexes = self._doc_indexes
+            for _position, _doc in enumerate(docs, start=start):
+                if positions:
+                    _indexes["doc_index"].append(_doc._.doc_index)
+                    _indexes["id"].setdefault(_doc._.doc_id, []).append(_position)
+                    _indexes["name"].setdefault(_doc._.doc_name, []).append(_position)
+                if _doc._.doc_topic is None:
+                    continue
+                _topic = _doc._.doc_topic.lower()
+                for _key, _value in [("topic_ids", _doc._.doc_id), ("topic_names", _doc._.doc_name)]:
+                    # kept sorted & unique, so a lookup is just a copy
+                    _values = _indexes[_key].setdefault(_topic, [])
+                    _pos = bisect_left(_values, _value)
+                    if _pos == len(_values) or _values[_pos] != _value:
+                        _values.insert(_pos, _value)
+
+        def _consume_documents(
+                self,
+                docs: Iterable[Doc],
+                start: int = 0
+        ) -> Generator[Doc, None, None]:
+            # extracts the chunk features and indexes every doc as it comes out of the pipeline; in docless mode
+            # ('keep_docs=False') the docs are dropped right afterwards
+            _keep_docs = getattr(self, "_keep_docs", True)
+            for _position, _doc in enumerate(self._extract_chunk_features(docs), start=start):
+                self._index_documents([_doc], start=_position, positions=_keep_docs)
+                if _keep_docs:
+                    yield _doc
+
+        def _docs_from_positions(
+                self,
+                positions: List[int]
+        ) -> List[Doc]:
+            _docs = self._docs
+            return [_docs[p] for p in positions if self._in_view(_docs[p]._.doc_index)]
+
         def get_document_by_id(
                 self,
                 doc_id: int
         ) -> List[Doc]:
-            if self._view is None:
-                return [t for t in self._processed_docs if t._.doc_id == doc_id]
-            else:
-                return [t for t in self._processed_docs
-                        if (t._.doc_id == doc_id and t._.doc_topic.lower() in self._view['labels'])]
+            return self._docs_from_positions(self.document_indexes["id"].get(doc_id, []))
 
-        @lru_cache()
         def get_document_by_name(
                 self,
                 doc_name: str
         ) -> List[Doc]:
-            if self._view is None:
-                return [t for t in self._processed_docs if t._.doc_name == doc_name]
-            else:
-                return [t for t in self._processed_docs
-                        if (t._.doc_name == doc_name and t._.doc_topic.lower() in self._view['labels'])]
+            return self._docs_from_positions(self.document_indexes["name"].get(doc_name, []))
 
-        @lru_cache()
         def get_document_names_by_topic(
                 self,
                 topic: str
         ) -> List[str]:
             self._check_view_elements(topic)
-            return sorted(set([d._.doc_name for d in self._processed_docs
-                               if d._.doc_topic is not None and d._.doc_topic.lower() == topic.lower()]))
+            return list(self.document_indexes["topic_names"].get(topic.lower(), []))
 
-        @lru_cache()
         def get_document_ids_by_topic(
                 self,
                 topic: str
         ) -> List[int]:
             self._check_view_elements(topic)
-            return sorted(set([d._.doc_id for d in self._processed_docs
-                               if d._.doc_topic is not None and d._.doc_topic.lower() == topic.lower()]))
+            return list(self.document_indexes["topic_ids"].get(topic.lower(), []))
+
+        @property
+        def label_bitmaps(
+                self
+        ) -> dict:
+            """
+            View index: 'docs' and 'phrases' hold one bitmap per (lowercased) label over the documents and over the
+            phrases that occur (not negated) in these documents; 'labels' maps a label to its row.
+            """
+            if getattr(self, "_label_bitmaps", None) is None:
+                _label_rows = dict()
+                _codes = np.asarray([_label_rows.setdefault(l.lower() if isinstance(l, str) else l, len(_label_rows))
+                                     for l in self._true_labels], dtype=np.int64)
+                _matrix = self._full_document_phrase_matrix()
+                _docs = np.zeros((len(_label_rows), _codes.shape[0]), dtype=bool)
+                _docs[_codes, np.arange(_codes.shape[0])] = True
+                # the document -> phrase postings (rows of the csr matrix) are projected onto the documents' labels
+                _phrases = np.zeros((len(_label_rows), _matrix.shape[1]), dtype=bool)
+                _phrases[np.repeat(_codes[:_matrix.shape[0]], np.diff(_matrix.indptr)), _matrix.indices] = True
+                self._label_bitmaps = {"labels": _label_rows, "docs": _docs, "phrases": _phrases}
+            return self._label_bitmaps
 
         def set_view_by_labels(
                 self,
                 labels: Optional[Iterable[str]] = None
         ) -> None:
-            for _obj in self._cache_obj:
-                _obj.cache_clear()
             if labels is not None:
-                labels = [l.lower() for l in labels]
-                self._view = {'ids': np.where(np.isin(self._true_labels, np.asarray(labels)))[0],
+                labels = [l.lower() if isinstance(l, str) else l for l in labels]
+                _bitmaps = self.label_bitmaps
+                _rows = [_bitmaps["labels"][l] for l in labels if l in _bitmaps["labels"]]
+                self._view = {'ids': np.flatnonzero(_bitmaps["phrases"][_rows].any(axis=0)),
+                              'docs': _bitmaps["docs"][_rows].any(axis=0),
                               'labels': labels}
             else:
                 self._view = None
@@ -398,9 +1095,12 @@ class DataProcessingFactory:
                 case_sensitive: bool = False,
                 omit_negated_chunks: bool = True
         ) -> None:
-            self._chunk_set_dicts.clear()
+            self._chunk_set_dicts = ChunkTable()
+            self._options_key = (None, None, None,)
             self._build_chunk_set_dicts(use_lemma=use_lemma, prepend_head=prepend_head, head_only=head_only,
                                         case_sensitive=case_sensitive, omit_negated_chunks=omit_negated_chunks)
+            if self._view is not None:
+                self.set_view_by_labels(self._view['labels'])
 
         def _check_view_elements(
                 self,
@@ -408,7 +1108,7 @@ class DataProcessingFactory:
         ) -> None:
             if isinstance(label, str):
                 if label.lower() not in (self._view['labels']
-                if self._view is not None else [t.lower() for t in self.topics]):
+                if self._view is not None else [t.lower() for t in self.topics if isinstance(t, str)]):
                     raise KeyError(f"'{label}' is not in current view.")
             elif isinstance(label, Iterable):
                 _missing = []
@@ -420,24 +1120,91 @@ class DataProcessingFactory:
                 if len(_missing) > 0:
                     raise KeyError(f"'{','.join(_missing)}' are not in current view.")
 
+        def _iter_data_tuples(
+                self,
+                data_entries: Optional[Iterable[Dict[str, str]]] = None,
+                offset: int = 0
+        ) -> Generator[Tuple[str, dict], None, None]:
+            for i, d in enumerate(self._data_entries if data_entries is None else data_entries, start=offset):
+                _label = d.get("label", None)
+                if _label not in self._true_labels_dict:
+                    self._true_labels_dict[_label] = len(self._true_labels_dict)
+                self._true_labels.append(_label)
+                self._text_id_to_doc_name[i] = d.get("name", "no_name")
+                if getattr(self, "_doc_name_to_index", None) is not None:
+                    self._doc_name_to_index.setdefault(d.get("name", "no_name"), i)
+                if "id" in d and getattr(self, "_doc_id_to_index", None) is not None:
+                    self._doc_id_to_index.setdefault(d["id"], i)
+                _content = d.get("content", "")
+                for _start, _end in segment_text(_content, segmentation=getattr(self, "_segmentation", "line"),
+                                                 token_budget=getattr(self, "_segment_token_budget", 256)):
+                    yield (_content[_start:_end], {"doc_id": d.get("id", i), "doc_index": i, "doc_offset": _start,
+                                                   "doc_name": d.get("name", "no_name"), "doc_topic": _label})
+
         def _build_data_tuples(
                 self
         ) -> None:
             if len(self._data_corpus_tuples) == 0:
-                _labels_count = 0
-                for i, d in enumerate(self._data_entries):
-                    _label = d.get("label", None)
-                    if _label not in self._true_labels_dict:
-                        self._true_labels_dict[_label] = _labels_count
-                        _labels_count += 1
-                    self._true_labels.append(_label)
-                    self._text_id_to_doc_name[i] = d.get("name", "no_name")
-                    for line in d.get("content", "").split('\n'):
-                        if not (line.isspace() or len(line) == 0):
-                            self._data_corpus_tuples.append(
-                                (line, {"doc_id": d.get("id", i), "doc_index": i,
-                                        "doc_name": d.get("name", "no_name"), "doc_topic": _label})
-                            )
+                self._data_corpus_tuples.extend(self._iter_data_tuples())
+
+        def _drop_boilerplate(
+                self
+        ) -> None:
+            """
+            Finds the segments (lines with the default segmentation) that occur - exactly or as near duplicates, see
+            'boilerplate_key' - in more documents than 'boilerplate_max_df' allows (a fraction of the documents if
+            float, a number of documents if int) and drops them from the data before it's parsed.
+            """
+            _n_docs = len(self._text_id_to_doc_name)
+            _max_df = (self._boilerplate_max_df * _n_docs if isinstance(self._boilerplate_max_df, float)
+                       else self._boilerplate_max_df)
+            # the tuples are ordered by document, so a key's document frequency only grows on a new doc_index
+            _df, _last_doc, _example = defaultdict(int), dict(), dict()
+            for _text, _ctx in self._data_corpus_tuples:
+                _key = boilerplate_key(_text)
+                if len(_key) == 0 or _last_doc.get(_key, None) == _ctx["doc_index"]:
+                    continue
+                _last_doc[_key] = _ctx["doc_index"]
+                _df[_key] += 1
+                _example.setdefault(_key, _text.strip())
+            self._boilerplate = {k: {"text": _example[k], "documents": n} for k, n in _df.items()
+                                 if n > max(_max_df, 1)}
+            if len(self._boilerplate) > 0:
+                self._data_corpus_tuples = list(self._skip_boilerplate(self._data_corpus_tuples))
+            logging.info(f"Boilerplate: skipped {self._boilerplate_stats['skipped_segments']} segments of "
+                         f"{len(self._boilerplate)} kinds (occurring in more than {_max_df} documents).")
+
+        def _skip_boilerplate(
+                self,
+                data_tuples: Iterable[Tuple[str, dict]]
+        ) -> Generator[Tuple[str, dict], None, None]:
+            _boilerplate = getattr(self, "_boilerplate", None)
+            if not _boilerplate:
+                yield from data_tuples
+                return
+            _stats = self._boilerplate_stats
+            for _text, _ctx in data_tuples:
+                _entry = _boilerplate.get(boilerplate_key(_text), None)
+                if _entry is None:
+                    yield _text, _ctx
+                    continue
+                _stats["skipped_segments"] += 1
+                _stats["skipped_characters"] += len(_text)
+                if _text.strip() != _entry["text"]:
+                    _stats["near_duplicates"] += 1
+
+        @property
+        def boilerplate_statistics(
+                self
+        ) -> dict:
+            _boilerplate = getattr(self, "_boilerplate", dict())
+            return {
+                "max_df": getattr(self, "_boilerplate_max_df", None),
+                "kinds": len(_boilerplate),
+                **getattr(self, "_boilerplate_stats", {"skipped_segments": 0, "skipped_characters": 0,
+                                                       "near_duplicates": 0}),
+                "most_frequent": sorted(_boilerplate.values(), key=lambda e: -e["documents"])[:BOILERPLATE_TOP_N]
+            }
 
         def _build_chunk_set_dicts(
                 self,
@@ -448,33 +1215,525 @@ class DataProcessingFactory:
                 omit_negated_chunks: bool = True
         ) -> None:
             _key = (prepend_head, use_lemma, head_only,)
+            self._check_lemmas(use_lemma or getattr(self, "_canonicalize", None) == "lemma")
             if len(self._chunk_set_dicts) == 0 and (_key != self._options_key):
                 self._options_key = copy.copy(_key)
-                _csdt = {}
-                self._document_chunk_matrix = ["" for i in range(self.documents_n)]
-                for i, ch in enumerate(self.noun_chunks_corpus):
-                    _chunk_dict = clean_span(ch["spacy_chunk"])
-                    _negated_chunk = ch["negated"]
-                    # return value looks like this:
-                    #   {'head_idx': _head_idx (int), 'lemma': _lemma (list), 'text': _text (list), 'pos': _pos (list)}
-                    if _chunk_dict is None:
-                        continue
+                self._case_sensitive = case_sensitive
+                self._omit_negated_chunks = omit_negated_chunks
+                self._canonical_ids, self._phrase_variants = dict(), dict()
+                _doc_ids = list(range(len(self._text_id_to_doc_name)))
+                _texts, _rows, _cols, _chunk_doc_ids = self._aggregate_chunks(
+                    case_sensitive=case_sensitive, omit_negated_chunks=omit_negated_chunks)
+                for _index, _id in _chunk_doc_ids.items():
+                    _doc_ids[_index] = _id
+
+                # duplicate (document, phrase) pairs are summed up, so the entries are the occurrence counts
+                self._document_phrase_matrix = sparse.csr_matrix(
+                    (np.ones(_rows.shape[0], dtype=np.int64), (_rows, _cols)), shape=(len(_doc_ids), len(_texts)))
+                self._phrase_filter_mask = None
+                self._label_bitmaps = None
+                self._phrase_embeddings = None
+                self._chunk_set_dicts = ChunkTable.from_document_matrix(
+                    texts=_texts, document_phrase_matrix=self._document_phrase_matrix, doc_ids=_doc_ids)
+
+        def _aggregate_chunks(
+                self,
+                chunks: Optional[np.ndarray] = None,
+                case_sensitive: bool = False,
+                omit_negated_chunks: bool = True,
+                text_ids: Optional[Dict[str, int]] = None
+        ) -> Tuple[List[str], np.ndarray, np.ndarray, Dict[int, Any]]:
+            """
+            Derives the phrases of the given chunks of the feature store (all if None), interns them (ids continue
+            after the given ``text_ids``) and collects the (document index, phrase id) pair of every counted
+            occurrence.
+
+            :returns: the new phrases, the document indices & phrase ids of the occurrences and the document ids
+            """
+            _features = self.chunk_features
+            _chunks = np.arange(len(_features)) if chunks is None else np.asarray(chunks, dtype=np.int64)
+            _prepend_head, _use_lemma, _head_only = self._options_key
+            _phrases, _inverse = _features.phrases(use_lemma=_use_lemma, prepend_head=_prepend_head,
+                                                   head_only=_head_only, case_sensitive=case_sensitive, chunks=_chunks)
+            _text_ids = dict() if text_ids is None else text_ids
+            _texts = []
+            _ids = np.empty(len(_phrases), dtype=np.int64)
+            if getattr(self, "_canonicalize", None) is None:
+                for i, _text in enumerate(_phrases):
+                    _id = _text_ids.get(_text, None)
+                    if _id is None:
+                        _id = len(_text_ids) + len(_texts)
+                        _texts.append(_text)
+                    _ids[i] = _id
+            else:
+                # the variants of a phrase become one phrase, named after its most frequent variant
+                _keys = self._canonical_keys(_phrases, _inverse, _chunks, case_sensitive)
+                _occurrences = np.bincount(_inverse[_inverse >= 0], minlength=len(_phrases))
+                _representative = dict()
+                for i, _key in enumerate(_keys):
+                    if _occurrences[i] > _occurrences[_representative.setdefault(_key, i)]:
+                        _representative[_key] = i
+                for i, _key in enumerate(_keys):
+                    _id = self._canonical_ids.get(_key, None)
+                    if _id is None:
+                        _id = len(_text_ids) + len(_texts)
+                        self._canonical_ids[_key] = _id
+                        _texts.append(_phrases[_representative[_key]])
+                    _ids[i] = _id
+                    _variants = self._phrase_variants.setdefault(_id, dict())
+                    _variants[_phrases[i]] = _variants.get(_phrases[i], 0) + int(_occurrences[i])
+
+            _doc_index = _features.doc_index[_chunks]
+            _counted = _inverse >= 0
+            _doc_ids = {i: _features.doc_ids.get(i, i) for i in np.unique(_doc_index[_counted]).tolist()}
+            if omit_negated_chunks:
+                _counted &= ~_features.negated[_chunks]
+            return _texts, _doc_index[_counted], _ids[_inverse[_counted]], _doc_ids
+
+        def _canonical_keys(
+                self,
+                phrases: List[str],
+                inverse: np.ndarray,
+                chunks: np.ndarray,
+                case_sensitive: bool = False
+        ) -> List[str]:
+            """
+            :returns: the key of every phrase under which its variants are grouped; with 'lemma', the key is taken
+                from the lemmatized form of the phrase's first chunk
+            """
+            if self._canonicalize != "lemma":
+                return [canonical_key(p, case_sensitive) or p for p in phrases]
+            _prepend_head, _, _head_only = self._options_key
+            _lemmas, _lemma_inverse = self.chunk_features.phrases(
+                use_lemma=True, prepend_head=_prepend_head, head_only=_head_only, case_sensitive=case_sensitive,
+                chunks=chunks)
+            _lemmas = np.asarray(_lemmas + [""], dtype=object)
+            _values, _first = np.unique(inverse, return_index=True)
+            _first_chunk = _first[_values >= 0]
+            return [canonical_key(l, case_sensitive) or canonical_key(p, case_sensitive) or p
+                    for p, l in zip(phrases, _lemmas[_lemma_inverse[_first_chunk]].tolist())]
+
+        @property
+        def phrase_variants(
+                self
+        ) -> Optional[List[List[str]]]:
+            """
+            :returns: the surface forms (most frequent first) that were merged into each phrase of
+                ``data_chunk_sets``; None without canonicalization
+            """
+            if getattr(self, "_canonicalize", None) is None:
+                return None
+            return [[v for v, _ in sorted(self._phrase_variants.get(i, {}).items(), key=lambda x: -x[1])]
+                    for i in self.phrase_ids.tolist()]
+
+        def merge_shards(
+                self,
+                shards: List['DataProcessingFactory.DataProcessing']
+        ) -> None:
+            """
+            Replaces the documents with those of the shards (in corpus order): their document indexes are shifted by
+            the number of documents before them and their chunk feature stores are concatenated, from which the chunk
+            sets and the document-phrase matrix are derived anew - so the phrase ids are the same as if the whole
+            corpus had been processed at once.
+            """
+            def _options(
+                    data_obj: 'DataProcessingFactory.DataProcessing'
+            ) -> tuple:
+                return (data_obj._options_key, data_obj._language, getattr(data_obj, "_case_sensitive", False),
+                        getattr(data_obj, "_omit_negated_chunks", True), getattr(data_obj, "_chunker", "parser"),
+                        getattr(data_obj, "_canonicalize", None), getattr(data_obj, "_keep_docs", True))
+
+            if any(_options(s) != _options(shards[0]) for s in shards):
+                raise ValueError("Only shards that were processed with the same options can be merged.")
+            _keep_docs = getattr(shards[0], "_keep_docs", True)
+            _docs = list()
+            self._text_id_to_doc_name, self._doc_name_to_index, self._doc_id_to_index = dict(), dict(), dict()
+            self._true_labels, self._true_labels_dict = list(), dict()
+            self._chunk_features = ChunkFeatures()
+            self._doc_indexes = {"id": dict(), "name": dict(), "topic_ids": dict(), "topic_names": dict(),
+                                 "doc_index": list()}
+            self._boilerplate = dict()
+            self._boilerplate_stats = {"skipped_segments": 0, "skipped_characters": 0, "near_duplicates": 0}
+
+            for _shard in shards:
+                _offset = len(self._text_id_to_doc_name)
+                for _index, _name in sorted(_shard._text_id_to_doc_name.items(), key=lambda item: item[0]):
+                    self._text_id_to_doc_name[_index + _offset] = _name
+                    self._doc_name_to_index.setdefault(_name, _index + _offset)
+                for _id, _index in getattr(_shard, "_doc_id_to_index", dict()).items():
+                    self._doc_id_to_index.setdefault(_id, _index + _offset)
+                for _label in _shard._true_labels:
+                    self._true_labels_dict.setdefault(_label, len(self._true_labels_dict))
+                self._true_labels.extend(_shard._true_labels)
+                self._chunk_features.merge(_shard.chunk_features, doc_offset=_offset)
+
+                _indexes, _start = _shard.document_indexes, len(self._doc_indexes["doc_index"])
+                self._doc_indexes["doc_index"].extend(i + _offset for i in _indexes["doc_index"])
+                for _key in ["id", "name"]:
+                    for _value, _positions in _indexes[_key].items():
+                        self._doc_indexes[_key].setdefault(_value, []).extend(p + _start for p in _positions)
+                for _key in ["topic_ids", "topic_names"]:
+                    for _topic, _values in _indexes[_key].items():
+                        self._doc_indexes[_key][_topic] = sorted(
+                            set(self._doc_indexes[_key].get(_topic, [])).union(_values))
+                if _keep_docs:
+                    for _doc in _shard._docs:
+                        _doc._.doc_index += _offset
+                        _docs.append(_doc)
+
+                # boilerplate is detected per shard
+                for _key, _entry in getattr(_shard, "_boilerplate", dict()).items():
+                    _merged = self._boilerplate.setdefault(_key, {"text": _entry["text"], "documents": 0})
+                    _merged["documents"] += _entry["documents"]
+                for _stat, _value in getattr(_shard, "_boilerplate_stats", dict()).items():
+                    self._boilerplate_stats[_stat] += _value
+
+            self._processed_docs = _docs
+            self._doc_bin_path = None
+            self._data_corpus_tuples = list()
+            self._view = None
+            self._phrase_restriction = None
+            self._tfidf_vec = None
+            _prepend_head, _use_lemma, _head_only = self._options_key
+            self.rebuild_chunk_set_dict(
+                use_lemma=_use_lemma, prepend_head=_prepend_head, head_only=_head_only,
+                case_sensitive=getattr(self, "_case_sensitive", False),
+                omit_negated_chunks=getattr(self, "_omit_negated_chunks", self._negspacy["enabled"]))
+            logging.info(f"Merged {len(shards)} shards: {len(self._text_id_to_doc_name)} documents and "
+                         f"{len(self._chunk_set_dicts)} phrases.")
+
+        @property
+        def phrase_embeddings(
+                self
+        ) -> Optional[np.ndarray]:
+            """
+            :returns: for every phrase of ``data_chunk_sets`` the mean of the token vectors that were pooled over its
+                noun chunks while parsing (see 'pool_embeddings'); None if there are none
+            """
+            _vectors = self.chunk_features.vectors
+            if _vectors is None:
+                return None
+            if getattr(self, "_phrase_embeddings", None) is None:
+                _phrases = self._chunk_phrase_ids()
+                _chunks = np.flatnonzero((_phrases >= 0) & ~np.isnan(_vectors).any(axis=1))
+                _n_phrases = len(self._chunk_set_dicts)
+                _pooling = sparse.csr_matrix(
+                    (np.ones(_chunks.shape[0], dtype=np.float32), (_phrases[_chunks], np.arange(_chunks.shape[0]))),
+                    shape=(_n_phrases, _chunks.shape[0]))
+                _counts = np.bincount(_phrases[_chunks], minlength=_n_phrases)
+                if (_counts == 0).any():
+                    logging.warning(f"{(_counts == 0).sum()} phrases have no pooled token vectors; "
+                                    f"they get zero vectors.")
+                self._phrase_embeddings = (np.asarray(_pooling @ _vectors[_chunks], dtype=np.float32) /
+                                           np.maximum(_counts, 1)[:, None])
+            return self._phrase_embeddings[self.phrase_ids]
+
+        def _chunk_phrase_ids(
+                self
+        ) -> np.ndarray:
+            # the id (in the full chunk table) of the phrase of every chunk, -1 if it doesn't yield one
+            _features = self.chunk_features
+            _chunks = np.arange(len(_features))
+            _prepend_head, _use_lemma, _head_only = self._options_key
+            _case_sensitive = getattr(self, "_case_sensitive", False)
+            _phrases, _inverse = _features.phrases(use_lemma=_use_lemma, prepend_head=_prepend_head,
+                                                   head_only=_head_only, case_sensitive=_case_sensitive)
+            if getattr(self, "_canonicalize", None) is None:
+                _ids = [self._chunk_set_dicts.text_ids.get(p, -1) for p in _phrases]
+            else:
+                _ids = [self._canonical_ids.get(k, -1)
+                        for k in self._canonical_keys(_phrases, _inverse, _chunks, _case_sensitive)]
+            return np.asarray(_ids + [-1], dtype=np.int64)[_inverse]
+
+        def _skip_known_documents(
+                self,
+                data_entries: Iterable[Dict[str, str]],
+                offset: int
+        ) -> Generator[Dict[str, str], None, None]:
+            # documents with a name or id that the corpus had before 'offset' would be counted twice
+            self._build_document_lookups()
+            _skipped = 0
+            for d in data_entries:
+                if (self._doc_name_to_index.get(d.get("name", "no_name"), offset) < offset or
+                        ("id" in d and self._doc_id_to_index.get(d["id"], offset) < offset)):
+                    _skipped += 1
+                    continue
+                yield d
+            if _skipped > 0:
+                logging.info(f"Skipped {_skipped} documents that are already part of the corpus (by name or id).")
+
+        def append_documents(
+                self,
+                pipeline: Language,
+                data_entries: Iterable[Dict[str, str]],
+                n_process: int = 1,
+                disable: Optional[Iterable[str]] = None,
+                parse_cache: Optional[ParseCache] = None
+        ) -> np.ndarray:
+            """
+            Parses only the given (new) documents and merges their noun chunks into the existing chunk sets; documents
+            whose name or id is already part of the corpus are skipped.
+
+            :returns: the ids of the phrases that weren't part of the chunk sets before (appended at the end)
+            """
+            _offset = len(self._text_id_to_doc_name)
+            _n_chunk_sets = len(self.data_chunk_sets)
+            _docs = self._docs if getattr(self, "_keep_docs", True) else list()
+            if getattr(self, "_chunker", "parser") == "rule":
+                disable = self._add_rule_chunker(pipeline, [] if disable is None else disable)
+            if self._negspacy["enabled"]:
+                self._add_negex(pipeline, validate_negspacy_config(self._negspacy["config"])
+                                if self._negspacy["config"] is not None else {})
+            if getattr(self, "_segmentation", "line") != "line":
+                self._add_line_boundaries(pipeline)
+            if getattr(self, "_pool_embeddings", False):
+                self._add_token_vectors(pipeline)
+            if getattr(self, "_prune_components", False):
+                disable = self._prune_pipeline(pipeline, [] if disable is None else disable)
+            self._add_disabled_components(pipeline, [] if disable is None else disable)
+
+            _features = self.chunk_features
+            _n_chunks = len(_features)
+            _docs.extend(self._consume_documents(self._pipe_documents(
+                pipeline=pipeline,
+                data_tuples=self._skip_boilerplate(self._iter_data_tuples(
+                    self._skip_known_documents(data_entries, _offset), offset=_offset)),
+                n_process=n_process,
+                disable=[] if disable is None else disable,
+                batch_size=getattr(self, "_batch_size", None),
+                length_bucketing=getattr(self, "_length_bucketing", False),
+                parse_cache=parse_cache
+            ), start=len(_docs)))
+            logging.info(f"Appended {len(self._text_id_to_doc_name) - _offset} documents.")
+
+            _matrix = self._full_document_phrase_matrix()
+            _texts, _rows, _cols, _doc_ids = self._aggregate_chunks(
+                np.arange(_n_chunks, len(_features)), case_sensitive=getattr(self, "_case_sensitive", False),
+                omit_negated_chunks=getattr(self, "_omit_negated_chunks", self._negspacy["enabled"]),
+                text_ids=self._chunk_set_dicts.text_ids)
+            _n_phrases = len(self._chunk_set_dicts) + len(_texts)
+            _new_matrix = sparse.csc_matrix(
+                (np.ones(_rows.shape[0], dtype=np.int64), (_rows - _offset, _cols)),
+                shape=(len(self._text_id_to_doc_name) - _offset, _n_phrases))
+            _new_matrix.sum_duplicates()
+
+            # only the phrases that occur in the new documents (or are new themselves) need to be merged
+            _touched = np.union1d(np.unique(_cols), np.arange(len(self._chunk_set_dicts), _n_phrases))
+            _all_texts = self._chunk_set_dicts.texts + _texts
+            _new_ids = self._chunk_set_dicts.add(
+                texts=[_all_texts[i] for i in _touched],
+                counts=np.asarray(_new_matrix.sum(axis=0)).ravel()[_touched],
+                postings=[_new_matrix.indices[_new_matrix.indptr[i]:_new_matrix.indptr[i + 1]] + _offset
+                          for i in _touched],
+                doc_ids=_doc_ids
+            )
+            _matrix = _matrix.tocsr(copy=True)
+            _matrix.resize((_offset, _n_phrases))
+            self._document_phrase_matrix = sparse.vstack([_matrix, _new_matrix.tocsr()], format="csr")
+            # the document frequencies, the label bitmaps and the pooled embeddings changed with the grown corpus
+            self._phrase_filter_mask = None
+            self._label_bitmaps = None
+            self._phrase_embeddings = None
+            if self._view is not None:
+                self.set_view_by_labels(self._view['labels'])
+            logging.info(f"Merged noun chunks: {len(_new_ids)} new of {len(self._chunk_set_dicts)} phrases "
+                         f"(before: {_n_chunk_sets}).")
+            return _new_ids
+
+        def _prune_pipeline(
+                self,
+                pipeline: spacy.Language,
+                disable: Iterable[str],
+                sample: Optional[List[str]] = None
+        ) -> List[str]:
+            """
+            Adds the components that aren't needed for this config (see 'plan_components') to the ones to disable;
+            if sample texts are given and the debug log level is on, the expected speedup over the full pipeline is
+            measured on them (which parses the sample with every component once more).
+
+            :returns: the components to disable
+            """
+            # negex is already part of the pipeline here
+            _negation_features = (pipeline.get_pipe_config("negex")["feat_of_interest"]
+                                  if self._negspacy["enabled"] and "negex" in pipeline.pipe_names else list())
+            _disable = list(disable)
+            _disable.extend(p for p in plan_components(
+                pipeline, _negation_features, chunker=getattr(self, "_chunker", "parser"),
+                pool_embeddings=getattr(self, "_pool_embeddings", False)) if p not in _disable)
+            if len(_disable) == 0:
+                return _disable
+            logging.info(f"Disabling components {_disable} (kept: "
+                         f"{[p for p in pipeline.pipe_names if p not in _disable]}).")
+            if sample is not None and len(sample) > 0 and logging.getLogger().isEnabledFor(logging.DEBUG):
+                _timings = component_timings(pipeline, sample)
+                _total = sum(_timings.values())
+                _pruned = _total - sum(t for p, t in _timings.items() if p in _disable)
+                logging.debug(f"Expected speedup of the pruned pipeline: "
+                              f"{_total / max(_pruned, np.finfo(float).eps):.2f}x "
+                              f"(measured on {len(sample)} segments; {_timings}).")
+            return _disable
+
+        def _add_disabled_components(
+                self,
+                pipeline: spacy.Language,
+                disable: Iterable[str]
+        ) -> None:
+            self._disabled_components = sorted(set(getattr(self, "_disabled_components", [])).union(
+                p for p in disable if p in pipeline.component_names))
 
-                    _text = get_actual_str(_chunk_dict, _key, case_sensitive=case_sensitive)
-                    if not (_negated_chunk and omit_negated_chunks):
-                        self._document_chunk_matrix[ch["doc_index"]] += f"{self._chunk_boundary}{_text}"
+        def _check_lemmas(
+                self,
+                use_lemma: bool
+        ) -> None:
+            _disabled = [p for p in getattr(self, "_disabled_components", []) if p in LEMMATIZER_COMPONENTS]
+            if use_lemma and len(_disabled) > 0:
+                raise ValueError(f"There are no lemmas: the documents were parsed with {_disabled} disabled.")
 
-                    if _csdt.get(_text, False) and not (_negated_chunk and omit_negated_chunks):
-                        _docs = set(_csdt[_text]["doc"])
-                        _docs.add(ch["doc_id"])
-                        _csdt[_text]["doc"] = list(_docs)
-                        _csdt[_text]["count"] += 1
-                    else:
-                        _csdt[_text] = ({"doc": [ch["doc_id"]], "count": 1}
-                                        if not (_negated_chunk and omit_negated_chunks) else {"doc": [], "count": 0})
+        @staticmethod
+        def _add_negex(
+                pipeline: spacy.Language,
+                negspacy_config: dict
+        ) -> None:
+            if "negex" not in pipeline.pipe_names:
+                pipeline.add_pipe("negex", last=True, config=negspacy_config)
 
-                self._chunk_set_dicts = [{"text": _t, "doc": _ch["doc"], "count": _ch["count"]}
-                                         for _t, _ch in _csdt.items()]
+        @staticmethod
+        def _add_rule_chunker(
+                pipeline: spacy.Language,
+                disable: Iterable[str]
+        ) -> List[str]:
+            """
+            :returns: the components to disable, extended by the parser (which isn't needed for the rule based chunks)
+            """
+            if "rule_noun_chunker" not in pipeline.pipe_names:
+                if "negex" in pipeline.pipe_names:
+                    pipeline.add_pipe("rule_noun_chunker", before="negex")
+                else:
+                    pipeline.add_pipe("rule_noun_chunker", last=True)
+            if not any(p in pipeline.pipe_names for p in ["senter", "sentencizer"]):
+                # the negation scope is limited to sentences, which the parser would have set otherwise
+                pipeline.add_pipe("sentencizer", before="rule_noun_chunker")
+            _disable = list(disable)
+            if "parser" in pipeline.pipe_names and "parser" not in _disable:
+                logging.info("Using rule based noun chunks; the parser is disabled.")
+                _disable.append("parser")
+            return _disable
+
+        @staticmethod
+        def _add_line_boundaries(
+                pipeline: spacy.Language
+        ) -> None:
+            if "line_boundaries" not in pipeline.pipe_names:
+                _before = next((p for p in ["parser", "senter"] if p in pipeline.pipe_names), None)
+                if _before is not None:
+                    pipeline.add_pipe("line_boundaries", before=_before)
+                else:
+                    pipeline.add_pipe("line_boundaries", first=True)
+
+        @staticmethod
+        def _add_token_vectors(
+                pipeline: spacy.Language
+        ) -> None:
+            if "token_vectors" not in pipeline.pipe_names:
+                if "transformer" not in pipeline.pipe_names and "tok2vec" not in pipeline.pipe_names:
+                    logging.warning("The pipeline has neither a 'transformer' nor a 'tok2vec' component; "
+                                    "there are no token vectors to pool the phrase embeddings from.")
+                pipeline.add_pipe("token_vectors", last=True)
+
+        @staticmethod
+        def _pipe_documents(
+                pipeline: spacy.Language,
+                data_tuples: Iterable[Tuple[str, dict]],
+                n_process: int = 1,
+                disable: Optional[Iterable[str]] = None,
+                total: Optional[int] = None,
+                batch_size: Optional[int] = None,
+                length_bucketing: bool = False,
+                parse_cache: Optional[ParseCache] = None
+        ) -> Generator[Doc, None, None]:
+            _pipe_trf_type = True if "trf" in pipeline.meta["name"].split("_") else False
+            _set_extensions()
+            _batch_size = batch_size if batch_size is not None else pipeline.batch_size
+            _disable = [] if disable is None else disable
+            if length_bucketing:
+                data_tuples = length_buckets(data_tuples, window=_batch_size * LENGTH_BUCKET_BATCHES)
+            elif parse_cache is not None:
+                data_tuples = ((_text, dict(_ctx, segment_seq=i)) for i, (_text, _ctx) in enumerate(data_tuples))
+
+            # segments that are in the cache (or already on their way through the pipeline) are held back and
+            # restored from the cache at their position
+            _namespace = ParseCache.namespace(pipeline, _disable) if parse_cache is not None else None
+            _tensors = "token_vectors" in pipeline.pipe_names and "token_vectors" not in _disable
+            _restored, _parsing, _n_restored = dict(), set(), 0
+
+            def _uncached(
+                    tuples: Iterable[Tuple[str, dict]]
+            ) -> Generator[Tuple[str, dict], None, None]:
+                nonlocal _n_restored
+                for _text, _ctx in tuples:
+                    _hash = ParseCache.text_hash(_text)
+                    if _hash in _parsing or parse_cache.contains(_namespace, _hash):
+                        _restored[_ctx["segment_seq"]] = (_hash, _ctx)
+                        _n_restored += 1
+                        continue
+                    _parsing.add(_hash)
+                    yield _text, dict(_ctx, segment_hash=_hash)
+
+            def _annotate(
+                    doc: Doc,
+                    ctx: dict
+            ) -> Doc:
+                doc._.doc_id = ctx.get("doc_id", None)
+                doc._.doc_index = ctx.get("doc_index", None)
+                doc._.doc_offset = ctx.get("doc_offset", None)
+                doc._.doc_name = ctx.get("doc_name", None)
+                doc._.doc_topic = ctx.get("doc_topic", None)
+                return doc
+
+            def _from_cache(
+                    seq: int
+            ) -> Optional[Doc]:
+                _hash, _ctx = _restored[seq]
+                _doc = parse_cache.get(_namespace, _hash, pipeline.vocab)
+                return _annotate(_doc, _ctx) if _doc is not None else None
+
+            def _ordered_docs(
+            ) -> Generator[Doc, None, None]:
+                data_corpus = pipeline.pipe(
+                    _uncached(data_tuples) if parse_cache is not None else data_tuples, as_tuples=True,
+                    n_process=n_process, batch_size=_batch_size, disable=_disable)
+                # docs that come out of a length bucket early (or that are restored from the cache) are held back,
+                # so they are yielded in input order
+                _pending, _next = dict(), 0
+
+                def _release(
+                ) -> Generator[Doc, None, None]:
+                    nonlocal _next
+                    while _next in _pending or _next in _restored:
+                        _doc = _pending.pop(_next) if _next in _pending else _from_cache(_next)
+                        if _doc is None:
+                            return  # the first occurrence of the segment is still in the pipeline
+                        _restored.pop(_next, None)
+                        yield _doc
+                        _next += 1
+
+                for _doc, _ctx in data_corpus:
+                    _annotate(_doc, _ctx)
+                    if _pipe_trf_type:
+                        _doc._.trf_data = None  # clears cache and saves ram when using trf_pipelines
+                    if parse_cache is not None:
+                        parse_cache.put(_namespace, _ctx["segment_hash"], _doc, tensor=_tensors)
+                    if "segment_seq" not in _ctx:
+                        yield _doc
+                        continue
+                    _pending[_ctx["segment_seq"]] = _doc
+                    yield from _release()
+                # all segments are in the cache, once the pipeline ran dry
+                yield from _release()
+                if parse_cache is not None:
+                    logging.info(f"Parse cache: restored {_n_restored} and parsed {len(_parsing)} segments.")
+
+            yield from tqdm(_ordered_docs(), total=total)
 
         def _process_documents(
                 self,
@@ -483,35 +1742,54 @@ class DataProcessingFactory:
                 case_sensitive: bool = False,
                 disable: Optional[Iterable[str]] = None,
                 omit_negated_chunks: bool = True,
-                negspacy_config = None
+                negspacy_config = None,
+                parse_cache: Optional[ParseCache] = None
         ) -> None:
             _negspacy_config = {}
             if omit_negated_chunks and (negspacy_config is not None):
                 _negspacy_config = validate_negspacy_config(negspacy_config)
 
+            disable = [] if disable is None else disable
+            if self._chunker == "rule":
+                disable = self._add_rule_chunker(pipeline, disable)
             if omit_negated_chunks:
                 logging.info(f"Omitting negated entities with following settings: {_negspacy_config}")
-                pipeline.add_pipe("negex", last=True, config=_negspacy_config)
-            disable = [] if disable is None else disable
+                self._add_negex(pipeline, _negspacy_config)
+            if self._segmentation != "line":
+                self._add_line_boundaries(pipeline)
+            if self._pool_embeddings:
+                self._add_token_vectors(pipeline)
             if len(self._processed_docs) == 0:
-                _pipe_trf_type = True if "trf" in pipeline.meta["name"].split("_") else False
-                _set_extensions()
-                self._build_data_tuples()
-
-                data_corpus = pipeline.pipe(self._data_corpus_tuples[:], as_tuples=True, n_process=n_process,
-                                            disable=disable)
-                for _doc, _ctx in tqdm(data_corpus, total=len(self._data_corpus_tuples)):
-                    _doc._.doc_id = _ctx.get("doc_id", None)
-                    _doc._.doc_index = _ctx.get("doc_index", None)
-                    _doc._.doc_name = _ctx.get("doc_name", None)
-                    _doc._.doc_topic = _ctx.get("doc_topic", None)
-                    self._processed_docs.append(_doc)
-                    if _pipe_trf_type:
-                        _doc._.trf_data = None  # clears cache and saves ram when using trf_pipelines
+                if self._stream_data:
+                    if self._boilerplate_max_df is not None:
+                        logging.warning("Boilerplate detection needs a pass over all documents before the parsing; "
+                                        "it's not available with 'stream_data'.")
+                    _data_tuples, _total = self._iter_data_tuples(), None
+                else:
+                    self._build_data_tuples()
+                    if self._boilerplate_max_df is not None:
+                        self._drop_boilerplate()
+                    _data_tuples, _total = self._data_corpus_tuples, len(self._data_corpus_tuples)
+                if self._prune_components:
+                    disable = self._prune_pipeline(
+                        pipeline, disable,
+                        sample=None if self._stream_data else
+                        [_text for _text, _ in self._data_corpus_tuples[:PRUNING_SAMPLE_SIZE]]
+                    )
+                self._add_disabled_components(pipeline, disable)
+
+                self._processed_docs.extend(self._consume_documents(self._pipe_documents(
+                    pipeline=pipeline, data_tuples=_data_tuples, n_process=n_process, disable=disable, total=_total,
+                    batch_size=self._batch_size, length_bucketing=self._length_bucketing, parse_cache=parse_cache
+                )))
+                if not self._keep_docs:
+                    # the raw text isn't needed anymore either
+                    self._data_corpus_tuples = list()
 
                 self._build_chunk_set_dicts(prepend_head=self._prepend_head, head_only=self._head_only,
                                             use_lemma=self._use_lemma, case_sensitive=case_sensitive,
                                             omit_negated_chunks=omit_negated_chunks)
+                _ = self.label_bitmaps
 
 
 def validate_negspacy_config(config) -> dict:
@@ -543,10 +1821,231 @@ def validate_negspacy_config(config) -> dict:
     return _return_dict
 
 
+def segment_text(
+        content: str,
+        segmentation: str = "line",
+        token_budget: int = 256
+) -> Generator[Tuple[int, int], None, None]:
+    """
+    Splits a document into the segments that are parsed as one spaCy doc: single lines, paragraphs (separated by blank
+    lines), the whole document or consecutive lines packed up to ``token_budget`` (whitespace separated) tokens.
+    Blank lines never start or end a segment.
+
+    :returns: the character offsets (start, end) of the segments in ``content``
+    """
+    _lines = []
+    _start = 0
+    for _line in content.split("\n"):
+        if not (_line.isspace() or len(_line) == 0):
+            _lines.append((_start, _start + len(_line)))
+        _start += len(_line) + 1
+
+    if segmentation == "line":
+        yield from _lines
+        return
+    _seg_start, _seg_end, _seg_tokens = None, None, 0
+    for _start, _end in _lines:
+        if _seg_start is not None:
+            if segmentation == "paragraph":
+                _split = content[_seg_end:_start].count("\n") > 1
+            elif segmentation == "token_budget":
+                _split = _seg_tokens + len(content[_start:_end].split()) > token_budget
+            else:
+                _split = False
+            if not _split:
+                _seg_end = _end
+                _seg_tokens += len(content[_start:_end].split())
+                continue
+            yield _seg_start, _seg_end
+        _seg_start, _seg_end, _seg_tokens = _start, _end, len(content[_start:_end].split())
+    if _seg_start is not None:
+        yield _seg_start, _seg_end
+
+
+def plan_components(
+        pipeline: Language,
+        negation_features: Optional[Iterable[str]] = None,
+        chunker: str = "parser",
+        pool_embeddings: bool = False
+) -> List[str]:
+    """
+    Works out which components of the pipeline aren't needed for a preprocessing config from the annotations they
+    assign (their factory meta): a component is needed if it assigns an annotation the preprocessing reads (see
+    'PREPROCESSING_ANNOTATIONS'; the dependency parse with the 'parser' chunker, the entities if negex looks at them,
+    the token vectors with 'pool_embeddings'), one that a needed component requires, or if a needed component listens
+    to it. Components that don't declare what they assign are always kept.
+
+    :returns: the names of the components that can be disabled
+    """
+    _negation_features = [] if negation_features is None else negation_features
+    _needed = set(PREPROCESSING_ANNOTATIONS)
+    if chunker == "parser":
+        _needed.update(["token.dep", "token.head"])
+    if "ents" in _negation_features:
+        _needed.update(["doc.ents", "token.ent_iob", "token.ent_type"])
+    if pool_embeddings:
+        _needed.update(["doc.tensor", "doc._.trf_data"])
+
+    # a component can only depend on the ones before it
+    _kept, _prunable = set(), set()
+    for _name, _component in reversed(pipeline.pipeline):
+        _meta = pipeline.get_pipe_meta(_name)
+        _listeners = set(getattr(_component, "listening_components", []))
+        if len(_meta.assigns) > 0 and _needed.isdisjoint(_meta.assigns) and _kept.isdisjoint(_listeners):
+            _prunable.add(_name)
+        else:
+            _kept.add(_name)
+            _needed.update(_meta.requires)
+    return [p for p in pipeline.pipe_names if p in _prunable]
+
+
+def component_timings(
+        pipeline: Language,
+        texts: Iterable[str]
+) -> Dict[str, float]:
+    """
+    Runs all (enabled) components of the pipeline on the texts one after another.
+
+    :returns: the seconds spent in each component
+    """
+    _timings = dict()
+    _docs = [pipeline.make_doc(t) for t in texts]
+    for _name, _component in pipeline.pipeline:
+        _start = time.perf_counter()
+        _docs = list(_component.pipe(_docs)) if hasattr(_component, "pipe") else [_component(d) for d in _docs]
+        _timings[_name] = time.perf_counter() - _start
+    return _timings
+
+
+def canonical_key(
+        text: str,
+        case_sensitive: bool = False
+) -> str:
+    # punctuation, hyphenation and whitespace don't make phrases different
+    return "".join(re.findall(r"\w+", text if case_sensitive else text.lower()))
+
+
+def boilerplate_key(
+        text: str
+) -> str:
+    # case, digits (dates, ids, ...), punctuation and whitespace don't make a segment different
+    return " ".join(re.sub(r"[\W_]+", " ", re.sub(r"\d+", "0", text.lower())).split())
+
+
+def shard_data(
+        data_entries: Iterable[Dict[str, str]],
+        n_shards: int
+) -> List[List[Dict[str, str]]]:
+    """
+    Splits the entries into 'n_shards' contiguous parts. Entries without an "id" get their position in the whole
+    corpus as id, so that the merged shards hold the same ids as a single run.
+    """
+    _entries = [d if "id" in d else dict(d, id=i) for i, d in enumerate(data_entries)]
+    _bounds = [len(_entries) * i // n_shards for i in range(n_shards + 1)]
+    return [_entries[_start:_end] for _start, _end in zip(_bounds[:-1], _bounds[1:])]
+
+
+def load_spacy_model(
+        model: str,
+        logger: logging.Logger,
+        exclude: Optional[Iterable[str]] = None
+) -> spacy.Language:
+    _exclude = [] if exclude is None else list(exclude)
+    try:
+        return spacy.load(model, exclude=_exclude)
+    except IOError as e:
+        if model != DEFAULT_SPACY_MODEL:
+            logger.error(f"{e}\nUsing default model {DEFAULT_SPACY_MODEL}.")
+            try:
+                return spacy.load(DEFAULT_SPACY_MODEL, exclude=_exclude)
+            except IOError as e:
+                logger.error(f"{e}\ntrying to download default model {DEFAULT_SPACY_MODEL}.")
+                spacy.cli.download(DEFAULT_SPACY_MODEL)
+                return spacy.load(DEFAULT_SPACY_MODEL, exclude=_exclude)
+        else:
+            logger.error(f"{e}\ntrying to download default model {DEFAULT_SPACY_MODEL}.")
+            spacy.cli.download(DEFAULT_SPACY_MODEL)
+            return spacy.load(DEFAULT_SPACY_MODEL, exclude=_exclude)
+
+
+def _create_shard(
+        pipeline: Union[str, Callable[[], Language]],
+        data_entries: List[Dict[str, str]],
+        cache_path: pathlib.Path,
+        cache_name: str,
+        create_kwargs: dict
+) -> pathlib.Path:
+    # runs in its own (spawned) process, so every shard loads its own pipeline
+    DataProcessingFactory.create(
+        pipeline=load_spacy_model(pipeline, logging.getLogger(__name__)) if isinstance(pipeline, str) else pipeline(),
+        base_data=data_entries,
+        cache_path=cache_path,
+        cache_name=cache_name,
+        save_to_file=True,
+        **create_kwargs
+    )
+    return pathlib.Path(cache_path / pathlib.Path(f"{cache_name}.pickle"))
+
+
+def wordpiece_token_vectors(
+        wordpieces: Any,
+        lengths: Any,
+        indices: Any,
+        n_tokens: int
+) -> np.ndarray:
+    """
+    Averages the wordpiece outputs of a transformer over the tokens; ``lengths`` & ``indices`` are the (ragged)
+    alignment of the tokens onto the flattened wordpieces, as spacy-transformers provides it.
+
+    :returns: a (tokens x width) matrix; tokens without wordpieces get zero vectors
+    """
+    _wordpieces, _lengths, _indices = [np.asarray(a.get() if hasattr(a, "get") else a)
+                                       for a in [wordpieces, lengths, indices]]
+    _wordpieces = _wordpieces.reshape(-1, _wordpieces.shape[-1])
+    _indptr = np.zeros(n_tokens + 1, dtype=np.int64)
+    np.cumsum(_lengths[:n_tokens], out=_indptr[1:])
+    _alignment = sparse.csr_matrix((np.ones(_indptr[-1], dtype=np.float32), _indices.ravel()[:_indptr[-1]], _indptr),
+                                   shape=(n_tokens, _wordpieces.shape[0]))
+    return (np.asarray(_alignment @ _wordpieces, dtype=np.float32) /
+            np.maximum(np.diff(_indptr), 1).astype(np.float32)[:, None])
+
+
+def span_vectors(
+        doc: Doc,
+        spans: List[Span]
+) -> Optional[np.ndarray]:
+    """
+    :returns: the mean token vector ('doc.tensor') of every span; None if the doc has no token vectors
+    """
+    _tensor = doc.tensor
+    if len(spans) == 0 or _tensor is None or len(_tensor.shape) != 2 or _tensor.shape[0] != len(doc):
+        return None
+    _cumsum = np.zeros((len(doc) + 1, _tensor.shape[1]), dtype=np.float32)
+    np.cumsum(np.asarray(_tensor, dtype=np.float32), axis=0, out=_cumsum[1:])
+    _starts = np.asarray([s.start for s in spans], dtype=np.int64)
+    _ends = np.asarray([s.end for s in spans], dtype=np.int64)
+    return (_cumsum[_ends] - _cumsum[_starts]) / np.maximum(_ends - _starts, 1).astype(np.float32)[:, None]
+
+
+def length_buckets(
+        data_tuples: Iterable[Tuple[str, dict]],
+        window: int
+) -> Generator[Tuple[str, dict], None, None]:
+    # sorts the segments of every window by length, so that a batch holds texts of similar length (less padding);
+    # 'segment_seq' keeps the input position
+    _iter = ((_text, dict(_ctx, segment_seq=i)) for i, (_text, _ctx) in enumerate(data_tuples))
+    while True:
+        _window = list(itertools.islice(_iter, max(window, 1)))
+        if len(_window) == 0:
+            return
+        yield from sorted(_window, key=lambda t: len(t[0]))
+
+
 def clean_span(
-        chunk
+        chunk,
+        root: Optional[int] = None
 ) -> Optional[dict]:
-    _chunk_root_text = chunk.root.text.strip().replace("\t", "")
+    _chunk_root_text = (chunk.root if root is None else chunk.doc[root]).text.strip().replace("\t", "")
     # _chunk_root_lemma_text = chunk.root.lemma_.strip()
     _text, _lemma, _pos = [], [], []
 
@@ -578,6 +2077,70 @@ def clean_span(
     #     return None, None
 
 
+def clean_spans(
+        doc: Doc,
+        spans: List[Span],
+        roots: Optional[List[Optional[int]]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Batch version of ``clean_span`` for all (noun chunk) spans of a doc: the token attributes are read with
+    ``Doc.to_array`` and the filters are applied as masks over the tokens of all spans at once; the string cleaning is
+    done once per distinct token text/lemma of the doc. ``roots`` may give the token index of a span's root (where
+    it's not None), e.g. for rule based chunks that don't have a parse.
+
+    :returns: 'head' (-1 where ``clean_span`` returns None) & 'lengths' per span and 'text', 'lemma' & 'pos' of the
+        kept tokens (one span after the other)
+    """
+    _n_spans = len(spans)
+    if _n_spans == 0:
+        return {"head": np.asarray([], dtype=np.int64), "lengths": np.asarray([], dtype=np.int64),
+                "text": np.asarray([], dtype=object), "lemma": np.asarray([], dtype=object),
+                "pos": np.asarray([], dtype=object)}
+    _attrs = doc.to_array([IS_STOP, POS, LIKE_NUM, IS_SPACE, ORTH, LEMMA]).astype(np.uint64)
+    _starts = np.asarray([s.start for s in spans], dtype=np.int64)
+    _lengths = np.asarray([s.end for s in spans], dtype=np.int64) - _starts
+    _roots = np.asarray([s.root.i if r is None else r
+                         for s, r in zip(spans, [None] * _n_spans if roots is None else roots)], dtype=np.int64)
+    _offsets = np.zeros(_n_spans + 1, dtype=np.int64)
+    np.cumsum(_lengths, out=_offsets[1:])
+    _tokens = np.repeat(_starts - _offsets[:-1], _lengths) + np.arange(_offsets[-1])
+    _span_of = np.repeat(np.arange(_n_spans), _lengths)
+
+    _keep = ((_attrs[_tokens, 0] == 0) & ~np.isin(_attrs[_tokens, 1], [DET, PRON]) &
+             (_attrs[_tokens, 2] == 0) & (_attrs[_tokens, 3] == 0))
+
+    _orth, _orth_inverse = np.unique(_attrs[:, 4], return_inverse=True)
+    _orth_inverse = _orth_inverse.ravel()
+    _clean_text = [doc.vocab.strings[int(h)].strip().replace("\t", "") for h in _orth]
+    _text_codes = dict()
+    _token_codes = np.asarray([_text_codes.setdefault(t, len(_text_codes)) for t in _clean_text],
+                              dtype=np.int64)[_orth_inverse]
+
+    _kept = _tokens[_keep]
+    _kept_span = _span_of[_keep]
+    _kept_offsets = np.zeros(_n_spans + 1, dtype=np.int64)
+    np.cumsum(np.bincount(_kept_span, minlength=_n_spans), out=_kept_offsets[1:])
+    # the head is the first kept token with the (cleaned) text of the span's root
+    _match = _token_codes[_kept] == _token_codes[_roots][_kept_span]
+    _head = np.full(_n_spans, -1, dtype=np.int64)
+    _matched_spans, _first = np.unique(_kept_span[_match], return_index=True)
+    _head[_matched_spans] = (np.flatnonzero(_match) - _kept_offsets[_kept_span[_match]])[_first]
+
+    _valid = (_head >= 0)[_kept_span]
+    _kept = _kept[_valid]
+    _lemma, _lemma_inverse = np.unique(_attrs[_kept, 5], return_inverse=True)
+    _clean_lemma = np.asarray([doc.vocab.strings[int(h)].strip().replace("\t", "") for h in _lemma], dtype=object)
+    _pos, _pos_inverse = np.unique(_attrs[_kept, 1], return_inverse=True)
+    _pos_names = np.asarray([POS_NAMES.get(int(p), "") for p in _pos], dtype=object)
+    return {
+        "head": _head,
+        "lengths": np.where(_head >= 0, np.diff(_kept_offsets), 0),
+        "text": np.asarray(_clean_text, dtype=object)[_orth_inverse[_kept]],
+        "lemma": _clean_lemma[_lemma_inverse.ravel()],
+        "pos": _pos_names[_pos_inverse.ravel()]
+    }
+
+
 def get_actual_str(
         chunk_dict: dict,
         modify_key: tuple,
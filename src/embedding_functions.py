@@ -1,6 +1,13 @@
+import hashlib
 import logging
 import pathlib
-from typing import Optional, Union, List, Iterable
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Union, List, Iterable, Tuple
 
 import numpy as np
 import tensorflow as tf
@@ -14,6 +21,34 @@ from data_functions import DataProcessingFactory
 from src.util_functions import NoneDownScaleObj
 from util_functions import load_pickle, save_pickle
 
+# how many SentenceTransformer models are kept loaded (and shared) across jobs
+SENTENCE_TRANSFORMER_CACHE_SIZE = 2
+# folder name of the embedding store in the cache folder (if 'embedding_store' is just switched on)
+EMBEDDING_STORE_DIR = "embedding_store"
+# how much disk space (in MB) the embedding store may take up before the least recently used embeddings are evicted
+EMBEDDING_STORE_SIZE_MB = 1024
+_sentence_transformers = OrderedDict()
+_sentence_transformers_lock = threading.Lock()
+# one lock per embedding store folder, shared by all store objects (e.g. of concurrent jobs) of a process
+_embedding_store_locks = dict()
+_embedding_store_locks_lock = threading.Lock()
+
+
+def get_sentence_transformer(
+        model_name: str
+) -> SentenceTransformer:
+    """
+    :returns: the model for 'model_name'; it's only loaded if it isn't among the recently used ones
+    """
+    with _sentence_transformers_lock:
+        if model_name in _sentence_transformers:
+            _sentence_transformers.move_to_end(model_name)
+        else:
+            _sentence_transformers[model_name] = SentenceTransformer(model_name)
+            while len(_sentence_transformers) > SENTENCE_TRANSFORMER_CACHE_SIZE:
+                _sentence_transformers.popitem(last=False)
+        return _sentence_transformers[model_name]
+
 
 # ToDo: somewhere else
 def _set_extensions(
@@ -27,6 +62,252 @@ def _set_extensions(
         Doc.set_extension("doc_name", default=None)
     if not Doc.has_extension("doc_topic"):
         Doc.set_extension("doc_topic", default=None)
+    if not Doc.has_extension("doc_offset"):
+        Doc.set_extension("doc_offset", default=None)
+
+
+class EmbeddingStore:
+    """
+    Persistent store of phrase embeddings, addressed by model name and (whitespace & unicode) normalized phrase.
+    The vectors of each model are appended to a memory mapped float32 file, their rows are indexed in sqlite; when
+    the files exceed 'max_size_mb', the least recently used embeddings are dropped and the files are rewritten.
+    Lookups read the index in one transaction, writes hold its write lock, so that other processes that rewrite the
+    files don't mix up rows and vectors; within a process, the stores of the same folder share a lock.
+    """
+    _LOOKUP_BATCH = 500
+    _LOOKUP_ATTEMPTS = 3
+
+    def __init__(
+            self,
+            dir_path: Union[pathlib.Path, str],
+            max_size_mb: Optional[float] = EMBEDDING_STORE_SIZE_MB
+    ) -> None:
+        self._dir_path = pathlib.Path(dir_path)
+        self._dir_path.mkdir(parents=True, exist_ok=True)
+        self._max_size_mb = max_size_mb
+        self._connection = sqlite3.connect(self._dir_path / "index.sqlite", timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (namespace TEXT, phrase_hash TEXT, "
+                                 "row INTEGER, last_used REAL, PRIMARY KEY (namespace, phrase_hash))")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS models (namespace TEXT PRIMARY KEY, model TEXT, "
+                                 "dim INTEGER, n_rows INTEGER, generation INTEGER, hits INTEGER, misses INTEGER)")
+        self._connection.commit()
+        with _embedding_store_locks_lock:
+            self._lock = _embedding_store_locks.setdefault(str(self._dir_path.resolve()), threading.Lock())
+
+    @property
+    def path(
+            self
+    ) -> pathlib.Path:
+        return self._dir_path
+
+    @staticmethod
+    def namespace(
+            model_name: str
+    ) -> str:
+        return hashlib.sha1(model_name.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def phrase_hash(
+            phrase: str
+    ) -> str:
+        _normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", phrase)).strip()
+        return hashlib.sha1(_normalized.encode("utf-8")).hexdigest()
+
+    def _vector_file(
+            self,
+            namespace: str,
+            generation: int
+    ) -> pathlib.Path:
+        return self._dir_path / f"{namespace}_{generation}.f32"
+
+    def get(
+            self,
+            model_name: str,
+            phrases: List[str]
+    ) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """
+        :returns: the embeddings of the phrases (rows of the phrases that aren't stored are left at zero; None if the
+            model has no embeddings at all) and the mask of the stored phrases
+        """
+        _namespace = self.namespace(model_name)
+        _hashes = [self.phrase_hash(p) for p in phrases]
+        with self._lock:
+            for _attempt in range(self._LOOKUP_ATTEMPTS):
+                try:
+                    _embeddings, _rows = self._lookup(_namespace, _hashes)
+                    break
+                except FileNotFoundError:
+                    # another process evicted embeddings (and removed the vector file) while the index was read
+                    if _attempt == self._LOOKUP_ATTEMPTS - 1:
+                        raise
+            _found = np.asarray([h in _rows for h in _hashes], dtype=bool)
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                if len(_rows) > 0:
+                    self._connection.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE namespace = ? AND phrase_hash = ?",
+                        [(time.time(), _namespace, h) for h in _rows])
+                self._count(_namespace, model_name, int(_found.sum()), len(phrases) - int(_found.sum()))
+        return _embeddings, _found
+
+    def _lookup(
+            self,
+            namespace: str,
+            hashes: List[str]
+    ) -> Tuple[Optional[np.ndarray], dict]:
+        # one read transaction, so that the rows and the vector file are of the same generation
+        with self._connection:
+            self._connection.execute("BEGIN")
+            _model = self._connection.execute(
+                "SELECT dim, n_rows, generation FROM models WHERE namespace = ?", (namespace,)).fetchone()
+            if _model is None or _model[1] == 0:
+                return None, dict()
+            _dim, _, _generation = _model
+            _rows = dict()
+            for _start in range(0, len(hashes), self._LOOKUP_BATCH):
+                _batch = list(set(hashes[_start:_start + self._LOOKUP_BATCH]))
+                _rows.update(self._connection.execute(
+                    f"SELECT phrase_hash, row FROM embeddings WHERE namespace = ? AND phrase_hash IN "
+                    f"({','.join('?' * len(_batch))})", [namespace, *_batch]).fetchall())
+            _embeddings = np.zeros((len(hashes), _dim), dtype=np.float32)
+            if len(_rows) > 0:
+                _vectors = np.memmap(self._vector_file(namespace, _generation), dtype=np.float32, mode="r")
+                _vectors = _vectors.reshape(-1, _dim)
+                _embeddings[[h in _rows for h in hashes]] = _vectors[[_rows[h] for h in hashes if h in _rows]]
+                del _vectors
+        return _embeddings, _rows
+
+    def put(
+            self,
+            model_name: str,
+            phrases: List[str],
+            embeddings: np.ndarray
+    ) -> None:
+        if len(phrases) == 0:
+            return
+        _namespace = self.namespace(model_name)
+        _embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        _stale_files = list()
+        with self._lock, self._connection:
+            # the write lock of the index also serializes the appends of other processes
+            self._connection.execute("BEGIN IMMEDIATE")
+            _model = self._connection.execute(
+                "SELECT dim, n_rows, generation FROM models WHERE namespace = ?", (_namespace,)).fetchone()
+            _dim, _n_rows, _generation = (0, 0, 0) if _model is None else _model
+            _dim = _embeddings.shape[1] if _n_rows == 0 else _dim
+            if _embeddings.shape[1] != _dim:
+                raise ValueError(f"The store has embeddings of dimension {_dim} for '{model_name}', "
+                                 f"got {_embeddings.shape[1]}.")
+            _new = dict()
+            for _phrase_hash, _vector in zip((self.phrase_hash(p) for p in phrases), _embeddings):
+                _new.setdefault(_phrase_hash, _vector)
+            _stored = set()
+            for _start in range(0, len(_new), self._LOOKUP_BATCH):
+                _batch = list(_new)[_start:_start + self._LOOKUP_BATCH]
+                _stored.update(r[0] for r in self._connection.execute(
+                    f"SELECT phrase_hash FROM embeddings WHERE namespace = ? AND phrase_hash IN "
+                    f"({','.join('?' * len(_batch))})", [_namespace, *_batch]))
+            _new = {h: v for h, v in _new.items() if h not in _stored}
+            if len(_new) == 0:
+                return
+            with self._vector_file(_namespace, _generation).open(mode="ab") as _file:
+                _file.truncate(_n_rows * _dim * 4)
+                _file.write(np.stack(list(_new.values())).tobytes())
+            _now = time.time()
+            self._connection.executemany("INSERT INTO embeddings VALUES (?, ?, ?, ?)",
+                                         [(_namespace, h, _n_rows + i, _now) for i, h in enumerate(_new)])
+            self._connection.execute(
+                "INSERT INTO models VALUES (?, ?, ?, ?, ?, 0, 0) "
+                "ON CONFLICT (namespace) DO UPDATE SET dim = ?, n_rows = ?",
+                (_namespace, model_name, _dim, _n_rows + len(_new), _generation, _dim, _n_rows + len(_new)))
+            _stale_files = self._evict()
+        # the replaced vector files are only removed once the new generation is committed
+        for _file in _stale_files:
+            _file.unlink(missing_ok=True)
+
+    def _count(
+            self,
+            namespace: str,
+            model_name: str,
+            hits: int,
+            misses: int
+    ) -> None:
+        self._connection.execute(
+            "INSERT INTO models VALUES (?, ?, 0, 0, 0, ?, ?) "
+            "ON CONFLICT (namespace) DO UPDATE SET hits = hits + ?, misses = misses + ?",
+            (namespace, model_name, hits, misses, hits, misses))
+
+    def _evict(
+            self
+    ) -> List[pathlib.Path]:
+        # has to be called within the (write) transaction of 'put'; returns the vector files that were replaced
+        _stale_files = list()
+        if self._max_size_mb is None:
+            return _stale_files
+        _models = self._connection.execute(
+            "SELECT namespace, dim, n_rows, generation FROM models WHERE n_rows > 0").fetchall()
+        _row_bytes = {n: d * 4 for n, d, _, _ in _models}
+        if sum(_row_bytes[n] * r for n, _, r, _ in _models) <= self._max_size_mb * 2 ** 20:
+            return _stale_files
+        # keeps the most recently used embeddings (of all models) that fill 90% of the budget
+        _budget, _keep = self._max_size_mb * 2 ** 20 * .9, dict()
+        for _namespace, _phrase_hash, _row in self._connection.execute(
+                "SELECT namespace, phrase_hash, row FROM embeddings ORDER BY last_used DESC"):
+            _budget -= _row_bytes[_namespace]
+            if _budget < 0:
+                break
+            _keep.setdefault(_namespace, []).append((_phrase_hash, _row))
+        for _namespace, _dim, _n_rows, _generation in _models:
+            _kept = sorted(_keep.get(_namespace, []), key=lambda k: k[1])
+            if len(_kept) == _n_rows:
+                continue
+            # the vectors are rewritten into a new file, so that readers of the old one aren't disturbed
+            _vectors = np.memmap(self._vector_file(_namespace, _generation), dtype=np.float32, mode="r")
+            _vectors = _vectors.reshape(-1, _dim)
+            with self._vector_file(_namespace, _generation + 1).open(mode="wb") as _file:
+                _file.write(np.ascontiguousarray(_vectors[[r for _, r in _kept]]).tobytes())
+            del _vectors
+            self._connection.execute("DELETE FROM embeddings WHERE namespace = ?", (_namespace,))
+            self._connection.executemany("INSERT INTO embeddings VALUES (?, ?, ?, ?)",
+                                         [(_namespace, h, i, time.time()) for i, (h, _) in enumerate(_kept)])
+            self._connection.execute("UPDATE models SET n_rows = ?, generation = ? WHERE namespace = ?",
+                                     (len(_kept), _generation + 1, _namespace))
+            _stale_files.append(self._vector_file(_namespace, _generation))
+            logging.info(f"Evicted {_n_rows - len(_kept)} embeddings from the embedding store "
+                         f"(budget: {self._max_size_mb} MB).")
+        return _stale_files
+
+    def statistics(
+            self
+    ) -> dict:
+        with self._lock:
+            _models = self._connection.execute(
+                "SELECT model, dim, n_rows, hits, misses FROM models").fetchall()
+        _stats = [{"model": m, "embeddings": r, "size_mb": round(r * d * 4 / 2 ** 20, 2), "hits": h, "misses": mi,
+                   "hit_rate": round(h / (h + mi), 4) if h + mi > 0 else None} for m, d, r, h, mi in _models]
+        _hits, _misses = sum(m["hits"] for m in _stats), sum(m["misses"] for m in _stats)
+        return {"models": _stats, "size_mb": round(sum(m["size_mb"] for m in _stats), 2),
+                "max_size_mb": self._max_size_mb, "hits": _hits, "misses": _misses,
+                "hit_rate": round(_hits / (_hits + _misses), 4) if _hits + _misses > 0 else None}
+
+    def close(
+            self
+    ) -> None:
+        self._connection.close()
+
+    @staticmethod
+    def from_config(
+            embedding_store: Union[bool, str, pathlib.Path, None],
+            cache_path: pathlib.Path,
+            max_size_mb: Optional[float] = EMBEDDING_STORE_SIZE_MB
+    ) -> Optional['EmbeddingStore']:
+        """
+        :returns: the store at the given path, in the cache folder if 'embedding_store' is just True, or None
+        """
+        if isinstance(embedding_store, (str, pathlib.Path)):
+            return EmbeddingStore(embedding_store, max_size_mb)
+        return EmbeddingStore(cache_path / EMBEDDING_STORE_DIR, max_size_mb) if embedding_store else None
 
 
 class SentenceEmbeddingsFactory:
@@ -37,18 +318,15 @@ class SentenceEmbeddingsFactory:
             embeddings_path: Union[pathlib.Path, str],
             view_from_topics: Optional[Iterable[str]] = None,
     ):
-        _set_extensions()
-        _data_obj: DataProcessingFactory.DataProcessing = load_pickle(
-            pathlib.Path(data_obj_path).absolute()
-        )
+        _data_obj = DataProcessingFactory.load(pathlib.Path(data_obj_path).absolute())
         if view_from_topics is not None:
             _data_obj.set_view_by_labels(view_from_topics)
-        _embeddings_obj: SentenceEmbeddingsFactory.SentenceEmbeddings = load_pickle(
+        # the pickle holds only the embeddings and their metadata; the data object is the one they were created from
+        _sent_emb: SentenceEmbeddingsFactory.SentenceEmbeddings = load_pickle(
             pathlib.Path(embeddings_path).absolute()
         )
-        _sent_emb = SentenceEmbeddingsFactory.SentenceEmbeddings(data_obj=_data_obj)
-        _sent_emb._embeddings = _embeddings_obj.sentence_embeddings
-        assert _data_obj.chunk_sets_n == _embeddings_obj.sentence_embeddings.shape[0]
+        _sent_emb.attach_data_obj(_data_obj, keep_view=view_from_topics is not None)
+        assert _data_obj.chunk_sets_n == _sent_emb.sentence_embeddings.shape[0]
         return _sent_emb
 
     @staticmethod
@@ -61,6 +339,11 @@ class SentenceEmbeddingsFactory:
             view_from_topics: Optional[Iterable[str]] = None,
             down_scale_algorithm: Optional[str] = None,
             head_only: bool = False,
+            filter_phrases: bool = False,
+            pooled_embeddings: bool = False,
+            normalize_embeddings: bool = False,
+            embedding_store: Union[bool, str, pathlib.Path] = False,
+            embedding_store_size_mb: Optional[float] = EMBEDDING_STORE_SIZE_MB,
             **kwargs
     ):
         _down_scale_alg_kwargs = {"_".join(key.split("_")[1:]): val for key, val in kwargs.items()
@@ -73,12 +356,47 @@ class SentenceEmbeddingsFactory:
 
         logging.info(f"Creating Sentence Embedding with '{_down_scale_obj}'")
         _sent_emb = SentenceEmbeddingsFactory.SentenceEmbeddings(
-            model_name=model_name,
+            model_name=None if pooled_embeddings else model_name,
             data_obj=data_obj,
             down_scale_obj=_down_scale_obj,
-            head_only=head_only
+            head_only=head_only,
+            pooled=pooled_embeddings,
+            normalize=normalize_embeddings
         )
-        _sent_emb._encode_data(n_process, **kwargs)
+        if filter_phrases:
+            _sent_emb._restrict_to_filtered_phrases()
+        _sent_emb.open_store(None if pooled_embeddings else EmbeddingStore.from_config(
+            embedding_store, cache_path, embedding_store_size_mb))
+        try:
+            _sent_emb._encode_data(n_process, **kwargs)
+        finally:
+            _sent_emb.close_store()
+        save_pickle(_sent_emb, (cache_path / pathlib.Path(f"{cache_name}.pickle")))
+        return _sent_emb
+
+    @staticmethod
+    def append(
+            sent_emb: Union['SentenceEmbeddingsFactory.SentenceEmbeddings', pathlib.Path, str],
+            data_obj: DataProcessingFactory.DataProcessing,
+            cache_path: pathlib.Path,
+            cache_name: str,
+            model_name: Optional[str] = None,
+            n_process: int = 1,
+            **kwargs
+    ):
+        _sent_emb = sent_emb if isinstance(sent_emb, SentenceEmbeddingsFactory.SentenceEmbeddings) else load_pickle(
+            pathlib.Path(sent_emb).absolute())
+        if getattr(_sent_emb, "_model_name", None) is None and not getattr(_sent_emb, "_pooled", False):
+            _sent_emb._model_name = model_name
+        _sent_emb.attach_data_obj(data_obj)
+        if getattr(_sent_emb, "_store_path", None) is not None and not getattr(_sent_emb, "_pooled", False):
+            _sent_emb.open_store(EmbeddingStore(_sent_emb._store_path, _sent_emb._store_size_mb))
+
+        try:
+            _new_ids = _sent_emb._encode_new_data(n_process, **kwargs)
+        finally:
+            _sent_emb.close_store()
+        logging.info(f"Encoded {len(_new_ids)} new phrases.")
         save_pickle(_sent_emb, (cache_path / pathlib.Path(f"{cache_name}.pickle")))
         return _sent_emb
 
@@ -88,13 +406,100 @@ class SentenceEmbeddingsFactory:
                 model_name: Optional[str] = None,
                 data_obj: Optional[DataProcessingFactory.DataProcessing] = None,
                 down_scale_obj: Optional[object] = None,
-                head_only: bool = False
+                head_only: bool = False,
+                pooled: bool = False,
+                normalize: bool = False
         ):
-            self._model = None if model_name is None else SentenceTransformer(model_name)
+            if pooled and data_obj.phrase_embeddings is None:
+                raise ValueError("There are no pooled phrase embeddings; the data needs to be preprocessed with "
+                                 "'pool_embeddings'.")
+            self._model_name = model_name
+            self._model = None if model_name is None else get_sentence_transformer(model_name)
             self._data_obj = data_obj
             self._down_scale_obj = down_scale_obj
             self._embeddings = None
             self._head_only = head_only #ToDo?
+            # the id in the full chunk table of the phrase of every embedding (in the order of the embeddings)
+            self._phrase_ids = None
+            self._filter_phrases = False
+            # the phrase embeddings were pooled from the spaCy pipeline while parsing instead of being encoded here
+            self._pooled = pooled
+            self._normalize = normalize
+            self._view_labels = None if data_obj is None or data_obj._view is None else list(data_obj._view["labels"])
+            self._store = None
+            self._store_path = None
+            self._store_size_mb = None
+            # hits & misses of the embedding store for the phrases of this object
+            self._store_statistics = {"hits": 0, "misses": 0}
+
+        def __getstate__(
+                self
+        ) -> dict:
+            # neither the model nor the data object (which has a pickle of its own) are stored with the embeddings
+            _state = self.__dict__.copy()
+            _state["_model"] = None
+            _state["_data_obj"] = None
+            _state["_store"] = None
+            return _state
+
+        @property
+        def model(
+                self
+        ) -> Optional[SentenceTransformer]:
+            if getattr(self, "_model", None) is None and getattr(self, "_model_name", None) is not None:
+                self._model = get_sentence_transformer(self._model_name)
+            return self._model
+
+        @property
+        def store_statistics(
+                self
+        ) -> Optional[dict]:
+            """
+            :returns: the hits & misses of the embedding store when encoding the phrases of this object and the
+                statistics of the whole store (None without a store)
+            """
+            if getattr(self, "_store_path", None) is None:
+                return None
+            _stats = dict(self._store_statistics)
+            _total = _stats["hits"] + _stats["misses"]
+            _stats["hit_rate"] = round(_stats["hits"] / _total, 4) if _total > 0 else None
+            _stats["path"] = str(self._store_path)
+            if pathlib.Path(self._store_path).exists():
+                _store = EmbeddingStore(self._store_path, self._store_size_mb)
+                _stats["store"] = _store.statistics()
+                _store.close()
+            return _stats
+
+        def open_store(
+                self,
+                store: Optional[EmbeddingStore]
+        ) -> None:
+            if store is None:
+                return
+            self._store = store
+            self._store_path = store.path
+            self._store_size_mb = store._max_size_mb
+            if getattr(self, "_store_statistics", None) is None:
+                self._store_statistics = {"hits": 0, "misses": 0}
+
+        def close_store(
+                self
+        ) -> None:
+            if getattr(self, "_store", None) is not None:
+                self._store.close()
+            self._store = None
+
+        @property
+        def model_name(
+                self
+        ) -> Optional[str]:
+            return getattr(self, "_model_name", None)
+
+        @property
+        def normalized(
+                self
+        ) -> bool:
+            return getattr(self, "_normalize", False)
 
         @property
         def sentence_embeddings(
@@ -114,13 +519,132 @@ class SentenceEmbeddingsFactory:
         ) -> int:
             return self._embeddings.shape[1]
 
-        # ToDo: maybe the tfidf filtering shall be applied already here?
+        @property
+        def phrase_ids(
+                self
+        ) -> np.ndarray:
+            """
+            :returns: the id in the full chunk table of the phrase of every embedding
+            """
+            return self._phrase_ids if self._phrase_ids is not None else self._data_obj.phrase_ids
+
+        def attach_data_obj(
+                self,
+                data_obj: DataProcessingFactory.DataProcessing,
+                keep_view: bool = False
+        ) -> None:
+            """
+            Sets the data object of the embeddings and restricts it to the view (unless 'keep_view') and the phrases
+            the embeddings were created for, so that the rows of its ``data_chunk_sets`` line up with the embeddings.
+            """
+            self._data_obj = data_obj
+            if not keep_view and getattr(self, "_view_labels", None) is not None:
+                data_obj.set_view_by_labels(self._view_labels)
+            if getattr(self, "_phrase_ids", None) is not None:
+                data_obj.restrict_phrases(self._phrase_ids)
+
+        def _restrict_to_filtered_phrases(
+                self
+        ) -> None:
+            # only the phrases that pass the document frequency & stop phrase filter (and aren't just negated) can
+            # reach a graph, so only these are embedded; the data object's chunk sets are restricted accordingly
+            self._data_obj.restrict_phrases(None)
+            _n_phrases = self._data_obj.chunk_sets_n
+            self._phrase_ids = self._data_obj.phrase_ids[self._data_obj.phrase_filter_mask]
+            self._filter_phrases = True
+            self._data_obj.restrict_phrases(self._phrase_ids)
+            logging.info(f"Embedding {self._phrase_ids.shape[0]} of {_n_phrases} phrases "
+                         f"(filter: {self._data_obj.filter_params}).")
+
         def _encode_data(
                 self,
                 n_process: int = 1,
                 device: Union[str, List[str]] = 'cpu',
                 **kwargs
         ):
+            self._phrase_ids = np.array(self._data_obj.phrase_ids)
+            if self._pooled:
+                self._embeddings = self._data_obj.phrase_embeddings
+            else:
+                self._embeddings = self._encode_with_store(
+                    self._data_obj.data_chunk_sets.texts, n_process, device, **kwargs)
+            if self.normalized:
+                self._embeddings = normalize_rows(self._embeddings)
+            if not isinstance(self._down_scale_obj, NoneDownScaleObj):
+                self._embeddings = self._down_scale_obj.fit_transform(self._embeddings)
+
+        def _encode_new_data(
+                self,
+                n_process: int = 1,
+                device: Union[str, List[str]] = 'cpu',
+                **kwargs
+        ) -> np.ndarray:
+            # the phrases (of the view) that aren't embedded yet are looked up by id: appended documents can bring
+            # phrases with any id into the view; their embeddings are appended at the end (with their ids)
+            _n_encoded = self._embeddings.shape[0]
+            _filter_phrases = getattr(self, "_filter_phrases", getattr(self, "_phrase_ids", None) is not None)
+            self._data_obj.restrict_phrases(None)
+            if getattr(self, "_phrase_ids", None) is None:
+                # older pickles only kept the ids of filtered phrases; otherwise the first phrases were embedded
+                self._phrase_ids = self._data_obj.phrase_ids[:_n_encoded]
+            _candidates = self._data_obj.phrase_ids
+            if _filter_phrases:
+                _candidates = _candidates[self._data_obj.phrase_filter_mask]
+            _new_ids = np.setdiff1d(_candidates, self._phrase_ids)
+            if _new_ids.shape[0] == 0:
+                self._data_obj.restrict_phrases(self._phrase_ids)
+                return np.arange(_n_encoded, _n_encoded)
+
+            self._data_obj.restrict_phrases(_new_ids)
+            if getattr(self, "_pooled", False):
+                _new_embeddings = self._data_obj.phrase_embeddings
+            else:
+                _new_embeddings = self._encode_with_store(
+                    self._data_obj.data_chunk_sets.texts, n_process, device, **kwargs)
+            if self.normalized:
+                _new_embeddings = normalize_rows(_new_embeddings)
+            if not isinstance(self._down_scale_obj, NoneDownScaleObj):
+                _new_embeddings = self._down_scale_obj.transform(_new_embeddings)
+            self._embeddings = np.concatenate([self._embeddings, _new_embeddings], axis=0)
+            self._phrase_ids = np.concatenate([self._phrase_ids, _new_ids])
+            self._data_obj.restrict_phrases(self._phrase_ids)
+            return np.arange(_n_encoded, self._embeddings.shape[0])
+
+        def _encode_with_store(
+                self,
+                sentences: List[str],
+                n_process: int = 1,
+                device: Union[str, List[str]] = 'cpu',
+                **kwargs
+        ) -> np.ndarray:
+            """
+            Looks the phrases up in the embedding store (if there is one) and encodes only the ones that are missing.
+            """
+            if getattr(self, "_store", None) is None:
+                return self._encode(sentences, n_process, device, **kwargs)
+            _sentences = list(sentences)
+            _embeddings, _found = self._store.get(self.model_name, _sentences)
+            _missing = [s for s, f in zip(_sentences, _found) if not f]
+            self._store_statistics["hits"] += int(_found.sum())
+            self._store_statistics["misses"] += len(_missing)
+            logging.info(f"Found {int(_found.sum())} of {len(_sentences)} phrases in the embedding store.")
+            if len(_missing) == 0:
+                return _embeddings
+            _encoded = np.asarray(self._encode(_missing, n_process, device, **kwargs))
+            self._store.put(self.model_name, _missing, _encoded)
+            if _embeddings is None:
+                return _encoded
+            _embeddings = _embeddings.astype(_encoded.dtype, copy=False)
+            _embeddings[~_found] = _encoded
+            return _embeddings
+
+        def _encode(
+                self,
+                sentences: List[str],
+                n_process: int = 1,
+                device: Union[str, List[str]] = 'cpu',
+                **kwargs
+        ) -> np.ndarray:
             if "convert_to_numpy" in kwargs.keys():
                 kwargs.pop("convert_to_numpy") #ToDo?
 
@@ -130,20 +654,28 @@ class SentenceEmbeddingsFactory:
 
             if n_process > 1:
                 logging.info(f"Using {n_process} processes.")
-                pool = self._model.start_multi_process_pool([device]*n_process if isinstance(device, str) else device)
-                self._embeddings = self._model.encode_multi_process(
-                    sentences=[dcs['text'] for dcs in self._data_obj.data_chunk_sets],
-                    pool=pool,
-                    **kwargs
-                )
+                pool = self.model.start_multi_process_pool([device]*n_process if isinstance(device, str) else device)
+                try:
+                    return self.model.encode_multi_process(
+                        sentences=sentences,
+                        pool=pool,
+                        **kwargs
+                    )
+                finally:
+                    self.model.stop_multi_process_pool(pool)
             else:
-                self._embeddings = self._model.encode(
-                    sentences=[dcs['text'] for dcs in self._data_obj.data_chunk_sets],
+                return self.model.encode(
+                    sentences=sentences,
                     convert_to_numpy=True,
                     **kwargs
                 )
-            if not isinstance(self._down_scale_obj, NoneDownScaleObj):
-                self._embeddings = self._down_scale_obj.fit_transform(self._embeddings)
+
+
+def normalize_rows(
+        embeddings: np.ndarray
+) -> np.ndarray:
+    _norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(_norms > 0, _norms, 1)
 
 
 def cosine(
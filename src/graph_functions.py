@@ -18,25 +18,34 @@ from sklearn.cluster import AffinityPropagation
 from tqdm.auto import tqdm
 
 from embedding_functions import cosine_against_collection, cosine
+from chunk_functions import ChunkTable
 
 
 class GraphCreator:
     def __init__(
             self,
-            chunk_set_dict: List[Dict],
+            chunk_set_dict: Union[ChunkTable, List[Dict]],
             embeddings: np.ndarray,
-            doc_text_value: str = "doc"
+            doc_text_value: str = "doc",
+            variants: Optional[List[List[str]]] = None
     ) -> None:
         self.chunk_set_dict = chunk_set_dict
         self.embeddings = embeddings
         self.doc_text_value = doc_text_value
-        self.doc_count_array = np.asarray([len(d[self.doc_text_value]) for d in chunk_set_dict])
+        # the surface forms that were merged into each phrase before the embedding (see 'canonicalize')
+        self.variants = variants
+        if isinstance(chunk_set_dict, ChunkTable) and doc_text_value == "doc":
+            self.doc_count_array = chunk_set_dict.doc_counts
+        else:
+            self.doc_count_array = np.asarray([len(d[self.doc_text_value]) for d in chunk_set_dict])
 
     @lru_cache()
     def _chunks_as_np_array(
             self,
             text_value: str = "text"
     ) -> np.ndarray:
+        if isinstance(self.chunk_set_dict, ChunkTable) and text_value == "text":
+            return self.chunk_set_dict.text_array
         return np.asarray([i[text_value] for i in self.chunk_set_dict])
 
     @lru_cache()
@@ -164,6 +173,9 @@ class GraphCreator:
                                values={p.item(): {'label': self.chunk_set_dict[p][text_value],
                                                   'documents': _documents[i]}
                                        for i, p in enumerate(_adapt_cluster)})
+        if self.variants is not None:
+            nx.set_node_attributes(G=graph, values={p.item(): self.variants[p] for p in _adapt_cluster},
+                                   name='variants')
 
         return graph
 
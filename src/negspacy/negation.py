@@ -1,5 +1,10 @@
+import hashlib
+import json
+import os
 import pathlib
-from itertools import islice
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate, islice
 from typing import Union
 
 from spacy.language import Language
@@ -12,6 +17,69 @@ from .termsets import termset
 
 default_ts = termset("en_clinical").get_patterns()
 
+# the compiled termsets - the 'LOWER' hashes of the tokenized triggers per type - by termset content and tokenizer;
+# hashes don't depend on the vocab, so every pipeline with the same tokenizer (e.g. a newly loaded model) fills its
+# matcher from them without tokenizing the termset again
+COMPILED_TERMSETS_SIZE = 16
+_compiled_termsets = OrderedDict()
+# they're kept on disk as well (a json file per termset and tokenizer), so that other processes find them; empty to
+# keep them in memory only
+COMPILED_TERMSETS_PATH = os.environ.get("NEGEX_TERMSET_CACHE", str(pathlib.Path.home() / ".cache" / "negspacy"))
+# parsed 'neg_termset_file's by (path, modification time, size)
+_termset_files = dict()
+
+
+def read_compiled_termset(key: str) -> Union[dict, None]:
+    if not COMPILED_TERMSETS_PATH:
+        return None
+    _file = pathlib.Path(COMPILED_TERMSETS_PATH) / f"{key}.json"
+    try:
+        return json.loads(_file.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_compiled_termset(key: str, compiled: dict) -> None:
+    if not COMPILED_TERMSETS_PATH:
+        return
+    _path = pathlib.Path(COMPILED_TERMSETS_PATH)
+    try:
+        _path.mkdir(parents=True, exist_ok=True)
+        # written aside first, so that other processes never read a partial file
+        _tmp = _path / f"{key}.{os.getpid()}.tmp"
+        _tmp.write_text(json.dumps(compiled))
+        os.replace(_tmp, _path / f"{key}.json")
+    except OSError as e:
+        logging.warning(f"Couldn't store the compiled termset in '{_path}': {e}")
+
+
+def read_termset_file(neg_termset_file: Union[pathlib.Path, str]) -> dict:
+    """
+    Maps the rules of a termset file of the original negex implementation (a phrase and its tag, e.g. '[PREN]',
+    separated by two tabs per line) onto a negspacy termset; the result is cached until the file changes.
+    """
+    _path = pathlib.Path(neg_termset_file).resolve()
+    _stat = _path.stat()
+    _key = (str(_path), _stat.st_mtime_ns, _stat.st_size)
+    if _key not in _termset_files:
+        _map = {"[CONJ]": "termination", "[PSEU]": "pseudo_negations",
+                "[POST]": "following_negations", "[PREN]": "preceding_negations",
+                "[PREP]": "preceding_speculation", "[POSP]": "following_speculation"}
+        ts = {
+            "pseudo_negations": [],
+            "preceding_negations": [],
+            "following_negations": [],
+            "termination": [],
+            "preceding_speculation": [],
+            "following_speculation": [],
+            "none": []
+        }
+        for rule in _path.read_text().splitlines():
+            _str, _tag = rule.split('\t\t')
+            ts[_map.get(_tag, "none")].append(_str)
+        _termset_files[_key] = ts
+    return _termset_files[_key]
+
 
 @Language.factory(
     "negex",
@@ -86,30 +154,10 @@ class Negex:
 
         ts = neg_termset
         if neg_termset_file is not None:
-            rules = None
-            if isinstance(neg_termset_file, str):
-                rules = pathlib.Path(neg_termset_file).read_text().splitlines()
-            elif isinstance(neg_termset_file, pathlib.Path):
-                rules = neg_termset_file.read_text().splitlines()
+            if isinstance(neg_termset_file, (str, pathlib.Path)):
+                ts = read_termset_file(neg_termset_file)
             else:
                 logging.info("'neg_termset_file' could not be read. Reverting to default 'neg_termset'.")
-
-            if rules is not None:
-                _map = {"[CONJ]": "termination", "[PSEU]": "pseudo_negations",
-                        "[POST]": "following_negations", "[PREN]": "preceding_negations",
-                        "[PREP]": "preceding_speculation", "[POSP]": "following_speculation"}
-                ts = {
-                    "pseudo_negations": [],
-                    "preceding_negations": [],
-                    "following_negations": [],
-                    "termination": [],
-                    "preceding_speculation": [],
-                    "following_speculation": [],
-                    "none": []
-                }
-                for rule in rules:
-                    _str, _tag = rule.split('\t\t')
-                    ts[_map.get(_tag, "none")].append(_str)
         expected_keys = [
             "pseudo_negations",
             "preceding_negations",
@@ -153,27 +201,49 @@ class Negex:
         self.scope = scope
         self.language = language
         self.chunk_prefix = list(nlp.tokenizer.pipe(chunk_prefix))
+        self._chunk_prefix_lower = tuple(cp.text.lower() for cp in self.chunk_prefix)
         self.build_patterns()
 
     def build_patterns(self):
-        # efficiently build spaCy matcher patterns
-        self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        # the triggers are only tokenized if the termset wasn't compiled with this tokenizer before (see
+        # 'COMPILED_TERMSETS_PATH'); the matcher takes the hashes as they are
+        _key = self._termset_key()
+        _compiled = _compiled_termsets.get(_key, None) if _key is not None else None
+        if _compiled is None and _key is not None:
+            _compiled = read_compiled_termset(_key)
+        if _compiled is None:
+            _compiled = self._compile_patterns()
+            if _key is not None:
+                write_compiled_termset(_key, _compiled)
+        if _key is not None:
+            _compiled_termsets[_key] = _compiled
+            _compiled_termsets.move_to_end(_key)
+            while len(_compiled_termsets) > COMPILED_TERMSETS_SIZE:
+                _compiled_termsets.popitem(last=False)
 
-        self.pseudo_patterns = list(self.nlp.tokenizer.pipe(self.pseudo_negations))
-        self.matcher.add("pseudo", None, *self.pseudo_patterns)
-
-        self.preceding_patterns = list(
-            self.nlp.tokenizer.pipe(self.preceding_negations)
-        )
-        self.matcher.add("Preceding", None, *self.preceding_patterns)
-
-        self.following_patterns = list(
-            self.nlp.tokenizer.pipe(self.following_negations)
-        )
-        self.matcher.add("Following", None, *self.following_patterns)
-
-        self.termination_patterns = list(self.nlp.tokenizer.pipe(self.termination))
-        self.matcher.add("Termination", None, *self.termination_patterns)
+        self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        for _label, _patterns in _compiled.items():
+            self.matcher.add(_label, [tuple(_p) for _p in _patterns])
+        self._match_types = {self.nlp.vocab.strings[_label]: _label for _label in _compiled.keys()}
+
+    def _termset_key(self):
+        # termset content and tokenizer (its rules, not the vocab); None if the tokenizer can't be serialized
+        try:
+            _tokenizer = self.nlp.tokenizer.to_bytes(exclude=["vocab"])
+        except (AttributeError, NotImplementedError, TypeError, ValueError):
+            return None
+        _termset = [self.pseudo_negations, self.preceding_negations, self.following_negations, self.termination]
+        _hash = hashlib.sha1(json.dumps(_termset).encode("utf-8"))
+        _hash.update(_tokenizer)
+        return _hash.hexdigest()
+
+    def _compile_patterns(self):
+        # tokenizes the triggers; a pattern is given by the 'LOWER' hashes of its tokens
+        return {
+            _label: [[_token.lower for _token in _doc] for _doc in self.nlp.tokenizer.pipe(_triggers)]
+            for _label, _triggers in [("pseudo", self.pseudo_negations), ("Preceding", self.preceding_negations),
+                                      ("Following", self.following_negations), ("Termination", self.termination)]
+        }
 
     def process_negations(self, doc: Doc):
         """
@@ -210,31 +280,30 @@ class Negex:
         terminating = list()
 
         matches = self.matcher(doc)
-        pseudo = [
-            (match_id, start, end)
-            for match_id, start, end in matches
-            if self.nlp.vocab.strings[match_id] == "pseudo"
-        ]
-        _pseudo_spans = [doc[p[1]:p[2]] for p in pseudo]
+        # a trigger is dropped if it overlaps any pseudo negation: with the pseudo spans sorted by start, the
+        # candidates are those starting before the trigger ends, of which the one reaching furthest is checked
+        pseudo = sorted((start, end) for match_id, start, end in matches
+                        if self._match_types.get(match_id) == "pseudo")
+        pseudo_starts = [p[0] for p in pseudo]
+        pseudo_reach = list(accumulate((p[1] for p in pseudo), max))
 
         for match_id, start, end in matches:
-            if self.nlp.vocab.strings[match_id] == "pseudo":
+            match_type = self._match_types.get(match_id)
+            if match_type == "pseudo":
+                continue
+            candidates = bisect_left(pseudo_starts, end)
+            if candidates > 0 and pseudo_reach[candidates - 1] > start:
                 continue
-            pseudo_flag = False
-            _spans = SpanGroup(doc, spans=_pseudo_spans.copy() + [doc[start:end]])
-            if _spans.has_overlap:
-                pseudo_flag = True
-            if not pseudo_flag:
-                if self.nlp.vocab.strings[match_id] == "Preceding":
-                    preceding.append((match_id, start, end))
-                elif self.nlp.vocab.strings[match_id] == "Following":
-                    following.append((match_id, start, end))
-                elif self.nlp.vocab.strings[match_id] == "Termination":
-                    terminating.append((match_id, start, end))
-                else:
-                    logging.warnings(
-                        f"phrase {doc[start:end].text} not in one of the expected matcher types."
-                    )
+            if match_type == "Preceding":
+                preceding.append((match_id, start, end))
+            elif match_type == "Following":
+                following.append((match_id, start, end))
+            elif match_type == "Termination":
+                terminating.append((match_id, start, end))
+            else:
+                logging.warning(
+                    f"phrase {doc[start:end].text} not in one of the expected matcher types."
+                )
         return preceding, following, terminating
 
     def termination_boundaries(self, doc, terminating):
@@ -254,7 +323,9 @@ class Negex:
             list of tuples with (start, end) of spans
 
         """
-        sent_starts = [sent.start for sent in doc.sents]
+        # without parse or sentence annotation (e.g. rule based noun chunks), the doc is taken as one sentence
+        sent_starts = ([sent.start for sent in doc.sents]
+                       if doc.has_annotation("SENT_START") or doc.has_annotation("DEP") else [0])
         terminating_starts = [t[1] for t in terminating]
         starts = sent_starts + terminating_starts + [len(doc)]
         starts.sort()
@@ -280,47 +351,81 @@ class Negex:
         #  also this won't probably work well with NERs
         #  also I need to account for conjunctions!
         preceding, following, terminating = self.process_negations(doc)
+        if len(preceding) == 0 and len(following) == 0 and not self.chunk_prefix:
+            return doc
         boundaries = self.termination_boundaries(doc, terminating)
-        for b in boundaries:
-            sub_preceding = [i for i in preceding if b[0] <= i[1] < b[1]]
-            sub_following = [i for i in following if b[0] <= i[1] < b[1]]
-
-            for foi in self.features_of_interest:
-                for ft in getattr(doc[b[0]: b[1]], foi):
-                    if self.feature_types:
-                        if ft.label_ not in self.feature_types:
-                            continue
-                    if self.chunk_prefix:
-                        if self.scope is not None and self.scope > 0:
-                            if set(f.text.lower() for f in islice(ft.root.lefts, self.scope)).intersection(
-                                    cp.text.lower() for cp in self.chunk_prefix):
-                                ft._.set(self.extension_name, True)
-                                continue
-                        elif any(
-                                ft.text.lower().startswith(c.text.lower())
-                                for c in self.chunk_prefix
-                        ):
+        boundary_starts = [b[0] for b in boundaries]
+        # the scope check needs a dependency parse
+        scope = self.scope if doc.has_annotation("DEP") else None
+        # the triggers of a boundary are those starting within it; per boundary, only the earliest start (of the
+        # preceding) and the furthest end (of the following triggers) and the longest trigger (for the scope) count
+        preceding_scopes = self._trigger_scopes(preceding, boundaries, boundary_starts, lambda t: t[1], min)
+        following_scopes = self._trigger_scopes(following, boundaries, boundary_starts, lambda t: t[2], max)
+
+        for foi in self.features_of_interest:
+            for ft in self._doc_features(doc, foi):
+                # the boundary that holds the feature's start; the feature needs to end within it as well
+                b = bisect_right(boundary_starts, ft.start) - 1
+                if b < 0 or ft.end > boundaries[b][1]:
+                    continue
+                if self.feature_types:
+                    if ft.label_ not in self.feature_types:
+                        continue
+                if self.chunk_prefix:
+                    if scope is not None and scope > 0:
+                        if set(f.text.lower() for f in islice(ft.root.lefts, self.scope)).intersection(
+                                self._chunk_prefix_lower):
                             ft._.set(self.extension_name, True)
                             continue
-                    # sorts by biggest span; i.e. token count - most first
-                    sorted_sub_preceding = sorted(sub_preceding, key=lambda s: s[2] - s[1], reverse=True)
-                    if any(pre[1] < ft.start for pre in sorted_sub_preceding):
-                        if self.scope is not None and self.scope > 0:
-                            _span_group = self._get_span_groups_right(doc, ft, sorted_sub_preceding[0])
-                            if not _span_group.has_overlap:
-                                continue
-                        ft._.set(self.extension_name, True)
-                        continue
-                    sorted_sub_following = sorted(sub_following, key=lambda s: s[2] - s[1], reverse=True)
-                    if any(fol[2] > ft.end for fol in sorted_sub_following):
-                        if self.scope is not None and self.scope > 0:
-                            _span_group = self._get_span_groups_left(doc, ft, sorted_sub_following[0])
-                            if not _span_group.has_overlap:
-                                continue
+                    elif ft.text.lower().startswith(self._chunk_prefix_lower):
                         ft._.set(self.extension_name, True)
                         continue
+                if b in preceding_scopes and preceding_scopes[b][0] < ft.start:
+                    if scope is not None and scope > 0:
+                        _span_group = self._get_span_groups_right(doc, ft, preceding_scopes[b][1])
+                        if not _span_group.has_overlap:
+                            continue
+                    ft._.set(self.extension_name, True)
+                    continue
+                if b in following_scopes and following_scopes[b][0] > ft.end:
+                    if scope is not None and scope > 0:
+                        _span_group = self._get_span_groups_left(doc, ft, following_scopes[b][1])
+                        if not _span_group.has_overlap:
+                            continue
+                    ft._.set(self.extension_name, True)
+                    continue
         return doc
 
+    @staticmethod
+    def _trigger_scopes(triggers, boundaries, boundary_starts, position, extreme):
+        """
+        Assigns the triggers (in match order) to the boundaries their start falls into (one bisect each).
+
+        Returns
+        -------
+        scopes: dict
+            boundary index -> (extreme 'position' of its triggers, its longest trigger - the first one on ties)
+        """
+        scopes = dict()
+        for trigger in triggers:
+            b = bisect_right(boundary_starts, trigger[1]) - 1
+            if b < 0 or trigger[1] >= boundaries[b][1]:
+                continue
+            if b not in scopes:
+                scopes[b] = (position(trigger), trigger)
+                continue
+            _position, _longest = scopes[b]
+            scopes[b] = (extreme(_position, position(trigger)),
+                         trigger if trigger[2] - trigger[1] > _longest[2] - _longest[1] else _longest)
+        return scopes
+
+    @staticmethod
+    def _doc_features(doc, feature):
+        # rule based noun chunks are stored as span group, since 'noun_chunks' needs a dependency parse
+        if feature == "noun_chunks" and feature in doc.spans:
+            return doc.spans[feature]
+        return getattr(doc, feature)
+
     def _get_span_groups_right(self, doc, feature, negation_span, is_root=False, prev_root=None):
         # if scope is set, checks whether the dependents of the negation ('_rights') are within scope
         #  and only negates the ones that are
@@ -349,3 +454,19 @@ class Negex:
 
     def __call__(self, doc):
         return self.negex(doc)
+
+    def pipe(self, stream, batch_size=128):
+        """
+        Negates the entities of interest of a stream of docs (as spaCy's 'Language.pipe' calls it); the docs are
+        processed one by one, since the matcher works per doc anyway
+
+        Parameters
+        ----------
+        stream: iterable
+            spaCy Doc objects
+        batch_size: int
+            not used; part of the signature 'Language.pipe' expects
+
+        """
+        for doc in stream:
+            yield self.negex(doc)
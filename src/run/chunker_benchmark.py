@@ -0,0 +1,63 @@
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import spacy
+
+sys.path.insert(0, "../../src")
+import data_functions
+
+logging.basicConfig()
+logging.root.setLevel(logging.WARNING)
+
+
+def chunk_keys(
+        processing: data_functions.DataProcessingFactory.DataProcessing
+) -> set:
+    _features = processing.chunk_features
+    _spans = np.asarray(_features.strings, dtype=object)[_features.span]
+    return set(zip(_features.doc_index.tolist(), _features.char_offset.tolist(), _spans.tolist()))
+
+
+def run_chunker(
+        model: str,
+        base_data: Path,
+        chunker: str,
+        subset: int = None
+):
+    _start = time.perf_counter()
+    _processing = data_functions.DataProcessingFactory.create(
+        pipeline=spacy.load(model),
+        base_data=base_data,
+        save_to_file=False,
+        subset=subset,
+        chunker=chunker
+    )
+    _time = time.perf_counter() - _start
+    _docs_n = len(_processing.document_indexes["doc_index"])
+    print(f"{chunker:>6}: {_docs_n} docs in {_time:.1f}s ({_docs_n / _time:.1f} docs/s), "
+          f"{len(_processing.chunk_features.doc_index)} chunks, {len(_processing.data_chunk_sets)} phrases")
+    return _processing
+
+
+if __name__ == "__main__":
+    # python chunker_benchmark.py MODEL DATA_DIR [SUBSET]
+    _model, _data = sys.argv[1], Path(sys.argv[2])
+    _subset = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    _parser = run_chunker(_model, _data, "parser", _subset)
+    _rule = run_chunker(_model, _data, "rule", _subset)
+
+    _parser_keys, _rule_keys = chunk_keys(_parser), chunk_keys(_rule)
+    _overlap = len(_parser_keys & _rule_keys)
+    _precision = _overlap / max(len(_rule_keys), 1)
+    _recall = _overlap / max(len(_parser_keys), 1)
+    _f1 = 2 * _precision * _recall / max(_precision + _recall, np.finfo(float).eps)
+    print(f"chunk spans (rule vs. parser): precision {_precision:.3f}, recall {_recall:.3f}, f1 {_f1:.3f}")
+
+    _parser_phrases = set(_parser.data_chunk_sets.texts)
+    _rule_phrases = set(_rule.data_chunk_sets.texts)
+    print(f"phrase overlap (jaccard): "
+          f"{len(_parser_phrases & _rule_phrases) / max(len(_parser_phrases | _rule_phrases), 1):.3f}")
@@ -0,0 +1,93 @@
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+import spacy
+
+sys.path.insert(0, "../../")
+sys.path.insert(0, "../../src")
+import data_functions
+
+logging.basicConfig()
+logging.root.setLevel(logging.WARNING)
+
+TERMSET_FILE = Path(__file__).parent.parent.parent / "conf" / "negex_files" / "negex_trigger_german_biotxtm_2016.txt"
+FILLER = ["Fieber", "Husten", "Thoraxschmerz", "Patient", "Befund", "Aufnahme", "Verlauf", "Therapie", "."]
+
+
+def synthetic_docs(
+        nlp: spacy.Language,
+        triggers: list,
+        n_docs: int,
+        n_triggers: int
+) -> list:
+    # lines with 'n_triggers' termset phrases between filler nouns, each noun being a (rule based) noun chunk
+    _random = random.Random(n_triggers)
+    _docs = []
+    for _ in range(n_docs):
+        _words = []
+        for _trigger in _random.choices(triggers, k=n_triggers):
+            _words.extend([_random.choice(FILLER), _trigger, _random.choice(FILLER)])
+        _doc = nlp(" ".join(_words), disable=["negex"])
+        _doc.spans[data_functions.NOUN_CHUNK_SPAN_KEY] = [_doc[t.i:t.i + 1] for t in _doc if t.text in FILLER[:-1]]
+        _docs.append(_doc)
+    return _docs
+
+
+def time_negex(
+        negex,
+        docs: list,
+        use_pipe: bool = False
+) -> float:
+    _start = time.perf_counter()
+    if use_pipe:
+        for _ in negex.pipe(docs):
+            pass
+    else:
+        for _doc in docs:
+            negex(_doc)
+    return time.perf_counter() - _start
+
+
+if __name__ == "__main__":
+    # python negex_benchmark.py [MODEL DATA_DIR [SUBSET]]
+    _nlp = spacy.blank("de")
+    _nlp.add_pipe("sentencizer")
+    _negex_config = data_functions.validate_negspacy_config(
+        type("Config", (), {"neg_termset_file": str(TERMSET_FILE), "language": "de"}))
+    # (the first time is only slower if the termset wasn't compiled with this tokenizer before, see negspacy.negation)
+    for _attempt in ["first", "again", "new pipeline"]:
+        if _attempt == "new pipeline":
+            _nlp.remove_pipe("negex")
+            _nlp = spacy.blank("de")
+            _nlp.add_pipe("sentencizer")
+        _start = time.perf_counter()
+        _negex = _nlp.add_pipe("negex", config=_negex_config)
+        print(f"adding negex ({_attempt}): {(time.perf_counter() - _start) * 1000:.1f} ms")
+        if _attempt == "first":
+            _nlp.remove_pipe("negex")
+    _triggers = [r.split("\t\t")[0] for r in TERMSET_FILE.read_text().splitlines()]
+
+    print(f"termset: {TERMSET_FILE.name} ({len(_triggers)} phrases)")
+    for _n_triggers in [0, 1, 4, 16, 64]:
+        _docs = synthetic_docs(_nlp, _triggers, 500, _n_triggers)
+        _matches = sum(len(_negex.matcher(d)) for d in _docs) / len(_docs)
+        _time = time_negex(_negex, _docs)
+        _pipe_time = time_negex(_negex, _docs, use_pipe=True)
+        print(f"{_n_triggers:>3} triggers/line ({_matches:.1f} matches): {len(_docs) / _time:.0f} lines/s, "
+              f"{_time / len(_docs) * 1e6:.0f} us/line ('pipe': {len(_docs) / _pipe_time:.0f} lines/s)")
+
+    if len(sys.argv) > 2:
+        # real lines: parsed once without negex, then only the component is timed
+        _model, _data = spacy.load(sys.argv[1]), Path(sys.argv[2])
+        _subset = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        _model_negex = _model.add_pipe("negex", last=True, config=data_functions.validate_negspacy_config(
+            type("Config", (), {"neg_termset_file": str(TERMSET_FILE), "language": "de",
+                                "feat_of_interest": "nc"})))
+        _lines = [l for f in sorted(_data.glob("*.txt"))[:_subset] for l in f.read_text().splitlines() if l.strip()]
+        _docs = list(_model.pipe(_lines, disable=["negex"]))
+        _time = time_negex(_model_negex, _docs)
+        _negated = sum(s._.negex for d in _docs for s in d.noun_chunks)
+        print(f"{len(_docs)} lines of '{_data}': {len(_docs) / _time:.0f} lines/s, {_negated} negated noun chunks")
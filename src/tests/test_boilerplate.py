@@ -0,0 +1,56 @@
+from unittest import TestCase
+
+from data_functions import DataProcessingFactory
+from src.tests.toy_pipeline import toy_pipeline
+
+FINDINGS = ["The patient has acute chest pain.", "Severe fever and a cough.", "Heart failure with chest pain.",
+            "Mild cough.", "Aspirin for the fever."]
+
+
+class TestBoilerplate(TestCase):
+
+    def setUp(self) -> None:
+        # the letter head is in all 10 docs (with varying phone numbers), the ward line in 4 of them
+        self.entries = [{"name": f"doc_{i}",
+                         "content": "\n".join([f"Clinic Musterstadt, Tel. 0341/97-{i}{i}", FINDINGS[i % 5]] +
+                                              (["Ward 3, internal medicine."] if i % 3 == 0 else [])),
+                         "label": "a"} for i in range(10)]
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, save_to_file=False, prune_components=False)
+
+    def create(self, max_df):
+        return DataProcessingFactory.create(
+            pipeline=toy_pipeline(), base_data=self.entries, boilerplate_max_df=max_df, **self.kwargs)
+
+    @staticmethod
+    def segments(data_obj):
+        return {d.text for d in data_obj._docs}
+
+    def test_max_df(self):
+        _all = self.segments(self.create(None))
+        self.assertEqual(len(_all), 10 + 5 + 1)
+        _letter_heads = {s for s in _all if s.startswith("Clinic")}
+
+        # an int is a number of documents, a float a fraction of them; a segment needs to occur in more docs
+        for _max_df, _dropped in [(5, _letter_heads), (0.5, _letter_heads), (10, set()), (1.0, set()),
+                                  (3, _letter_heads | {"Ward 3, internal medicine."}),
+                                  (0.3, _letter_heads | {"Ward 3, internal medicine."})]:
+            _data_obj = self.create(_max_df)
+            self.assertEqual(self.segments(_data_obj), _all - _dropped, _max_df)
+            _statistics = _data_obj.boilerplate_statistics
+            self.assertEqual(_statistics["max_df"], _max_df)
+            self.assertEqual(_statistics["skipped_segments"], 10 * bool(_dropped) + 4 * (len(_dropped) > 10))
+            if _dropped:
+                # the letter heads with other phone numbers than the first one are near duplicates
+                self.assertEqual(_statistics["near_duplicates"], 9)
+                self.assertEqual(_statistics["most_frequent"][0],
+                                 {"text": "Clinic Musterstadt, Tel. 0341/97-00", "documents": 10})
+            self.assertEqual("clinic" in list(_data_obj.data_chunk_sets.texts), not _dropped, _max_df)
+
+    def test_append(self):
+        _data_obj = self.create(0.5)
+        DataProcessingFactory.append(
+            pipeline=toy_pipeline(), data_obj=_data_obj, save_to_file=False,
+            base_data=[{"name": "doc_10", "content": "Clinic Musterstadt, Tel. 0341/97-1010\nMild fever.",
+                        "label": "a"}])
+        self.assertEqual([d.text for d in _data_obj.get_document_by_name("doc_10")], ["Mild fever."])
+        self.assertEqual(_data_obj.boilerplate_statistics["skipped_segments"], 11)
@@ -0,0 +1,61 @@
+from unittest import TestCase
+
+from data_functions import DataProcessingFactory, canonical_key
+from src.tests.toy_pipeline import toy_pipeline
+
+
+class TestCanonicalize(TestCase):
+
+    def setUp(self) -> None:
+        # the first variant of 'covid-19 pneumonia' and of 'severe fever' isn't their most frequent one
+        self.entries = [
+            {"name": "doc_0", "content": "Chest pain.\nSevere fevers.\nCovid19 pneumonia.", "label": "a"},
+            {"name": "doc_1", "content": "Chest pains.\nHeart failure.", "label": "b"},
+            {"name": "doc_2", "content": "Chest Pain.\nHeart failures.\nCOVID-19 pneumonia.", "label": "a"},
+            {"name": "doc_3", "content": "Severe fever.\nSevere fever.\nchest pains.\nCovid-19 pneumonia.",
+             "label": "b"}]
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, save_to_file=False)
+
+    def create(self, canonicalize):
+        return DataProcessingFactory.create(pipeline=toy_pipeline(lemmatizer=True), base_data=self.entries,
+                                            canonicalize=canonicalize, **self.kwargs)
+
+    @staticmethod
+    def groups(data_obj):
+        return {d["text"]: (d["doc"], d["count"], v)
+                for d, v in zip(data_obj.data_chunk_sets, data_obj.phrase_variants)}
+
+    def test_canonical_key(self):
+        self.assertEqual(canonical_key("Covid-19  pneumonia"), canonical_key("covid19 pneumonia"))
+        self.assertNotEqual(canonical_key("Covid-19 pneumonia", case_sensitive=True),
+                            canonical_key("covid-19 pneumonia", case_sensitive=True))
+
+    def test_surface(self):
+        _data_obj = self.create("surface")
+        self.assertEqual(self.groups(_data_obj), {
+            "chest pain": ([0, 2], 2, ["chest pain"]),
+            "chest pains": ([1, 3], 2, ["chest pains"]),
+            "severe fever": ([3], 2, ["severe fever"]),
+            "severe fevers": ([0], 1, ["severe fevers"]),
+            "covid-19 pneumonia": ([0, 2, 3], 3, ["covid-19 pneumonia", "covid19 pneumonia"]),
+            "heart failure": ([1], 1, ["heart failure"]),
+            "heart failures": ([2], 1, ["heart failures"]),
+        })
+        self.assertIsNone(self.create(None).phrase_variants)
+
+        # appended variants join their group (which keeps its name)
+        DataProcessingFactory.append(
+            pipeline=toy_pipeline(lemmatizer=True), data_obj=_data_obj, save_to_file=False,
+            base_data=[{"name": "doc_4", "content": "covid19 pneumonia.\nCOVID19 pneumonia.", "label": "a"}])
+        _groups = self.groups(_data_obj)
+        self.assertEqual(len(_groups), 7)
+        self.assertEqual(_groups["covid-19 pneumonia"], ([0, 2, 3, 4], 5, ["covid19 pneumonia", "covid-19 pneumonia"]))
+
+    def test_lemma(self):
+        self.assertEqual(self.groups(self.create("lemma")), {
+            # on a tie, the variant that came first names the phrase
+            "chest pain": ([0, 1, 2, 3], 4, ["chest pain", "chest pains"]),
+            "severe fever": ([0, 3], 3, ["severe fever", "severe fevers"]),
+            "covid-19 pneumonia": ([0, 2, 3], 3, ["covid-19 pneumonia", "covid19 pneumonia"]),
+            "heart failure": ([1, 2], 2, ["heart failure", "heart failures"]),
+        })
@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+import numpy as np
+
+from chunk_functions import ChunkTable, ChunkFeatures
+
+
+class TestChunkTable(TestCase):
+
+    def setUp(self) -> None:
+        self.chunk_set_dicts = [
+            {"text": "heart failure", "doc": ["a", "c"], "count": 3},
+            {"text": "aspirin", "doc": ["b"], "count": 1},
+            {"text": "fever", "doc": [], "count": 0},
+            {"text": "chest pain", "doc": ["a", "b", "c"], "count": 4},
+        ]
+        self.table = ChunkTable.from_dicts(self.chunk_set_dicts)
+
+    def test_dict_view(self):
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual(self.table.to_dicts(), self.chunk_set_dicts)
+        self.assertEqual(self.table[np.int64(1)], self.chunk_set_dicts[1])
+        self.assertEqual(self.table[-1]["text"], "chest pain")
+
+    def test_columns(self):
+        np.testing.assert_array_equal(self.table.doc_counts, [2, 1, 0, 3])
+        np.testing.assert_array_equal(self.table.counts, [3, 1, 0, 4])
+        self.assertEqual(self.table.phrase_id("fever"), 2)
+        self.assertIsNone(self.table.phrase_id("cough"))
+
+    def test_take(self):
+        _sub = self.table.take([3, 0, 2])
+        self.assertEqual(_sub.to_dicts(), [self.chunk_set_dicts[i] for i in [3, 0, 2]])
+        self.assertEqual(len(self.table.take([])), 0)
+
+    def test_add(self):
+        _new_ids = self.table.add(
+            texts=["aspirin", "cough", "fever"], counts=[2, 1, 1], postings=[[0, 3], [3], [3]], doc_ids={3: "d"})
+        np.testing.assert_array_equal(_new_ids, [4])
+        self.assertEqual(self.table[1], {"text": "aspirin", "doc": ["a", "b", "d"], "count": 3})
+        self.assertEqual(self.table[2], {"text": "fever", "doc": ["d"], "count": 1})
+        self.assertEqual(self.table[4], {"text": "cough", "doc": ["d"], "count": 1})
+        self.assertEqual(self.table[0], self.chunk_set_dicts[0])
+
+
+class TestChunkFeatures(TestCase):
+
+    def setUp(self) -> None:
+        self.features = ChunkFeatures()
+        # "Chest Pain", "no phrase", "acute Heart failures", "chest pain"
+        self.features.extend(
+            doc_index=[0, 0, 1, 1], negated=[False, False, True, False], head=[1, -1, 2, 1], lengths=[2, 0, 3, 2],
+            text=["Chest", "Pain", "acute", "Heart", "failures", "chest", "pain"],
+            lemma=["chest", "pain", "acute", "heart", "failure", "chest", "pain"],
+            pos=["NOUN", "NOUN", "ADJ", "NOUN", "NOUN", "NOUN", "NOUN"]
+        )
+
+    def test_phrases(self):
+        _phrases, _inverse = self.features.phrases()
+        self.assertEqual(_phrases, ["chest pain", "acute heart failures"])
+        np.testing.assert_array_equal(_inverse, [0, -1, 1, 0])
+        self.assertEqual(self.features.phrases(case_sensitive=True)[0],
+                         ["Chest Pain", "acute Heart failures", "chest pain"])
+
+    def test_variants(self):
+        self.assertEqual(self.features.phrases(use_lemma=True, prepend_head=True)[0],
+                         ["pain chest", "failure acute heart"])
+        self.assertEqual(self.features.phrases(head_only=True)[0], ["pain", "failures"])
+        _phrases, _inverse = self.features.phrases(chunks=[2, 3])
+        self.assertEqual(_phrases, ["acute heart failures", "chest pain"])
+        np.testing.assert_array_equal(_inverse, [0, 1])
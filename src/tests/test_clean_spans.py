@@ -0,0 +1,61 @@
+import random
+from unittest import TestCase
+
+import spacy
+from spacy.tokens import Doc
+
+from data_functions import clean_span, clean_spans
+
+WORDS = [("The", "the", "DET"), ("acute", "acute", "ADJ"), ("chest", "chest", "NOUN"), ("pain", "pain", "NOUN"),
+         ("-", "-", "PUNCT"), ("and", "and", "CCONJ"), ("3", "3", "NUM"), ("three", "three", "NUM"),
+         ("\n", "\n", "SPACE"), ("  ", "  ", "SPACE"), ("his", "his", "PRON"), ("Pain", "pain", "NOUN"),
+         ("heart", "heart", "NOUN"), ("attack", "attack", "NOUN"), (",", ",", "PUNCT"), ("x\t", "x\t", "X"),
+         ("of", "of", "ADP"), ("pain ", "pain", "NOUN"), ("e.g.", "e.g.", "ADV")]
+
+
+class TestCleanSpans(TestCase):
+
+    def setUp(self) -> None:
+        self.nlp = spacy.blank("en")
+        self.random = random.Random(42)
+
+    def make_doc(self, n_tokens):
+        _words = [self.random.choice(WORDS) for _ in range(n_tokens)]
+        return Doc(self.nlp.vocab, words=[w for w, _, _ in _words], lemmas=[l for _, l, _ in _words],
+                   pos=[p for _, _, p in _words])
+
+    def assert_matches_clean_span(self, doc, spans, roots=None):
+        _batch = clean_spans(doc, spans, roots)
+        _offset = 0
+        for _i, _span in enumerate(spans):
+            _expected = clean_span(_span, None if roots is None else roots[_i])
+            _length = int(_batch["lengths"][_i])
+            if _expected is None:
+                self.assertEqual((int(_batch["head"][_i]), _length), (-1, 0), _span.text)
+                continue
+            self.assertEqual(int(_batch["head"][_i]), _expected["head_idx"], _span.text)
+            for _field in ["text", "lemma", "pos"]:
+                self.assertEqual(_batch[_field][_offset:_offset + _length].tolist(), _expected[_field], _span.text)
+            _offset += _length
+        self.assertEqual(_offset, len(_batch["text"]))
+
+    def test_edge_cases(self):
+        _doc = Doc(self.nlp.vocab, words=["The", "acute", "pain", ",", "and", "3", "his", "\n", "pain", "Pain"],
+                   lemmas=["the", "acute", "pain", ",", "and", "3", "his", "\n", "pain", "pain"],
+                   pos=["DET", "ADJ", "NOUN", "PUNCT", "CCONJ", "NUM", "PRON", "SPACE", "NOUN", "NOUN"])
+        _spans = [_doc[0:3], _doc[0:1], _doc[3:8], _doc[6:10], _doc[2:9], _doc[9:10]]
+        # roots: a kept token, a stop word, punctuation, a repeated text (the first occurrence is the head) & none
+        self.assert_matches_clean_span(_doc, _spans, [2, 0, 3, 8, 8, None])
+        self.assert_matches_clean_span(_doc, [])
+
+    def test_random_spans(self):
+        for _ in range(50):
+            _doc = self.make_doc(self.random.randint(1, 30))
+            _spans, _roots = [], []
+            for _ in range(self.random.randint(1, 10)):
+                _start = self.random.randrange(len(_doc))
+                _end = self.random.randint(_start + 1, len(_doc))
+                _spans.append(_doc[_start:_end])
+                _roots.append(self.random.choice([None, self.random.randrange(_start, _end)]))
+            self.assert_matches_clean_span(_doc, _spans, _roots)
+            self.assert_matches_clean_span(_doc, _spans)
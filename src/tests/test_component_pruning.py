@@ -0,0 +1,77 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import spacy
+from spacy import Language
+
+import data_functions
+from data_functions import DataProcessingFactory, plan_components
+from src.tests.toy_pipeline import toy_pipeline
+
+# a tagger that gets its token vectors from the 'tok2vec' component
+LISTENING_TAGGER = {"model": {"@architectures": "spacy.Tagger.v2", "tok2vec": {
+    "@architectures": "spacy.Tok2VecListener.v1", "width": 96, "upstream": "*"}}}
+
+
+@Language.component("pruning_test_entity_reader", requires=["doc.ents"])
+def pruning_test_entity_reader(doc):
+    return doc
+
+
+class TestComponentPruning(TestCase):
+
+    def setUp(self) -> None:
+        self.entries = [{"name": "doc_0", "content": "The patient has acute pains.\nSevere fevers.", "label": None},
+                        {"name": "doc_1", "content": "Acute coughs and severe pains.", "label": None}]
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, save_to_file=False, parse_cache=False)
+
+    @staticmethod
+    def pipeline():
+        return toy_pipeline(lemmatizer=True, ner=True)
+
+    def test_plan_keeps_lemmatizer(self):
+        self.assertEqual(plan_components(self.pipeline()), ["ner"])
+        self.assertEqual(plan_components(self.pipeline(), ["ents"]), [])
+
+    def test_plan_from_annotations(self):
+        _nlp = spacy.blank("en")
+        for _name, _config in [("tok2vec", {}), ("tagger", LISTENING_TAGGER), ("attribute_ruler", {}),
+                               ("parser", {}), ("ner", {}), ("entity_linker", {}), ("textcat", {})]:
+            _nlp.add_pipe(_name, config=_config)
+        # the tok2vec is kept for the tagger; the attribute ruler doesn't declare what it assigns
+        self.assertEqual(plan_components(_nlp), ["ner", "entity_linker", "textcat"])
+        self.assertEqual(plan_components(_nlp, ["ents"]), ["entity_linker", "textcat"])
+        # a component that is kept keeps the ones whose annotations it requires
+        _nlp.add_pipe("pruning_test_entity_reader")
+        self.assertEqual(plan_components(_nlp), ["entity_linker", "textcat"])
+
+        _nlp = toy_pipeline(token_vectors=True)
+        self.assertEqual(plan_components(_nlp), ["tok2vec"])
+        self.assertEqual(plan_components(_nlp, pool_embeddings=True), [])
+
+    def test_timings_only_for_debugging(self):
+        with patch.object(data_functions, "component_timings", wraps=data_functions.component_timings) as _timings:
+            DataProcessingFactory.create(pipeline=self.pipeline(), base_data=self.entries, **self.kwargs)
+            _timings.assert_not_called()
+            with self.assertLogs(level="DEBUG") as _logs:
+                DataProcessingFactory.create(pipeline=self.pipeline(), base_data=self.entries, **self.kwargs)
+            _timings.assert_called_once()
+            self.assertTrue(any("Expected speedup" in _line for _line in _logs.output))
+
+    def test_lemmas_after_pruned_parse(self):
+        _data_obj = DataProcessingFactory.create(
+            pipeline=self.pipeline(), base_data=self.entries, prune_components=True, **self.kwargs)
+        self.assertEqual(_data_obj._disabled_components, ["ner"])
+        _phrases, _ = _data_obj.noun_chunk_phrases(use_lemma=True)
+        self.assertIn("acute pain", _phrases.tolist())
+        _data_obj.rebuild_chunk_set_dict(use_lemma=True, omit_negated_chunks=False)
+        self.assertIn("severe fever", list(_data_obj.data_chunk_sets.texts))
+
+    def test_lemmas_of_disabled_lemmatizer(self):
+        _data_obj = DataProcessingFactory.create(
+            pipeline=self.pipeline(), base_data=self.entries, disable=["lemmatizer"], **self.kwargs)
+        with self.assertRaises(ValueError):
+            _data_obj.noun_chunk_phrases(use_lemma=True)
+        with self.assertRaises(ValueError):
+            _data_obj.rebuild_chunk_set_dict(use_lemma=True, omit_negated_chunks=False)
+        self.assertIn("acute pains", _data_obj.noun_chunk_phrases()[0].tolist())
@@ -0,0 +1,43 @@
+import tempfile
+import pathlib
+from unittest import TestCase
+
+import numpy as np
+
+from data_functions import DataProcessingFactory, shard_data
+from src.tests.toy_pipeline import toy_pipeline
+
+
+class TestShardedProcessing(TestCase):
+
+    def setUp(self) -> None:
+        _lines = ["The patient has acute chest pain.", "Severe fever and a cough.", "Heart failure with chest pain.",
+                  "Mild cough.", "Aspirin for the fever."]
+        self.entries = [{"name": f"doc_{i}", "content": "\n".join(_lines[i % 5:i % 5 + 2]),
+                         "label": ["a", "b", "c"][i % 3]} for i in range(10)]
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, canonicalize="surface")
+
+    def test_shard_data(self):
+        _shards = shard_data(self.entries, 3)
+        self.assertEqual([len(s) for s in _shards], [3, 3, 4])
+        self.assertEqual([d["id"] for s in _shards for d in s], list(range(10)))
+
+    def test_merge_equals_single_run(self):
+        with tempfile.TemporaryDirectory() as _tmp:
+            _single = DataProcessingFactory.create(
+                pipeline=toy_pipeline(), base_data=self.entries, save_to_file=False, **self.kwargs)
+            _merged = DataProcessingFactory.create_sharded(
+                pipeline=toy_pipeline, base_data=self.entries, n_shards=3, n_workers=2,
+                cache_path=pathlib.Path(_tmp), cache_name="sharded", **self.kwargs)
+            _loaded = DataProcessingFactory.load(pathlib.Path(_tmp) / "sharded.pickle")
+
+            for _data_obj in [_merged, _loaded]:
+                self.assertEqual(list(_data_obj.data_chunk_sets), list(_single.data_chunk_sets))
+                self.assertEqual(_data_obj.phrase_variants, _single.phrase_variants)
+                self.assertEqual(_data_obj.document_list, _single.document_list)
+                self.assertEqual(_data_obj.true_labels_vec, _single.true_labels_vec)
+                self.assertEqual(_data_obj.document_indexes, _single.document_indexes)
+                self.assertEqual((_data_obj.document_phrase_matrix != _single.document_phrase_matrix).nnz, 0)
+                self.assertEqual([d._.doc_index for d in _data_obj.get_document_by_name("doc_7")], [7, 7])
+                np.testing.assert_array_equal(_data_obj.chunk_features.doc_index,
+                                              _single.chunk_features.doc_index)
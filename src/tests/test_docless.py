@@ -0,0 +1,85 @@
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from data_functions import DataProcessingFactory
+from src.tests.toy_pipeline import toy_pipeline
+
+
+class TestDocless(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = pathlib.Path(self.tmp.name)
+        self.entries = [{"name": "doc_0", "id": 10, "content": "Acute chest pain.\nFever.", "label": "Cardio"},
+                        {"name": "doc_1", "id": 11, "content": "Severe coughs and chest pains.", "label": "cardio"},
+                        {"name": "doc_2", "id": 12, "content": "Heart failure.\nMild fever.", "label": None},
+                        {"name": "doc_3", "id": 13, "content": "Aspirin.\nCough.", "label": "Pulmo"}]
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, parse_cache=False, cache_path=self.cache_path,
+                           save_to_file=False)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def create(self, keep_docs, **kwargs):
+        return DataProcessingFactory.create(pipeline=toy_pipeline(lemmatizer=True), base_data=self.entries,
+                                            keep_docs=keep_docs, **dict(self.kwargs, **kwargs))
+
+    def assert_same_result(self, data_obj, expected):
+        self.assertEqual(list(data_obj.data_chunk_sets), list(expected.data_chunk_sets))
+        self.assertEqual(data_obj.document_list, expected.document_list)
+        # without docs, there are no positions of the docs to index
+        self.assertEqual({k: v for k, v in data_obj.document_indexes.items() if k.startswith("topic")},
+                         {k: v for k, v in expected.document_indexes.items() if k.startswith("topic")})
+        self.assertEqual(data_obj.true_labels, expected.true_labels)
+        self.assertEqual(self.chunks(data_obj), self.chunks(expected))
+
+    @staticmethod
+    def chunks(data_obj):
+        # without docs, the chunks come without their spaCy span
+        return [(ch["text"] if ch["spacy_chunk"] is None else ch["spacy_chunk"].text, ch["doc_index"],
+                 ch["char_offset"]) for ch in data_obj.noun_chunks_corpus]
+
+    def test_chunk_sets(self):
+        for _options in [dict(), dict(use_lemma=True), dict(prepend_head=True), dict(head_only=True)]:
+            with self.subTest(**_options):
+                _docless = self.create(keep_docs=False, **_options)
+                self.assertEqual(_docless._processed_docs, [])
+                self.assert_same_result(_docless, self.create(keep_docs=True, **_options))
+
+    def test_views(self):
+        _docless, _full = self.create(keep_docs=False), self.create(keep_docs=True)
+        for _labels in [["Cardio"], ["pulmo"], ["cardio", "pulmo"]]:
+            with self.subTest(labels=_labels):
+                _docless.set_view_by_labels(_labels)
+                _full.set_view_by_labels(_labels)
+                self.assert_same_result(_docless, _full)
+                self.assertEqual(_docless.get_document_names_by_topic(_labels[0]),
+                                 _full.get_document_names_by_topic(_labels[0]))
+        _docless.set_view_by_labels(None)
+        self.assertEqual(_docless.get_document_ids_by_topic("cardio"), [10, 11])
+        self.assertEqual(_docless.doc_id_from_name("doc_3"), 3)
+
+    def test_document_lookups(self):
+        _docless = self.create(keep_docs=False)
+        # the names & ids are known, the docs aren't there anymore
+        self.assertEqual(_docless.doc_name_from_id(2), "doc_2")
+        self.assertEqual(_docless.get_document_ids_by_topic("pulmo"), [13])
+        with self.assertRaises(ValueError):
+            _docless.get_document_by_id(12)
+        with self.assertRaises(ValueError):
+            _docless.get_document_by_name("doc_2")
+
+    def test_load(self):
+        _kwargs = dict(save_to_file=True, doc_bin=True)
+        _docless = self.create(keep_docs=False, cache_name="docless", **_kwargs)
+        self.create(keep_docs=True, cache_name="full", **_kwargs)
+        self.assertFalse((self.cache_path / "docless_docs.spacy").exists())
+        self.assertTrue((self.cache_path / "full_docs.spacy").exists())
+
+        _loaded = DataProcessingFactory.load(self.cache_path / "docless.pickle")
+        self.assertFalse(_loaded._keep_docs)
+        self.assert_same_result(_loaded, DataProcessingFactory.load(self.cache_path / "full.pickle"))
+        self.assert_same_result(_loaded, _docless)
+        with self.assertRaises(ValueError):
+            _loaded.get_document_by_id(10)
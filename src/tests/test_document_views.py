@@ -0,0 +1,128 @@
+from itertools import combinations
+from unittest import TestCase
+
+import numpy as np
+
+from data_functions import DataProcessingFactory
+from src.tests.toy_pipeline import toy_pipeline
+
+
+class TestDocumentViews(TestCase):
+
+    def setUp(self) -> None:
+        # labels in mixed case, a document without label and two documents of the same name
+        self.entries = [{"name": "doc_0", "content": "Chest pain.\nFever.", "label": "Cardio"},
+                        {"name": "doc_1", "content": "Cough.", "label": "cardio"},
+                        {"name": "doc_2", "content": "Heart failure.\nFever.", "label": None},
+                        {"name": "doc_3", "content": "Aspirin.", "label": "Pulmo"},
+                        {"name": "doc_3", "content": "Cough.\nChest pain.", "label": "pulmo"}]
+        self.data_obj = DataProcessingFactory.create(
+            pipeline=toy_pipeline(), base_data=self.entries, chunker="rule", omit_negated_chunks=False,
+            save_to_file=False)
+
+    def test_document_indexes(self):
+        _indexes = self.data_obj.document_indexes
+        self.assertEqual(_indexes["doc_index"], [0, 0, 1, 2, 2, 3, 4, 4])
+        self.assertEqual(_indexes["id"], {0: [0, 1], 1: [2], 2: [3, 4], 3: [5], 4: [6, 7]})
+        self.assertEqual(_indexes["name"], {"doc_0": [0, 1], "doc_1": [2], "doc_2": [3, 4], "doc_3": [5, 6, 7]})
+        # topics are lowercased; documents without label have no topic
+        self.assertEqual(_indexes["topic_ids"], {"cardio": [0, 1], "pulmo": [3, 4]})
+        self.assertEqual(_indexes["topic_names"], {"cardio": ["doc_0", "doc_1"], "pulmo": ["doc_3"]})
+
+    def test_lookups(self):
+        self.assertEqual([d.text for d in self.data_obj.get_document_by_id(2)], ["Heart failure.", "Fever."])
+        self.assertEqual([d.text for d in self.data_obj.get_document_by_name("doc_3")],
+                         ["Aspirin.", "Cough.", "Chest pain."])
+        self.assertEqual(self.data_obj.get_document_by_id(5), [])
+        self.assertEqual(self.data_obj.get_document_ids_by_topic("CARDIO"), [0, 1])
+        self.assertEqual(self.data_obj.get_document_names_by_topic("Pulmo"), ["doc_3"])
+        with self.assertRaises(KeyError):
+            self.data_obj.get_document_ids_by_topic("neuro")
+        # the first document of a name
+        self.assertEqual(self.data_obj.doc_id_from_name("doc_3"), 3)
+        self.assertEqual(self.data_obj.doc_name_from_id(2), "doc_2")
+        with self.assertRaises(ValueError):
+            self.data_obj.doc_id_from_name("doc_5")
+
+        # a lookup returns a copy of the index
+        self.data_obj.get_document_ids_by_topic("cardio").append(2)
+        self.assertEqual(self.data_obj.get_document_ids_by_topic("cardio"), [0, 1])
+
+    def test_lookups_in_view(self):
+        self.data_obj.set_view_by_labels(["Cardio"])
+        self.assertEqual([d.text for d in self.data_obj.get_document_by_name("doc_0")], ["Chest pain.", "Fever."])
+        self.assertEqual(self.data_obj.get_document_by_name("doc_2"), [])
+        self.assertEqual(self.data_obj.get_document_ids_by_topic("cardio"), [0, 1])
+        self.assertIsNone(self.data_obj.doc_id_from_name("doc_3"))
+        with self.assertRaises(KeyError):
+            self.data_obj.get_document_names_by_topic("pulmo")
+
+        # the indexes stay valid when the view changes
+        self.data_obj.set_view_by_labels(None)
+        self.assertEqual(len(self.data_obj.get_document_by_name("doc_3")), 3)
+        self.assertEqual(self.data_obj.doc_id_from_name("doc_3"), 3)
+
+    def test_label_bitmaps(self):
+        _bitmaps = self.data_obj.label_bitmaps
+        self.assertEqual(_bitmaps["labels"], {"cardio": 0, None: 1, "pulmo": 2})
+        np.testing.assert_array_equal(_bitmaps["docs"], [[1, 1, 0, 0, 0], [0, 0, 1, 0, 0], [0, 0, 0, 1, 1]])
+        self.assertEqual(list(self.data_obj.data_chunk_sets.texts),
+                         ["chest pain", "fever", "cough", "heart failure", "aspirin"])
+        np.testing.assert_array_equal(_bitmaps["phrases"], [[1, 1, 1, 0, 0], [0, 1, 0, 1, 0], [1, 0, 1, 0, 1]])
+
+    def test_views(self):
+        _chunk_sets = list(self.data_obj.data_chunk_sets)
+        _labels = [e["label"] for e in self.entries]
+        _keys = [None if l is None else l.lower() for l in _labels]
+        # every combination of labels (in any case, with unknown ones) against a view that is filtered by hand
+        for _n in range(1, 4):
+            for _view_labels in combinations(["CARDIO", None, "Pulmo", "neuro"], _n):
+                self.data_obj.set_view_by_labels(_view_labels)
+                _view_keys = [None if l is None else l.lower() for l in _view_labels]
+                _docs = [i for i, k in enumerate(_keys) if k in _view_keys]
+                _ids = [i for i, c in enumerate(_chunk_sets) if set(c["doc"]).intersection(_docs)]
+                self.assertEqual(self.data_obj._view["labels"], _view_keys)
+                np.testing.assert_array_equal(self.data_obj.phrase_ids, _ids)
+                self.assertEqual(list(self.data_obj.data_chunk_sets), [_chunk_sets[i] for i in _ids])
+                self.assertEqual(self.data_obj.true_labels, [_labels[i] for i in _docs])
+                self.assertEqual(self.data_obj.documents_n, len(_docs))
+                self.assertEqual(self.data_obj.document_list, [self.entries[i]["name"] for i in _docs])
+                self.assertEqual([d._.doc_index for d in self.data_obj.processed_docs],
+                                 [i for i in self.data_obj.document_indexes["doc_index"] if i in _docs])
+                self.assertEqual(self.data_obj.topics, set(_view_keys).intersection(["cardio", None, "pulmo"]))
+
+        self.data_obj.set_view_by_labels(None)
+        self.assertEqual(list(self.data_obj.data_chunk_sets), _chunk_sets)
+        self.assertEqual(self.data_obj.true_labels, _labels)
+        self.assertEqual(len(self.data_obj.processed_docs), 8)
+
+    def test_append(self):
+        DataProcessingFactory.append(
+            pipeline=toy_pipeline(), data_obj=self.data_obj, save_to_file=False,
+            base_data=[{"name": "doc_5", "content": "Fever.", "label": "CARDIO"},
+                       {"name": "doc_6", "content": "Aspirin.", "label": None}])
+        self.assertEqual(self.data_obj.document_indexes["doc_index"], [0, 0, 1, 2, 2, 3, 4, 4, 5, 6])
+        self.assertEqual(self.data_obj.get_document_ids_by_topic("cardio"), [0, 1, 5])
+        self.assertEqual([d.text for d in self.data_obj.get_document_by_name("doc_6")], ["Aspirin."])
+        self.assertEqual(self.data_obj.doc_id_from_name("doc_6"), 6)
+        # the bitmaps cover the appended documents
+        self.data_obj.set_view_by_labels(["cardio"])
+        self.assertEqual(self.data_obj.document_list, ["doc_0", "doc_1", "doc_5"])
+        self.assertEqual(list(self.data_obj.data_chunk_sets.texts), ["chest pain", "fever", "cough"])
+
+    def test_append_known_documents(self):
+        _entries = [dict(e, id=f"id_{i}") for i, e in enumerate(self.entries)]
+        _data_obj = DataProcessingFactory.create(
+            pipeline=toy_pipeline(), base_data=_entries, chunker="rule", omit_negated_chunks=False, save_to_file=False)
+        _chunk_sets = list(_data_obj.data_chunk_sets)
+        # a re-upload of known documents, a known document under another name and a new one
+        DataProcessingFactory.append(
+            pipeline=toy_pipeline(), data_obj=_data_obj, save_to_file=False,
+            base_data=_entries[:2] + [dict(_entries[3], name="doc_3_renamed"),
+                                      {"name": "doc_5", "id": "id_5", "content": "Fever.\nRash.", "label": "cardio"}])
+        self.assertEqual(_data_obj.documents_n, 6)
+        self.assertEqual(_data_obj.document_list, [e["name"] for e in self.entries] + ["doc_5"])
+        self.assertEqual(_data_obj.document_indexes["doc_index"], [0, 0, 1, 2, 2, 3, 4, 4, 5, 5])
+        self.assertEqual({d["text"]: (d["doc"], d["count"]) for d in _data_obj.data_chunk_sets},
+                         dict({d["text"]: (d["doc"], d["count"]) for d in _chunk_sets},
+                              fever=(["id_0", "id_2", "id_5"], 3), rash=(["id_5"], 1)))
@@ -0,0 +1,301 @@
+import hashlib
+import pathlib
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+from data_functions import DataProcessingFactory
+import embedding_functions
+from embedding_functions import EmbeddingStore, SentenceEmbeddingsFactory, get_sentence_transformer
+from src.tests.toy_pipeline import toy_pipeline, toy_vector
+
+
+def fake_encode(self, sentences, *args, **kwargs):
+    # a vector that only depends on the phrase, so that every row can be checked against its phrase
+    return np.asarray([np.frombuffer(hashlib.sha1(s.encode("utf-8")).digest()[:8], dtype=np.uint8)
+                       for s in sentences], dtype=np.float32)
+
+
+class ToyModel:
+    # stands in for a SentenceTransformer; the embeddings come from 'fake_encode'
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def __reduce__(self):
+        raise TypeError("The model can't be pickled.")
+
+
+@patch("embedding_functions.get_sentence_transformer", lambda model_name: None)
+@patch.object(SentenceEmbeddingsFactory.SentenceEmbeddings, "_encode", fake_encode)
+class TestSentenceEmbeddings(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = pathlib.Path(self.tmp.name)
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, parse_cache=False, cache_path=self.cache_path,
+                           cache_name="toy_data", save_to_file=True)
+        _entries = [{"name": "doc_0", "content": "Acute chest pain.", "label": "a"},
+                    {"name": "doc_1", "content": "Severe fever.\nMild rash.", "label": "b"},
+                    {"name": "doc_2", "content": "Heart failure and a cough.", "label": "b"},
+                    {"name": "doc_3", "content": "Aspirin.", "label": "a"}]
+        DataProcessingFactory.create(pipeline=toy_pipeline(), base_data=_entries, **self.kwargs)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def assert_aligned(self, sent_emb):
+        _texts = list(sent_emb.data_processing_obj.data_chunk_sets.texts)
+        self.assertEqual(len(_texts), sent_emb.sentence_embeddings.shape[0])
+        np.testing.assert_array_equal(sent_emb.sentence_embeddings, fake_encode(None, _texts))
+
+    def test_append_to_view(self):
+        _data_obj = DataProcessingFactory.load(self.cache_path / "toy_data.pickle")
+        _sent_emb = SentenceEmbeddingsFactory.create(
+            data_obj=_data_obj, cache_path=self.cache_path, cache_name="toy_embedding", model_name="toy",
+            view_from_topics=["a"])
+        self.assert_aligned(_sent_emb)
+        self.assertNotIn("severe fever", list(_data_obj.data_chunk_sets.texts))
+
+        # 'severe fever' & 'heart failure' have lower ids than the new 'mild cough', but are new to the view of 'a'
+        DataProcessingFactory.append(
+            pipeline=toy_pipeline(), data_obj=self.cache_path / "toy_data.pickle",
+            base_data=[{"name": "doc_4", "content": "Severe fever, heart failure and a mild cough.", "label": "a"}],
+            **{k: v for k, v in self.kwargs.items() if k not in ["chunker", "omit_negated_chunks"]})
+        _appended = SentenceEmbeddingsFactory.append(
+            sent_emb=self.cache_path / "toy_embedding.pickle",
+            data_obj=DataProcessingFactory.load(self.cache_path / "toy_data.pickle"),
+            cache_path=self.cache_path, cache_name="toy_embedding")
+        self.assert_aligned(_appended)
+        self.assertEqual(_appended.sentence_embeddings.shape[0], _sent_emb.sentence_embeddings.shape[0] + 3)
+        self.assertTrue({"severe fever", "heart failure", "mild cough"}.issubset(
+            _appended.data_processing_obj.data_chunk_sets.texts))
+        self.assertNotIn("mild rash", list(_appended.data_processing_obj.data_chunk_sets.texts))
+
+        _loaded = SentenceEmbeddingsFactory.load(
+            self.cache_path / "toy_data.pickle", self.cache_path / "toy_embedding.pickle")
+        self.assert_aligned(_loaded)
+        np.testing.assert_array_equal(_loaded.phrase_ids, _appended.phrase_ids)
+
+    def test_append_filtered(self):
+        _entries = [{"name": "doc_0", "content": "Aspirin.\nMild cough.", "label": "a"},
+                    {"name": "doc_1", "content": "Aspirin.\nSevere fever.", "label": "b"},
+                    {"name": "doc_2", "content": "Mild cough.", "label": "a"}]
+        _kwargs = dict(self.kwargs, cache_name="filtered_data")
+        DataProcessingFactory.create(pipeline=toy_pipeline(), base_data=_entries, filter_min_df=2, **_kwargs)
+        _sent_emb = SentenceEmbeddingsFactory.create(
+            data_obj=DataProcessingFactory.load(self.cache_path / "filtered_data.pickle"), cache_path=self.cache_path,
+            cache_name="filtered_embedding", model_name="toy", filter_phrases=True)
+        self.assert_aligned(_sent_emb)
+        self.assertEqual(sorted(_sent_emb.data_processing_obj.data_chunk_sets.texts), ["aspirin", "mild cough"])
+
+        # 'severe fever' now passes the filter (but has a lower id than the new phrases), 'chest pain' doesn't
+        DataProcessingFactory.append(
+            pipeline=toy_pipeline(), data_obj=self.cache_path / "filtered_data.pickle",
+            base_data=[{"name": "doc_3", "content": "Chest pain.\nSevere fever.", "label": "b"}],
+            **{k: v for k, v in _kwargs.items() if k not in ["chunker", "omit_negated_chunks"]})
+        _data_obj = DataProcessingFactory.load(self.cache_path / "filtered_data.pickle")
+        _all_texts = list(_data_obj.data_chunk_sets.texts)
+        _appended = SentenceEmbeddingsFactory.append(
+            sent_emb=self.cache_path / "filtered_embedding.pickle", data_obj=_data_obj,
+            cache_path=self.cache_path, cache_name="filtered_embedding")
+        self.assert_aligned(_appended)
+        np.testing.assert_array_equal(_appended.phrase_ids[:2], _sent_emb.phrase_ids)
+        self.assertEqual([_all_texts[i] for i in _appended.phrase_ids],
+                         list(_appended.data_processing_obj.data_chunk_sets.texts))
+        self.assertEqual(list(_appended.data_processing_obj.data_chunk_sets.texts)[2:], ["severe fever"])
+        self.assertEqual(_appended.data_processing_obj.phrase_filter_mask.tolist(), [True] * 3)
+
+        _loaded = SentenceEmbeddingsFactory.load(
+            self.cache_path / "filtered_data.pickle", self.cache_path / "filtered_embedding.pickle")
+        self.assert_aligned(_loaded)
+        np.testing.assert_array_equal(_loaded.phrase_ids, _appended.phrase_ids)
+
+    def test_pooled(self):
+        _entries = [{"name": "doc_0", "content": "Acute chest pain.\nA cough.", "label": "a"},
+                    {"name": "doc_1", "content": "Severe fever.", "label": "b"}]
+        _kwargs = dict(self.kwargs, cache_name="pooled_data", pool_embeddings=True)
+        DataProcessingFactory.create(pipeline=toy_pipeline(token_vectors=True), base_data=_entries, **_kwargs)
+        _sent_emb = SentenceEmbeddingsFactory.create(
+            data_obj=DataProcessingFactory.load(self.cache_path / "pooled_data.pickle"), cache_path=self.cache_path,
+            cache_name="pooled_embedding", model_name="toy", pooled_embeddings=True)
+        # the model isn't needed for the pooled embeddings
+        self.assertIsNone(_sent_emb._model_name)
+        np.testing.assert_allclose(_sent_emb.sentence_embeddings, [
+            toy_vector("acute", "chest", "pain"), toy_vector("cough"), toy_vector("severe", "fever")], rtol=1e-6)
+
+        DataProcessingFactory.append(
+            pipeline=toy_pipeline(token_vectors=True), data_obj=self.cache_path / "pooled_data.pickle",
+            base_data=[{"name": "doc_2", "content": "Mild rash and a cough.", "label": "b"}],
+            **{k: v for k, v in _kwargs.items() if k not in ["chunker", "omit_negated_chunks", "pool_embeddings"]})
+        _appended = SentenceEmbeddingsFactory.append(
+            sent_emb=self.cache_path / "pooled_embedding.pickle",
+            data_obj=DataProcessingFactory.load(self.cache_path / "pooled_data.pickle"),
+            cache_path=self.cache_path, cache_name="pooled_embedding")
+        self.assertEqual(list(_appended.data_processing_obj.data_chunk_sets.texts)[3:], ["mild rash"])
+        np.testing.assert_allclose(_appended.sentence_embeddings, [
+            toy_vector("acute", "chest", "pain"), toy_vector("cough"), toy_vector("severe", "fever"),
+            toy_vector("mild", "rash")], rtol=1e-6)
+
+    def test_not_pooled(self):
+        # without 'pool_embeddings' in the preprocessing, the phrases have to be encoded by the model
+        _data_obj = DataProcessingFactory.load(self.cache_path / "toy_data.pickle")
+        self.assertIsNone(_data_obj.phrase_embeddings)
+        with self.assertRaises(ValueError):
+            SentenceEmbeddingsFactory.create(data_obj=_data_obj, cache_path=self.cache_path,
+                                             cache_name="toy_embedding", model_name="toy", pooled_embeddings=True)
+        self.assert_aligned(SentenceEmbeddingsFactory.create(
+            data_obj=_data_obj, cache_path=self.cache_path, cache_name="toy_embedding", model_name="toy"))
+
+    def test_pickle(self):
+        _sent_emb = SentenceEmbeddingsFactory.create(
+            data_obj=DataProcessingFactory.load(self.cache_path / "toy_data.pickle"), cache_path=self.cache_path,
+            cache_name="toy_embedding", model_name="toy", view_from_topics=["b"], embedding_store=True)
+        _texts = list(_sent_emb.data_processing_obj.data_chunk_sets.texts)
+        with patch("embedding_functions.get_sentence_transformer", ToyModel):
+            self.assertIsInstance(_sent_emb.model, ToyModel)
+        _sent_emb.open_store(EmbeddingStore.from_config(True, self.cache_path))
+
+        # neither the model, the data object nor the (open) store go into the pickle
+        _loaded = pickle.loads(pickle.dumps(_sent_emb))
+        _sent_emb.close_store()
+        self.assertIsNone(_loaded._model)
+        self.assertIsNone(_loaded.data_processing_obj)
+        self.assertIsNone(_loaded._store)
+        self.assertEqual(_loaded.model_name, "toy")
+        np.testing.assert_array_equal(_loaded.sentence_embeddings, _sent_emb.sentence_embeddings)
+
+        # with the data object, the view of the embeddings is back
+        _loaded.attach_data_obj(DataProcessingFactory.load(self.cache_path / "toy_data.pickle"))
+        self.assertEqual(list(_loaded.data_processing_obj.data_chunk_sets.texts), _texts)
+        self.assert_aligned(_loaded)
+        with patch("embedding_functions.get_sentence_transformer", ToyModel):
+            self.assertIsInstance(_loaded.model, ToyModel)
+
+
+class TestEmbeddingStore(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_path = pathlib.Path(self.tmp.name) / "store"
+        # 1 KB per embedding, so that 10 of them fill the store
+        self.vectors = lambda phrases: np.repeat(fake_encode(None, phrases), 32, axis=1)
+        self.stores = []
+
+    def tearDown(self) -> None:
+        for _store in self.stores:
+            _store.close()
+        self.tmp.cleanup()
+
+    def open_store(self, max_size_mb=None):
+        _store = EmbeddingStore(self.store_path, max_size_mb)
+        self.stores.append(_store)
+        return _store
+
+    def assert_found(self, store, phrases, found):
+        _embeddings, _found = store.get("toy", phrases)
+        np.testing.assert_array_equal(_found, found)
+        np.testing.assert_array_equal(_embeddings[_found], self.vectors([p for p, f in zip(phrases, found) if f]))
+        self.assertFalse(_embeddings[~_found].any())
+
+    def test_hits_and_misses(self):
+        _store = self.open_store()
+        self.assertIsNone(_store.get("toy", ["chest pain"])[0])
+        _store.put("toy", ["chest pain", "fever", "chest pain"], self.vectors(["chest pain", "fever", "chest pain"]))
+        _store.put("toy", ["fever"], self.vectors(["fever"]))
+        _embeddings, _found = _store.get("toy", [" chest \t pain", "cough", "fever"])
+        np.testing.assert_array_equal(_found, [True, False, True])
+        np.testing.assert_array_equal(_embeddings[[0, 2]], self.vectors(["chest pain", "fever"]))
+        self.assertIsNone(_store.get("other", ["fever"])[0])
+        with self.assertRaises(ValueError):
+            _store.put("toy", ["cough"], np.zeros((1, 8)))
+
+        _statistics = _store.statistics()
+        self.assertEqual((_statistics["hits"], _statistics["misses"]), (2, 3))
+        self.assertEqual({m["model"]: m["embeddings"] for m in _statistics["models"]}, {"toy": 2, "other": 0})
+
+    def test_eviction(self):
+        _store = self.open_store(max_size_mb=10 / 1024)
+        _old = [f"phrase {i}" for i in range(8)]
+        _store.put("toy", _old, self.vectors(_old))
+        time.sleep(.01)
+        self.assert_found(_store, _old[:4], [True] * 4)
+        time.sleep(.01)
+        _new = [f"phrase {i}" for i in range(8, 12)]
+        _store.put("toy", _new, self.vectors(_new))
+
+        # 12 embeddings exceed the budget: 90% of it, the 9 most recently used, are kept in the next generation
+        _namespace = EmbeddingStore.namespace("toy")
+        self.assertFalse((self.store_path / f"{_namespace}_0.f32").exists())
+        self.assertEqual((self.store_path / f"{_namespace}_1.f32").stat().st_size, 9 * 1024)
+        self.assert_found(_store, _old[:4] + _new, [True] * 8)
+        _embeddings, _found = _store.get("toy", _old[4:])
+        self.assertEqual(_found.sum(), 1)
+        np.testing.assert_array_equal(_embeddings[_found], self.vectors(np.asarray(_old[4:])[_found].tolist()))
+
+        # the next rollover starts from the rewritten generation
+        _newer = [f"phrase {i}" for i in range(12, 16)]
+        _store.put("toy", _newer, self.vectors(_newer))
+        self.assertFalse((self.store_path / f"{_namespace}_1.f32").exists())
+        self.assertTrue((self.store_path / f"{_namespace}_2.f32").exists())
+        self.assert_found(_store, _newer, [True] * 4)
+
+    def test_stores_of_a_folder(self):
+        _store = self.open_store(max_size_mb=10 / 1024)
+        # e.g. the store of another job
+        _other = EmbeddingStore.from_config(self.store_path, pathlib.Path(self.tmp.name), max_size_mb=10 / 1024)
+        self.stores.append(_other)
+        self.assertIs(_store._lock, _other._lock)
+
+        # a store reads what another one wrote, also after the other one evicted embeddings
+        _phrases = [f"phrase {i}" for i in range(40)]
+        _errors = []
+
+        def _use(store, offset):
+            try:
+                for _i in range(offset, offset + 40, 2):
+                    _batch = [_phrases[(_i + j) % 40] for j in range(3)]
+                    store.put("toy", _batch, self.vectors(_batch))
+                    _embeddings, _found = store.get("toy", _phrases)
+                    np.testing.assert_array_equal(_embeddings[_found],
+                                                  self.vectors(np.asarray(_phrases)[_found].tolist()))
+            except Exception as e:
+                _errors.append(e)
+
+        _threads = [threading.Thread(target=_use, args=(s, o)) for s, o in [(_store, 0), (_other, 20)]]
+        for _thread in _threads:
+            _thread.start()
+        for _thread in _threads:
+            _thread.join()
+        self.assertEqual(_errors, [])
+        self.assertLessEqual(_store.statistics()["models"][0]["embeddings"], 10)
+
+
+@patch("embedding_functions.SentenceTransformer", ToyModel)
+class TestSentenceTransformers(TestCase):
+
+    def setUp(self) -> None:
+        _patch = patch.object(embedding_functions, "_sentence_transformers", OrderedDict())
+        _patch.start()
+        self.addCleanup(_patch.stop)
+
+    def test_lru(self):
+        self.assertEqual(embedding_functions.SENTENCE_TRANSFORMER_CACHE_SIZE, 2)
+        _first = get_sentence_transformer("first")
+        self.assertIs(get_sentence_transformer("first"), _first)
+        _second = get_sentence_transformer("second")
+        self.assertIs(get_sentence_transformer("first"), _first)
+
+        # the least recently used model is dropped
+        _third = get_sentence_transformer("third")
+        self.assertEqual(list(embedding_functions._sentence_transformers), ["first", "third"])
+        self.assertIs(get_sentence_transformer("first"), _first)
+        self.assertIs(get_sentence_transformer("third"), _third)
+        self.assertIsNot(get_sentence_transformer("second"), _second)
+        self.assertEqual(list(embedding_functions._sentence_transformers), ["third", "second"])
@@ -0,0 +1,267 @@
+import pathlib
+import random
+import tempfile
+from collections import OrderedDict
+from itertools import islice
+from unittest import TestCase
+from unittest.mock import patch
+
+import spacy
+from spacy.tokens import Doc, SpanGroup
+
+from negspacy import negation
+from negspacy.negation import Negex
+from negspacy.utils import FeaturesOfInterest
+
+TERMSET = {
+    "pseudo_negations": ["no increase", "not only", "no further", "further increase"],
+    "preceding_negations": ["no", "no signs of", "denies", "without"],
+    "following_negations": ["ruled out", "was ruled out", "unlikely"],
+    "termination": ["but", "however"],
+}
+NOUNS = {"pain", "fever", "cough", "patient", "infection", "edema"}
+WORDS = sorted(NOUNS) + ["no", "signs", "of", "denies", "without", "was", "ruled", "out", "unlikely", "but",
+                         "however", "increase", "further", "not", "only", "and", ".", "reports"]
+
+
+class ReferenceNegex(Negex):
+    """
+    The scoping before it was based on sorted intervals: a SpanGroup per match for the pseudo negations and the
+    triggers filtered and sorted per boundary and feature.
+    """
+
+    def process_negations(self, doc: Doc):
+        preceding = list()
+        following = list()
+        terminating = list()
+
+        matches = self.matcher(doc)
+        pseudo = [
+            (match_id, start, end)
+            for match_id, start, end in matches
+            if self.nlp.vocab.strings[match_id] == "pseudo"
+        ]
+        _pseudo_spans = [doc[p[1]:p[2]] for p in pseudo]
+
+        for match_id, start, end in matches:
+            if self.nlp.vocab.strings[match_id] == "pseudo":
+                continue
+            _spans = SpanGroup(doc, spans=_pseudo_spans.copy() + [doc[start:end]])
+            if _spans.has_overlap:
+                continue
+            if self.nlp.vocab.strings[match_id] == "Preceding":
+                preceding.append((match_id, start, end))
+            elif self.nlp.vocab.strings[match_id] == "Following":
+                following.append((match_id, start, end))
+            elif self.nlp.vocab.strings[match_id] == "Termination":
+                terminating.append((match_id, start, end))
+        return preceding, following, terminating
+
+    def negex(self, doc: Doc):
+        preceding, following, terminating = self.process_negations(doc)
+        boundaries = self.termination_boundaries(doc, terminating)
+        scope = self.scope if doc.has_annotation("DEP") else None
+        for b in boundaries:
+            sub_preceding = [i for i in preceding if b[0] <= i[1] < b[1]]
+            sub_following = [i for i in following if b[0] <= i[1] < b[1]]
+
+            for foi in self.features_of_interest:
+                for ft in self._features_in_boundary(doc, b, foi):
+                    if self.feature_types:
+                        if ft.label_ not in self.feature_types:
+                            continue
+                    if self.chunk_prefix:
+                        if scope is not None and scope > 0:
+                            if set(f.text.lower() for f in islice(ft.root.lefts, self.scope)).intersection(
+                                    cp.text.lower() for cp in self.chunk_prefix):
+                                ft._.set(self.extension_name, True)
+                                continue
+                        elif any(
+                                ft.text.lower().startswith(c.text.lower())
+                                for c in self.chunk_prefix
+                        ):
+                            ft._.set(self.extension_name, True)
+                            continue
+                    sorted_sub_preceding = sorted(sub_preceding, key=lambda s: s[2] - s[1], reverse=True)
+                    if any(pre[1] < ft.start for pre in sorted_sub_preceding):
+                        if scope is not None and scope > 0:
+                            _span_group = self._get_span_groups_right(doc, ft, sorted_sub_preceding[0])
+                            if not _span_group.has_overlap:
+                                continue
+                        ft._.set(self.extension_name, True)
+                        continue
+                    sorted_sub_following = sorted(sub_following, key=lambda s: s[2] - s[1], reverse=True)
+                    if any(fol[2] > ft.end for fol in sorted_sub_following):
+                        if scope is not None and scope > 0:
+                            _span_group = self._get_span_groups_left(doc, ft, sorted_sub_following[0])
+                            if not _span_group.has_overlap:
+                                continue
+                        ft._.set(self.extension_name, True)
+                        continue
+        return doc
+
+    @staticmethod
+    def _features_in_boundary(doc, boundary, feature):
+        if feature == "noun_chunks" and feature in doc.spans:
+            return [s for s in doc.spans[feature] if boundary[0] <= s.start and s.end <= boundary[1]]
+        return getattr(doc[boundary[0]: boundary[1]], feature)
+
+
+class TestNegex(TestCase):
+
+    def setUp(self) -> None:
+        self.nlp = spacy.blank("en")
+        self.nlp.add_pipe("sentencizer")
+
+    def negex_pair(self, **config):
+        _config = {"neg_termset": TERMSET, "feat_types": list(), "chunk_prefix": list(), "neg_termset_file": None,
+                   "feat_of_interest": FeaturesOfInterest.NOUN_CHUNKS, "scope": None, "language": "en"}
+        _config.update(config)
+        return (Negex(self.nlp, "negex", extension_name="negex_test", **_config),
+                ReferenceNegex(self.nlp, "negex_reference", extension_name="negex_reference_test", **_config))
+
+    @staticmethod
+    def add_noun_chunks(doc):
+        doc.spans["noun_chunks"] = [doc[t.i:t.i + 1] for t in doc if t.lower_ in NOUNS]
+        return doc
+
+    def make_doc(self, text):
+        return self.add_noun_chunks(self.nlp(text))
+
+    def flags(self, negex, doc):
+        negex(doc)
+        return [(ft.text, ft._.get(negex.extension_name)) for ft in doc.spans["noun_chunks"]]
+
+    def assert_same_flags(self, negex, reference, doc):
+        _flags = self.flags(negex, doc)
+        self.assertEqual(_flags, self.flags(reference, doc), doc.text)
+        return _flags
+
+    def test_fixed_sentences(self):
+        _negex, _reference = self.negex_pair()
+        for _text, _negated in [
+            ("Patient denies pain.", {"pain"}),
+            ("No signs of infection but fever.", {"infection"}),
+            # overlapping triggers: 'no' within 'no signs of' and 'ruled out' within 'was ruled out'
+            ("Patient shows no signs of infection. Edema was ruled out.", {"infection", "Edema"}),
+            ("Infection unlikely, however fever and cough.", {"Infection"}),
+            ("Not only pain but fever.", set()),
+            ("No increase of pain. Without fever.", {"fever"}),
+            ("Patient reports cough.", set()),
+            ("", set()),
+        ]:
+            _flags = self.assert_same_flags(_negex, _reference, self.make_doc(_text))
+            self.assertEqual({_chunk for _chunk, _flag in _flags if _flag}, _negated, _text)
+
+    def test_chunk_prefix(self):
+        _negex, _reference = self.negex_pair(chunk_prefix=["no"])
+        _doc = self.add_noun_chunks(self.nlp("no pain and fever"))
+        _doc.spans["noun_chunks"] = [_doc[0:2], _doc[3:4]]
+        self.assertEqual(self.assert_same_flags(_negex, _reference, _doc), [("no pain", True), ("fever", True)])
+
+    def test_scope(self):
+        _negex, _reference = self.negex_pair(scope=1)
+        # 'denies' negates its object only, not the object of the conjoined verb
+        _doc = self.add_noun_chunks(Doc(
+            self.nlp.vocab, words=["Patient", "denies", "pain", "but", "reports", "fever"],
+            heads=[1, 1, 1, 1, 1, 4], deps=["nsubj", "ROOT", "dobj", "cc", "conj", "dobj"]))
+        self.assertEqual(self.assert_same_flags(_negex, _reference, _doc),
+                         [("Patient", False), ("pain", True), ("fever", False)])
+        _doc = self.add_noun_chunks(Doc(
+            self.nlp.vocab, words=["Infection", "was", "ruled", "out", "and", "edema"],
+            heads=[2, 2, 2, 2, 2, 2], deps=["nsubj", "aux", "ROOT", "prt", "cc", "conj"]))
+        self.assertEqual(self.assert_same_flags(_negex, _reference, _doc),
+                         [("Infection", True), ("edema", False)])
+
+    def test_overlapping_pseudo_negations(self):
+        # the documented change: before, two overlapping pseudo negations dropped every trigger of the doc
+        _negex, _reference = self.negex_pair()
+        _doc = self.make_doc("No further increase of pain, denies fever.")
+        self.assertEqual(self.flags(_negex, _doc), [("pain", False), ("fever", True)])
+        _doc = self.make_doc("No further increase of pain, denies fever.")
+        self.assertEqual(self.flags(_reference, _doc), [("pain", False), ("fever", False)])
+
+    def test_random_docs(self):
+        _negex, _reference = self.negex_pair()
+        _random = random.Random(21)
+        _compared = 0
+        for _ in range(500):
+            _doc = self.make_doc(" ".join(_random.choices(WORDS, k=_random.randint(1, 25))))
+            _pseudo = SpanGroup(_doc, spans=[_doc[s:e] for m, s, e in _negex.matcher(_doc)
+                                             if _negex._match_types.get(m) == "pseudo"])
+            if _pseudo.has_overlap:
+                continue
+            self.assert_same_flags(_negex, _reference, _doc)
+            _compared += 1
+        self.assertGreater(_compared, 400)
+
+    def test_pipe(self):
+        _negex, _ = self.negex_pair()
+        _random = random.Random(22)
+        _texts = [" ".join(_random.choices(WORDS, k=_random.randint(1, 25))) for _ in range(200)]
+        _called = [self.flags(_negex, self.make_doc(_text)) for _text in _texts]
+        _piped = [[(ft.text, ft._.get(_negex.extension_name)) for ft in _doc.spans["noun_chunks"]]
+                  for _doc in _negex.pipe((self.make_doc(_text) for _text in _texts), batch_size=16)]
+        self.assertEqual(_piped, _called)
+        self.assertTrue(any(_flag for _flags in _called for _, _flag in _flags))
+
+
+class TestCompiledTermsets(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patches = [patch.object(negation, "COMPILED_TERMSETS_PATH", self.tmp.name),
+                        patch.object(negation, "_compiled_termsets", OrderedDict())]
+        for _patch in self.patches:
+            _patch.start()
+        _compile = patch.object(Negex, "_compile_patterns", autospec=True, side_effect=Negex._compile_patterns)
+        self.compiled = _compile.start()
+        self.patches.append(_compile)
+
+    def tearDown(self) -> None:
+        for _patch in self.patches:
+            _patch.stop()
+        self.tmp.cleanup()
+
+    @staticmethod
+    def add_negex(lang="en", termset=None):
+        # a newly loaded pipeline each time
+        _nlp = spacy.blank(lang)
+        return _nlp.add_pipe("negex", config={"neg_termset": TERMSET if termset is None else termset,
+                                              "feat_of_interest": FeaturesOfInterest.NOUN_CHUNKS,
+                                              "extension_name": "negex_termset_test"})
+
+    @staticmethod
+    def matches(negex, text):
+        return [(negex._match_types[m], s, e) for m, s, e in negex.matcher(negex.nlp.make_doc(text))]
+
+    def test_cache_hits(self):
+        _negex = self.add_negex()
+        self.assertEqual(self.compiled.call_count, 1)
+        self.assertEqual(len(list(pathlib.Path(self.tmp.name).glob("*.json"))), 1)
+        # another pipeline with the same tokenizer takes the compiled termset from memory or (e.g. in another
+        # process) from disk
+        _from_memory = self.add_negex()
+        negation._compiled_termsets.clear()
+        _from_disk = self.add_negex()
+        self.assertEqual(self.compiled.call_count, 1)
+
+        # another termset or tokenizer needs to be compiled
+        self.add_negex(termset=dict(TERMSET, termination=["but"]))
+        self.add_negex(lang="de")
+        self.assertEqual(self.compiled.call_count, 3)
+
+        _text = "No signs of infection but fever, denies pain. Not only cough; edema was ruled out however."
+        _expected = self.matches(_negex, _text)
+        self.assertEqual({_type for _type, _, _ in _expected}, {"pseudo", "Preceding", "Following", "Termination"})
+        for _cached in [_from_memory, _from_disk]:
+            self.assertIsNot(_cached.nlp.vocab, _negex.nlp.vocab)
+            self.assertEqual(self.matches(_cached, _text), _expected)
+
+    def test_without_disk(self):
+        with patch.object(negation, "COMPILED_TERMSETS_PATH", ""):
+            self.add_negex()
+            negation._compiled_termsets.clear()
+            self.add_negex()
+        self.assertEqual(self.compiled.call_count, 2)
+        self.assertEqual(list(pathlib.Path(self.tmp.name).iterdir()), [])
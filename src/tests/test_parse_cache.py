@@ -0,0 +1,121 @@
+import pathlib
+import sqlite3
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from spacy import Language
+
+from data_functions import DataProcessingFactory, PARSE_CACHE_FILE
+from negspacy import negation
+from src.tests.toy_pipeline import toy_pipeline
+
+# the texts that went through the pipeline (and not through the cache)
+PARSED = []
+
+
+@Language.component("parse_cache_test_recorder")
+def parse_cache_test_recorder(doc):
+    if doc.text == "Broken line.":
+        raise RuntimeError("The pipeline broke down.")
+    PARSED.append(doc.text)
+    return doc
+
+
+def recording_pipeline():
+    _nlp = toy_pipeline()
+    _nlp.add_pipe("parse_cache_test_recorder")
+    return _nlp
+
+
+class TestParseCache(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = pathlib.Path(self.tmp.name)
+        _lines = ["The patient has acute chest pain.", "Severe fever and a cough.", "Heart failure with chest pain.",
+                  "Mild cough.", "Aspirin for the fever."]
+        # every line occurs in several docs and 'Mild cough.' twice within 'doc_3'
+        self.entries = [{"name": f"doc_{i}", "content": "\n".join(_lines[i % 5:i % 5 + 2] + ["Mild cough."]),
+                         "label": ["a", "b"][i % 2]} for i in range(6)]
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, cache_path=self.cache_path, save_to_file=False,
+                           batch_size=2, prune_components=False)
+        PARSED.clear()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def create(self, entries=None, pipeline=None, **kwargs):
+        PARSED.clear()
+        return DataProcessingFactory.create(
+            pipeline=recording_pipeline() if pipeline is None else pipeline,
+            base_data=self.entries if entries is None else entries, **dict(self.kwargs, **kwargs))
+
+    def assert_same_result(self, data_obj, expected):
+        self.assertEqual([(d.text, d._.doc_name, d._.doc_offset) for d in data_obj._docs],
+                         [(d.text, d._.doc_name, d._.doc_offset) for d in expected._docs])
+        self.assertEqual([[t.pos_ for t in d] for d in data_obj._docs], [[t.pos_ for t in d] for d in expected._docs])
+        self.assertEqual(list(data_obj.data_chunk_sets), list(expected.data_chunk_sets))
+        self.assertEqual(data_obj.document_list, expected.document_list)
+        self.assertEqual(data_obj.document_indexes, expected.document_indexes)
+
+    def test_hits_duplicates_and_order(self):
+        _uncached = self.create(parse_cache=False)
+        _distinct = {_d.text for _d in _uncached._docs}
+        self.assertGreater(len(_uncached._docs), len(_distinct))
+
+        # a segment that occurs several times in the corpus is parsed only once
+        _first = self.create(parse_cache=True)
+        self.assertEqual(sorted(PARSED), sorted(_distinct))
+        self.assert_same_result(_first, _uncached)
+
+        # all segments are restored from the cache, also when they are bucketed by length
+        for _length_bucketing in [False, True]:
+            _cached = self.create(parse_cache=True, length_bucketing=_length_bucketing)
+            self.assertEqual(PARSED, [])
+            self.assert_same_result(_cached, _uncached)
+
+        # only the new segment is parsed
+        _entries = self.entries + [{"name": "doc_6", "content": "Mild cough.\nAcute fever.", "label": "a"}]
+        _appended = self.create(_entries, parse_cache=True)
+        self.assertEqual(PARSED, ["Acute fever."])
+        self.assert_same_result(_appended, self.create(_entries, parse_cache=False))
+
+    def test_closed_on_error(self):
+        _entries = [{"name": f"doc_{i}", "content": f"Severe fever on day {i}.", "label": "a"} for i in range(20)]
+        # without length buckets, the (short) broken line comes last
+        with self.assertRaises(RuntimeError):
+            self.create(_entries + [{"name": "doc_20", "content": "Broken line.", "label": "a"}], parse_cache=True,
+                        length_bucketing=False)
+
+        # the segments that were parsed before the error were written to the cache nonetheless
+        with sqlite3.connect(self.cache_path / PARSE_CACHE_FILE) as _connection:
+            _n_cached = _connection.execute("SELECT COUNT(*) FROM parses").fetchone()[0]
+        self.assertGreater(_n_cached, 0)
+        self.create(_entries, parse_cache=True)
+        self.assertEqual(len(PARSED), len(_entries) - _n_cached)
+
+    def test_invalidation(self):
+        _distinct = sorted({_d.text for _d in self.create(parse_cache=True)._docs})
+        with patch.object(negation, "COMPILED_TERMSETS_PATH", self.tmp.name):
+            # the negex component and its config are part of the cache namespace
+            for _negspacy_config in [None, SimpleNamespace(chunk_prefix=["no"])]:
+                _negated = self.create(parse_cache=True, omit_negated_chunks=True, negspacy_config=_negspacy_config)
+                self.assertEqual(sorted(PARSED), _distinct)
+                self.create(parse_cache=True, omit_negated_chunks=True, negspacy_config=_negspacy_config)
+                self.assertEqual(PARSED, [])
+            self.assertEqual(list(_negated.data_chunk_sets),
+                             list(self.create(parse_cache=False, omit_negated_chunks=True,
+                                              negspacy_config=_negspacy_config).data_chunk_sets))
+
+        # so are the name and the version of the model
+        for _meta in [{"name": "other_model"}, {"version": "1.0.0"}]:
+            _pipeline = recording_pipeline()
+            _pipeline.meta.update(_meta)
+            self.create(pipeline=_pipeline, parse_cache=True)
+            self.assertEqual(sorted(PARSED), _distinct)
+
+        # the entries of the first run are still there
+        self.create(parse_cache=True)
+        self.assertEqual(PARSED, [])
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+import numpy as np
+import spacy
+from spacy.tokens import Doc
+
+from data_functions import DataProcessingFactory, span_vectors, wordpiece_token_vectors
+from src.tests.toy_pipeline import toy_pipeline, toy_vector
+
+
+class TestTokenVectors(TestCase):
+
+    def test_wordpiece_token_vectors(self):
+        # one sequence of 6 wordpieces; the first & last one ('[CLS]', '[SEP]') belong to no token
+        _wordpieces = np.arange(12, dtype=np.float32).reshape(1, 6, 2)
+        _lengths = np.asarray([1, 2, 0, 2, 0])
+        _indices = np.asarray([[1], [2], [3], [3], [4]])
+        _vectors = wordpiece_token_vectors(_wordpieces, _lengths, _indices, n_tokens=4)
+
+        self.assertEqual(_vectors.shape, (4, 2))
+        self.assertEqual(_vectors.dtype, np.float32)
+        np.testing.assert_array_equal(_vectors, [[2, 3], [5, 6], [0, 0], [7, 8]])
+
+    def test_span_vectors(self):
+        _doc = Doc(spacy.blank("en").vocab, words=["the", "acute", "chest", "pain", "."])
+        self.assertIsNone(span_vectors(_doc, [_doc[1:4]]))
+
+        _doc.tensor = np.arange(10, dtype=np.float32).reshape(5, 2)
+        self.assertIsNone(span_vectors(_doc, []))
+        _vectors = span_vectors(_doc, [_doc[1:4], _doc[0:1], _doc[3:5]])
+        self.assertEqual(_vectors.dtype, np.float32)
+        np.testing.assert_array_equal(_vectors, [[4, 5], [0, 1], [7, 8]])
+
+
+class TestPhraseEmbeddings(TestCase):
+
+    def setUp(self) -> None:
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, save_to_file=False, prune_components=False,
+                           use_lemma=True)
+        self.entries = [{"name": "doc_0", "content": "Acute chest pain.\nThe chest pain.", "label": "a"},
+                        {"name": "doc_1", "content": "Severe fever and a cough.\nChest pains.", "label": "b"}]
+
+    def test_mean_over_chunks(self):
+        _data_obj = DataProcessingFactory.create(pipeline=toy_pipeline(lemmatizer=True, token_vectors=True),
+                                                 base_data=self.entries, pool_embeddings=True, **self.kwargs)
+        _phrases = list(_data_obj.data_chunk_sets.texts)
+        self.assertEqual(_phrases, ["acute chest pain", "chest pain", "severe fever", "cough"])
+
+        # the mean over the tokens of every noun chunk ('pains', not its lemma) and then over the chunks of a phrase
+        np.testing.assert_allclose(_data_obj.phrase_embeddings, [
+            toy_vector("acute", "chest", "pain"),
+            np.mean([toy_vector("chest", "pain"), toy_vector("chest", "pains")], axis=0),
+            toy_vector("severe", "fever"),
+            toy_vector("cough")
+        ], rtol=1e-6)
+        # the token vectors aren't kept with the docs
+        self.assertTrue(all(_doc.tensor.size == 0 for _doc in _data_obj.processed_docs))
+
+        # the embeddings follow the view
+        _data_obj.set_view_by_labels(["b"])
+        self.assertEqual(list(_data_obj.data_chunk_sets.texts), ["chest pain", "severe fever", "cough"])
+        np.testing.assert_allclose(_data_obj.phrase_embeddings[2], toy_vector("cough"), rtol=1e-6)
+
+    def test_without_pooling(self):
+        _data_obj = DataProcessingFactory.create(pipeline=toy_pipeline(lemmatizer=True, token_vectors=True),
+                                                 base_data=self.entries, pool_embeddings=False, **self.kwargs)
+        self.assertIsNone(_data_obj.phrase_embeddings)
+        self.assertEqual(list(_data_obj.data_chunk_sets.texts), ["acute chest pain", "chest pain", "severe fever",
+                                                                 "cough"])
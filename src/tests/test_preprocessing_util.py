@@ -0,0 +1,169 @@
+import pathlib
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+import flask
+from spacy import Language
+
+from data_functions import DataProcessingFactory
+from main_utils import ProcessStatus
+from negspacy import negation
+from preprocessing_util import PreprocessingUtil, SpacyModelRegistry
+from src.tests.toy_pipeline import toy_pipeline
+
+# the memory (in MB) the toy models are taken to need
+MODEL_SIZES = {"small": 100, "large": 600, "other_large": 600}
+
+
+@Language.component("registry_test_failure")
+def registry_test_failure(doc):
+    raise RuntimeError("The component broke down.")
+
+
+def load_toy_model(model, logger, exclude=None):
+    _nlp = toy_pipeline(lemmatizer=True, ner=True)
+    for _name in ([] if exclude is None else exclude):
+        _nlp.remove_pipe(_name)
+    _nlp.meta["name"] = model
+    return _nlp
+
+
+class TestWorkerProcess(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp.name)
+        # the worker process loads the model by name, so the toy pipeline is handed over as a path
+        self.model = self.path / "toy_model"
+        toy_pipeline().to_disk(self.model)
+        self.app = flask.Flask(__name__)
+        _lines = ["The patient has acute chest pain.", "Severe fever and a cough.", "Heart failure with chest pain.",
+                  "Mild cough.", "Aspirin for the fever."]
+        self.entries = [{"name": f"doc_{i}", "content": "\n".join(_lines[i % 5:i % 5 + 2]),
+                         "label": ["a", "b"][i % 2]} for i in range(12)]
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def start_process(self, name, entries, **config):
+        _util = PreprocessingUtil(self.app, str(self.path))
+        _util.set_file_storage_path(name)
+        _util.process_name = name
+        _util.read_config(dict(spacy_model=str(self.model), chunker="rule", omit_negated_chunks=False,
+                               parse_cache=False, **config), process_name=name)
+        _util.data = entries
+        _tracker, _result = dict(), dict()
+        # like the server's pipeline thread; it has to come back (and not wait for a dead worker)
+        _thread = threading.Thread(
+            target=lambda: _result.update(process=_util.start_process(name, DataProcessingFactory, _tracker)))
+        _thread.start()
+        _thread.join(timeout=120)
+        self.assertFalse(_thread.is_alive())
+        return _result["process"], _tracker[name]["status"][0]["status"]
+
+    def test_worker_equals_thread(self):
+        _in_thread, _status = self.start_process("in_thread", self.entries, n_process=1)
+        self.assertEqual(_status, ProcessStatus.FINISHED)
+        _worker, _status = self.start_process("worker", self.entries, n_process=2, batch_size=2)
+        self.assertEqual(_status, ProcessStatus.FINISHED)
+
+        # the result of the worker is the one it pickled
+        self.assertTrue((self.path / "worker" / "worker_data.pickle").exists())
+        self.assertGreater(len(_in_thread.data_chunk_sets), 0)
+        self.assertEqual(list(_worker.data_chunk_sets), list(_in_thread.data_chunk_sets))
+        self.assertEqual(_worker.document_list, _in_thread.document_list)
+        self.assertEqual(_worker.document_indexes, _in_thread.document_indexes)
+        self.assertEqual(_worker.true_labels, _in_thread.true_labels)
+        self.assertEqual([(d.text, d._.doc_index) for d in _worker.processed_docs],
+                         [(d.text, d._.doc_index) for d in _in_thread.processed_docs])
+
+    def test_worker_failure(self):
+        _broken = [{"name": "broken", "content": None, "label": "a"}]
+        # the worker fails after it got all entries and (with 'stream_data') while the server still sends them
+        for _stream_data in [False, True]:
+            _entries = _broken + self.entries * 20 if _stream_data else self.entries + _broken
+            _process, _status = self.start_process(
+                f"failure_{_stream_data}".lower(), _entries, n_process=2, stream_data=_stream_data)
+            self.assertIsNone(_process)
+            self.assertEqual(_status, ProcessStatus.ABORTED)
+
+
+class TestSpacyModelRegistry(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        for _patch in [patch("preprocessing_util.load_spacy_model", side_effect=load_toy_model),
+                       patch("preprocessing_util._model_size_mb", side_effect=lambda p: MODEL_SIZES[p.meta["name"]]),
+                       patch.object(negation, "COMPILED_TERMSETS_PATH", self.tmp.name)]:
+            _patch.start()
+            self.addCleanup(_patch.stop)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    @staticmethod
+    def models(registry):
+        return sorted((i["model"], i["in_use"]) for i in registry.statistics()["instances"])
+
+    def test_lease(self):
+        _registry = SpacyModelRegistry(memory_mb=None)
+        with _registry.lease("small") as _first:
+            self.assertEqual(self.models(_registry), [("small", True)])
+            # a leased pipeline isn't handed out twice
+            with _registry.lease("small") as _second:
+                self.assertIsNot(_first, _second)
+                self.assertEqual(self.models(_registry), [("small", True), ("small", True)])
+            self.assertEqual(self.models(_registry), [("small", False), ("small", True)])
+        self.assertEqual(self.models(_registry), [("small", False), ("small", False)])
+
+        with _registry.lease("small") as _again:
+            self.assertIn(_again, [_first, _second])
+        # another negex config adapts an idle instance, other excluded components need another one
+        with _registry.lease("small", negex_config=SpacyModelRegistry.negex_config(True)) as _negex:
+            self.assertIn(_negex, [_first, _second])
+            self.assertEqual(_negex.pipe_names[-1], "negex")
+        with _registry.lease("small", disable=["ner"]) as _excluded:
+            self.assertNotIn("ner", _excluded.pipe_names)
+        self.assertEqual({k: v for k, v in _registry.statistics().items() if k in ["loads", "hits"]},
+                         {"loads": 3, "hits": 2})
+
+    def test_eviction(self):
+        _registry = SpacyModelRegistry(memory_mb=1000)
+        with _registry.lease("large"):
+            with _registry.lease("other_large"):
+                # leased pipelines are never evicted, even when they exceed the budget together
+                self.assertEqual(_registry.statistics()["memory_mb"], 1200)
+            self.assertEqual(self.models(_registry), [("large", True)])
+            with _registry.lease("small"):
+                pass
+            self.assertEqual(self.models(_registry), [("large", True), ("small", False)])
+        self.assertEqual(self.models(_registry), [("large", False), ("small", False)])
+
+        # the least recently used pipelines go first
+        with _registry.lease("small"):
+            pass
+        with _registry.lease("other_large"):
+            pass
+        self.assertEqual(self.models(_registry), [("other_large", False), ("small", False)])
+        self.assertEqual({k: v for k, v in _registry.statistics().items() if k in ["loads", "hits"]},
+                         {"loads": 4, "hits": 1})
+
+    def test_reset(self):
+        _registry = SpacyModelRegistry(memory_mb=None)
+        with self.assertRaises(RuntimeError):
+            with _registry.lease("small") as _pipeline:
+                _pipe_names = list(_pipeline.pipe_names)
+                _pipeline.add_pipe("registry_test_failure")
+                _pipeline.disable_pipe("ner")
+                _pipeline("Severe fever and a cough.")
+
+        # the job's components are gone and the disabled ones are back
+        with _registry.lease("small") as _again:
+            self.assertIs(_again, _pipeline)
+            self.assertEqual(_again.pipe_names, _pipe_names)
+            self.assertEqual(_again.disabled, [])
+            self.assertEqual([t.pos_ for t in _again("Severe fever and a cough.")],
+                             ["ADJ", "NOUN", "X", "X", "NOUN", "X"])
+        self.assertEqual(self.models(_registry), [("small", False)])
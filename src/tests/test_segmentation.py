@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+from data_functions import DataProcessingFactory, length_buckets, segment_text
+from src.tests.toy_pipeline import toy_pipeline
+
+CONTENT = "Acute chest pain.\nSevere fever\n\n\nHeart failure and a cough.\n  \nMild cough.\n\nAspirin."
+
+
+class TestSegmentText(TestCase):
+
+    @staticmethod
+    def segments(content, segmentation, token_budget=256):
+        return [content[s:e] for s, e in segment_text(content, segmentation=segmentation, token_budget=token_budget)]
+
+    def test_line(self):
+        self.assertEqual(self.segments(CONTENT, "line"), ["Acute chest pain.", "Severe fever",
+                                                          "Heart failure and a cough.", "Mild cough.", "Aspirin."])
+        self.assertEqual(self.segments("", "line"), [])
+        self.assertEqual(self.segments("\n \n", "line"), [])
+
+    def test_paragraph(self):
+        # a line with just whitespace is blank as well
+        self.assertEqual(self.segments(CONTENT, "paragraph"), ["Acute chest pain.\nSevere fever",
+                                                               "Heart failure and a cough.", "Mild cough.",
+                                                               "Aspirin."])
+        self.assertEqual(self.segments("Mild cough.\nAspirin.", "paragraph"), ["Mild cough.\nAspirin."])
+        self.assertEqual(self.segments("\n\nMild cough.\n\n", "paragraph"), ["Mild cough."])
+
+    def test_document(self):
+        self.assertEqual(self.segments(CONTENT, "document"), [CONTENT[:CONTENT.rindex(".") + 1]])
+        self.assertEqual(self.segments("\n\n", "document"), [])
+
+    def test_token_budget(self):
+        # lines are packed until the next one would exceed the budget; a longer line is a segment on its own
+        self.assertEqual(self.segments(CONTENT, "token_budget", token_budget=5),
+                         ["Acute chest pain.\nSevere fever", "Heart failure and a cough.",
+                          "Mild cough.\n\nAspirin."])
+        self.assertEqual(self.segments(CONTENT, "token_budget", token_budget=2),
+                         ["Acute chest pain.", "Severe fever", "Heart failure and a cough.", "Mild cough.",
+                          "Aspirin."])
+        self.assertEqual(self.segments(CONTENT, "token_budget", token_budget=100), self.segments(CONTENT, "document"))
+
+    def test_length_buckets(self):
+        _tuples = [(t, {"doc_index": i}) for i, t in enumerate(["ccc", "a", "bb", "dddd", "e", "ff"])]
+        _bucketed = list(length_buckets(iter(_tuples), window=3))
+        # sorted by length within each window; 'segment_seq' keeps the input position
+        self.assertEqual([t for t, _ in _bucketed], ["a", "bb", "ccc", "e", "ff", "dddd"])
+        self.assertEqual(sorted(_bucketed, key=lambda t: t[1]["segment_seq"]),
+                         [(t, dict(c, segment_seq=i)) for i, (t, c) in enumerate(_tuples)])
+        self.assertEqual([t for t, _ in length_buckets(_tuples, window=0)], [t for t, _ in _tuples])
+
+
+class TestSegmentation(TestCase):
+
+    def setUp(self) -> None:
+        self.entries = [{"name": f"doc_{i}", "content": CONTENT if i % 2 == 0 else CONTENT.replace("\n\n", "\n"),
+                         "label": "a"} for i in range(4)]
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, save_to_file=False, prune_components=False)
+
+    def test_same_chunks(self):
+        _line = DataProcessingFactory.create(pipeline=toy_pipeline(), base_data=self.entries, **self.kwargs)
+        for _segmentation in ["paragraph", "document", "token_budget"]:
+            for _length_bucketing in [False, True]:
+                _data_obj = DataProcessingFactory.create(
+                    pipeline=toy_pipeline(), base_data=self.entries, segmentation=_segmentation,
+                    segment_token_budget=5, length_bucketing=_length_bucketing, batch_size=2, **self.kwargs)
+                self.assertEqual(list(_data_obj.data_chunk_sets), list(_line.data_chunk_sets), _segmentation)
+                # the docs are in input order and their offsets point into the documents
+                _docs = _data_obj._docs
+                self.assertEqual([(d._.doc_index, d._.doc_offset) for d in _docs],
+                                 sorted((d._.doc_index, d._.doc_offset) for d in _docs))
+                for _doc in _docs:
+                    _content = self.entries[_doc._.doc_index]["content"]
+                    self.assertEqual(_content[_doc._.doc_offset:_doc._.doc_offset + len(_doc.text)], _doc.text)
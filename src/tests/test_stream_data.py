@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+from spacy import Language
+
+from data_functions import DataProcessingFactory
+from src.tests.toy_pipeline import toy_pipeline
+
+LINES = ["The patient has acute chest pain.", "Severe fever and a cough.", "Heart failure with chest pain.",
+         "Mild cough.", "Aspirin for the fever."]
+# the segments that went through the pipeline so far
+PARSED = []
+
+
+@Language.component("stream_data_test_recorder")
+def stream_data_test_recorder(doc):
+    PARSED.append(doc.text)
+    return doc
+
+
+def recording_pipeline():
+    _nlp = toy_pipeline()
+    _nlp.add_pipe("stream_data_test_recorder")
+    return _nlp
+
+
+def entries(n, lookahead):
+    # fails if an entry is read more than 'lookahead' entries (of one segment each) ahead of the parsing
+    for i in range(n):
+        if i - len(PARSED) > lookahead:
+            raise AssertionError(f"Entry {i} was read ahead of the parsing ({len(PARSED)} segments parsed).")
+        yield {"name": f"doc_{i}", "content": LINES[i % 5], "label": ["a", "b"][i % 2]}
+
+
+class TestStreamData(TestCase):
+
+    def setUp(self) -> None:
+        self.kwargs = dict(chunker="rule", omit_negated_chunks=False, save_to_file=False, prune_components=False,
+                           batch_size=4, length_bucketing=False)
+        PARSED.clear()
+
+    def test_lazy_consumption(self):
+        _streamed = DataProcessingFactory.create(
+            pipeline=recording_pipeline(), base_data=entries(100, lookahead=8), stream_data=True, **self.kwargs)
+        self.assertEqual(len(PARSED), 100)
+        # neither the entries, the texts nor the parsed docs are held
+        self.assertNotIsInstance(_streamed._data_entries, list)
+        self.assertEqual(_streamed._data_corpus_tuples, [])
+        self.assertFalse(_streamed._keep_docs)
+        self.assertEqual(_streamed._processed_docs, [])
+
+        PARSED.clear()
+        _loaded = DataProcessingFactory.create(
+            pipeline=recording_pipeline(), base_data=list(entries(100, lookahead=100)), **self.kwargs)
+        self.assertEqual(list(_streamed.data_chunk_sets), list(_loaded.data_chunk_sets))
+        self.assertEqual(_streamed.document_list, _loaded.document_list)
+        self.assertEqual(_streamed.true_labels, _loaded.true_labels)
+
+        # without streaming, all entries are read before the parsing starts
+        PARSED.clear()
+        with self.assertRaises(AssertionError):
+            DataProcessingFactory.create(pipeline=recording_pipeline(), base_data=entries(100, lookahead=8),
+                                         **self.kwargs)
+
+    def test_keep_docs(self):
+        _data_obj = DataProcessingFactory.create(
+            pipeline=toy_pipeline(), base_data=entries(10, lookahead=10), stream_data=True, keep_docs=True,
+            **self.kwargs)
+        self.assertEqual(len(_data_obj.processed_docs), 10)
+        self.assertTrue(DataProcessingFactory.create(
+            pipeline=toy_pipeline(), base_data=list(entries(10, lookahead=10)), **self.kwargs)._keep_docs)
@@ -0,0 +1,60 @@
+import hashlib
+
+import numpy as np
+import spacy
+from spacy import Language
+
+# the part of speech of the toy pipeline comes from these word lists; every other token is 'X'
+NOUNS = {"pain", "pains", "chest", "fever", "fevers", "cough", "coughs", "heart", "failure", "failures", "aspirin",
+         "patient", "rash", "clinic", "ward", "covid-19", "covid19", "pneumonia"}
+ADJECTIVES = {"acute", "severe", "mild"}
+
+
+@Language.component("toy_lemmatizer", assigns=["token.lemma"])
+def toy_lemmatizer(doc):
+    for token in doc:
+        token.lemma_ = token.lower_[:-1] if token.pos_ == "NOUN" and token.lower_.endswith("s") else token.lower_
+    return doc
+
+
+@Language.component("toy_ner", assigns=["doc.ents", "token.ent_iob", "token.ent_type"])
+def toy_ner(doc):
+    return doc
+
+
+def toy_vector(*words) -> np.ndarray:
+    # the mean of the token vectors of 'toy_token_vectors' for the given (lower case) words
+    return np.mean([np.frombuffer(hashlib.sha1(w.encode("utf-8")).digest()[:4], dtype=np.uint8) for w in words],
+                   axis=0).astype(np.float32)
+
+
+@Language.component("toy_token_vectors", assigns=["doc.tensor"])
+def toy_token_vectors(doc):
+    # a token vector that only depends on the word
+    doc.tensor = np.asarray([toy_vector(t.lower_) for t in doc], dtype=np.float32).reshape(len(doc), 4)
+    return doc
+
+
+def toy_pipeline(
+        lemmatizer: bool = False,
+        ner: bool = False,
+        token_vectors: bool = False
+) -> Language:
+    """
+    A blank English pipeline that tags the words of 'NOUNS' and 'ADJECTIVES' with an attribute ruler (so that it can
+    be saved and loaded by path as well); module level, so that spawned processes can build it too.
+    """
+    _nlp = spacy.blank("en")
+    _ruler = _nlp.add_pipe("attribute_ruler")
+    # later patterns take precedence
+    _ruler.add([[{}]], {"POS": "X"})
+    _ruler.add([[{"LOWER": {"IN": sorted(NOUNS)}}]], {"POS": "NOUN"})
+    _ruler.add([[{"LOWER": {"IN": sorted(ADJECTIVES)}}]], {"POS": "ADJ"})
+    if lemmatizer:
+        _nlp.add_pipe("toy_lemmatizer", name="lemmatizer")
+    if ner:
+        _nlp.add_pipe("toy_ner", name="ner")
+    if token_vectors:
+        # named like the component that provides the token vectors of a real model
+        _nlp.add_pipe("toy_token_vectors", name="tok2vec")
+    return _nlp